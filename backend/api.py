@@ -0,0 +1,129 @@
+"""
+Local HTTP endpoint for batch race predictions.
+
+Endpoints:
+    POST /predict  {"race": "ironman" | "70.3", "athletes": [{"athlete_id", "power_curve",
+                   "best_efforts", "css", "weight"}, ...]} -> {"race", "predictions", "cache"}
+    GET  /cache    Cache hit/miss statistics.
+    DELETE /cache  Empties the cache.
+    GET  /health   Liveness check.
+
+Usage (from the repository root):
+    python -m backend.api --port 8000 --max-entries 10000 --ttl 3600
+"""
+import sys
+import json
+import logging
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from ml.predictor import RACES, PredictionService, athlete_inputs_from_dict
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the PredictionService of the server (server.service)."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so load tests are not dominated by connection setup
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/cache":
+            self._send_json(200, self.server.service.cache_info())
+        else:
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+
+    def do_DELETE(self):
+        if self.path == "/cache":
+            self.server.service.clear()
+            self._send_json(200, self.server.service.cache_info())
+        else:
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            race = request.get("race", "ironman")
+            if race not in RACES:
+                raise ValueError(f"Unknown race: {race}")
+            athletes = [athlete_inputs_from_dict(athlete) for athlete in request.get("athletes", [])]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+
+        try:
+            predictions = self.server.service.predict(athletes, race) if athletes else None
+        except Exception as e:
+            logger.error(f"Prediction failed: {e}")
+            self._send_json(500, {"error": str(e)})
+            return
+
+        records = []
+        if predictions is not None:
+            for athlete_id, row in predictions.iterrows():
+                record = {"athlete_id": athlete_id}
+                # NaN is not valid JSON: missing inputs are reported as null
+                record.update({key: None if isinstance(value, float) and np.isnan(value) else value
+                               for key, value in row.items()})
+                records.append(record)
+        self._send_json(200, {"race": race, "predictions": records, "cache": self.server.service.cache_info()})
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def create_server(service=None, host="127.0.0.1", port=8000):
+    """
+    Creates the HTTP server (call serve_forever() to run it).
+
+    Args:
+        service (PredictionService): The service to expose; a default one is created if None.
+        host (str): Interface to bind.
+        port (int): Port to bind (0 picks a free port).
+
+    Returns:
+        ThreadingHTTPServer: The server, with the service as its 'service' attribute.
+    """
+    server = ThreadingHTTPServer((host, port), PredictionRequestHandler)
+    server.daemon_threads = True
+    server.service = service or PredictionService()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-entries", type=int, default=10000, help="Cache capacity (athlete predictions).")
+    parser.add_argument("--ttl", type=float, default=3600, help="Cache entry lifetime in seconds (0 for no expiry).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    server = create_server(PredictionService(args.max_entries, args.ttl or None), args.host, args.port)
+    logger.info(f"Serving predictions on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
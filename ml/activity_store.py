@@ -0,0 +1,382 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from ml.cycling_model import mean_max_power_batch, NormalizedPowerAccumulator
+from ml.running_model import find_best_efforts_batch
+
+# Channel name -> on-disk dtype. Timestamps are seconds since the Unix epoch; float channels
+# keep NaN for sensor dropouts.
+DEFAULT_CHANNELS = {
+    "timestamp": "int64",
+    "distance": "float32",
+    "speed": "float32",
+    "heartrate": "float32",
+    "cadence": "float32",
+    "altitude": "float32",
+    "latitude": "float64",
+    "longitude": "float64",
+    "power": "float32",
+}
+# In memory the index is one structured array; workout ids are Python strings of any length,
+# saved as a UTF-8 string table so the index loads without pickle
+INDEX_DTYPE = np.dtype([
+    ("workout_id", object),
+    ("offset", "i8"),
+    ("length", "i8"),
+    ("start", "datetime64[s]"),
+    ("sport", "U32"),
+])
+
+
+class ActivityStore:
+    """
+    Per-athlete append-only store of 1 Hz activity channels, read through np.memmap.
+
+    Every channel is one flat binary file of a fixed-width dtype, with all activities laid end
+    to end. The index maps each workout to its (offset, length, start time, sport). Appending
+    writes the new samples at the end of each channel file, syncs them to disk and then commits
+    the (small) index with an atomic rename, so existing data is never rewritten and a committed
+    index never points at samples lost in a crash; samples past the committed index (e.g. from an
+    interrupted append) are ignored and overwritten by the next append. Reads return memmap
+    slices, so analytics over any part of the history touch only the pages they need.
+
+    Attributes:
+        path (str): Directory of the store.
+        channels (dict): Channel names mapped to their numpy dtypes.
+        index (np.ndarray): Structured array (INDEX_DTYPE) of the stored activities, in append order.
+    """
+
+    META = "meta.json"
+    INDEX = "index.npz"
+
+    def __init__(self, path, channels=None):
+        """
+        Opens (or creates) a store.
+
+        Args:
+            path (str): Directory of the store.
+            channels (dict): Channel names mapped to dtypes for a new store. Defaults to
+                DEFAULT_CHANNELS; ignored when the store already exists.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, self.META)
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                channels = json.load(meta_file)["channels"]
+        else:
+            channels = dict(DEFAULT_CHANNELS if channels is None else channels)
+            meta = json.dumps({"channels": channels}).encode("utf-8")
+            self._write_atomic(meta_path, lambda meta_file: meta_file.write(meta))
+        self.channels = {name: np.dtype(dtype) for name, dtype in channels.items()}
+
+        index_path = os.path.join(path, self.INDEX)
+        self.index = self._load_index(index_path) if os.path.exists(index_path) else np.empty(0, dtype=INDEX_DTYPE)
+        self._positions = {workout_id: i for i, workout_id in enumerate(self.index["workout_id"])}
+        self._maps = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, workout_id):
+        return str(workout_id) in self._positions
+
+    @property
+    def total_samples(self):
+        """Number of committed samples in every channel."""
+        return int((self.index["offset"] + self.index["length"]).max()) if len(self.index) else 0
+
+    def _channel_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    @staticmethod
+    def _fsync_directory(path):
+        """Makes new and renamed entries of a directory durable (skipped where directories cannot be opened)."""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @classmethod
+    def _write_atomic(cls, path, write):
+        with open(path + ".tmp", "wb") as tmp_file:
+            write(tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(path + ".tmp", path)
+        cls._fsync_directory(os.path.dirname(path))
+
+    @staticmethod
+    def _load_index(path):
+        with np.load(path, allow_pickle=False) as arrays:
+            id_bytes = arrays["id_bytes"].tobytes()
+            id_offsets = arrays["id_offsets"]
+            index = np.empty(len(id_offsets) - 1, dtype=INDEX_DTYPE)
+            index["workout_id"] = [id_bytes[a:b].decode("utf-8") for a, b in zip(id_offsets[:-1], id_offsets[1:])]
+            for name in INDEX_DTYPE.names[1:]:
+                index[name] = arrays[name]
+        return index
+
+    @staticmethod
+    def _save_index(index_file, index):
+        encoded = [workout_id.encode("utf-8") for workout_id in index["workout_id"]]
+        id_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(workout_id) for workout_id in encoded], out=id_offsets[1:])
+        np.savez(index_file, id_bytes=np.frombuffer(b"".join(encoded), dtype=np.uint8), id_offsets=id_offsets,
+                 **{name: index[name] for name in INDEX_DTYPE.names[1:]})
+
+    def append(self, workout_id, start_time, sport, channels):
+        """
+        Appends one activity.
+
+        Args:
+            workout_id (str): The activity identifier.
+            start_time (datetime-like): When the activity started.
+            sport (str): The sport (e.g. "cycling").
+            channels (dict): Channel names mapped to equal-length sample arrays. Channels of the
+                store that are missing are filled with NaN (or 0 for integer channels).
+
+        Raises:
+            ValueError: If the workout is already stored or the channel lengths differ.
+        """
+        self.extend([(workout_id, start_time, sport, channels)])
+
+    def extend(self, activities):
+        """
+        Appends several activities with a single index commit.
+
+        Args:
+            activities (iterable): (workout_id, start_time, sport, channels) tuples, see append().
+
+        Raises:
+            ValueError: If a workout is already stored, an activity's channel lengths differ, or a
+                channel file is shorter than the committed index (lost committed samples).
+        """
+        rows = []
+        offset = self.total_samples
+        pending = []
+        for workout_id, start_time, sport, channels in activities:
+            workout_id = str(workout_id)
+            if workout_id in self._positions or any(row["workout_id"] == workout_id for row in rows):
+                raise ValueError(f"Workout {workout_id} is already stored")
+            lengths = {len(values) for values in channels.values()}
+            if len(lengths) > 1:
+                raise ValueError(f"Channels of workout {workout_id} have different lengths: {sorted(lengths)}")
+            length = lengths.pop() if lengths else 0
+            start = pd.Timestamp(start_time)
+            if start.tzinfo is not None:
+                start = start.tz_convert(None)
+            rows.append({"workout_id": workout_id, "offset": offset, "length": length,
+                         "start": np.datetime64(start.to_datetime64(), "s"), "sport": sport or ""})
+            pending.append(channels)
+            offset += length
+        if not rows:
+            return
+
+        committed = self.total_samples
+        for name, dtype in self.channels.items():
+            path = self._channel_path(name)
+            size = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+            if size < committed:
+                raise ValueError(f"Channel {name} holds {size} samples, the index needs {committed}")
+        for name, dtype in self.channels.items():
+            fill = np.nan if dtype.kind == "f" else 0
+            with open(self._channel_path(name), "ab") as channel_file:
+                channel_file.truncate(committed * dtype.itemsize)  # drop samples of an interrupted append
+                for row, channels in zip(rows, pending):
+                    values = channels.get(name)
+                    if values is None:
+                        values = np.full(row["length"], fill, dtype=dtype)
+                    channel_file.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+                channel_file.flush()
+                os.fsync(channel_file.fileno())
+        self._fsync_directory(self.path)  # channel files created by this append
+
+        new_rows = np.array([tuple(row[field] for field in INDEX_DTYPE.names) for row in rows], dtype=INDEX_DTYPE)
+        index = np.concatenate((self.index, new_rows))
+        self._write_atomic(os.path.join(self.path, self.INDEX), lambda index_file: self._save_index(index_file, index))
+        for row in rows:
+            self._positions[row["workout_id"]] = len(self._positions)
+        self.index = index
+        self._maps = {}
+
+    def append_activities(self, df):
+        """
+        Appends every workout of a combined frame that is not stored yet.
+
+        Args:
+            df (pd.DataFrame): Frame with 'workout_id' and 'timestamp' columns plus any channel
+                columns, e.g. the output of FitFileProcessor.process_directory (default or
+                compact schema). A 'sport_type' column sets the sport.
+
+        Returns:
+            int: Number of workouts appended.
+        """
+        activities = []
+        for workout_id, group in df.groupby("workout_id", sort=False, observed=True):
+            if str(workout_id) in self._positions:
+                continue
+            timestamps = group["timestamp"].to_numpy()
+            if timestamps.dtype.kind == "M":
+                timestamps = timestamps.astype("datetime64[s]").astype(np.int64)
+            channels = {name: group[name].to_numpy() for name in self.channels if name in group.columns}
+            channels["timestamp"] = timestamps
+            sport = group["sport_type"].iloc[0] if "sport_type" in group.columns and len(group) else ""
+            start = np.datetime64(int(timestamps.min()), "s") if len(timestamps) else np.datetime64(0, "s")
+            activities.append((workout_id, start, str(sport), channels))
+        self.extend(activities)
+        return len(activities)
+
+    def channel(self, name):
+        """
+        Returns a read-only memmap of a channel over all committed samples.
+
+        Args:
+            name (str): Channel name.
+
+        Returns:
+            np.ndarray: The channel (a memmap, or an empty array for an empty store).
+        """
+        if name not in self._maps:
+            dtype = self.channels[name]
+            total = self.total_samples
+            if total == 0:
+                self._maps[name] = np.empty(0, dtype=dtype)
+            else:
+                size = os.path.getsize(self._channel_path(name)) // dtype.itemsize
+                if size < total:
+                    raise ValueError(f"Channel {name} holds {size} samples, the index needs {total}")
+                self._maps[name] = np.memmap(self._channel_path(name), dtype=dtype, mode="r", shape=(total,))
+        return self._maps[name]
+
+    def get(self, workout_id, channels=None):
+        """
+        Returns zero-copy views of one workout's channels.
+
+        Args:
+            workout_id (str): The activity identifier.
+            channels (list): Channel names. Defaults to all channels.
+
+        Returns:
+            dict: Channel names mapped to memmap slices.
+
+        Raises:
+            KeyError: If the workout is not stored.
+        """
+        row = self.index[self._positions[str(workout_id)]]
+        start, stop = row["offset"], row["offset"] + row["length"]
+        return {name: self.channel(name)[start:stop] for name in (channels or self.channels)}
+
+    def frame(self, workout_id, channels=None):
+        """
+        Loads one workout as a DataFrame (a copy), with timestamps as datetimes.
+
+        Args:
+            workout_id (str): The activity identifier.
+            channels (list): Channel names. Defaults to all channels.
+
+        Returns:
+            pd.DataFrame: One column per channel.
+        """
+        data = {name: np.array(values) for name, values in self.get(workout_id, channels).items()}
+        if "timestamp" in data:
+            data["timestamp"] = data["timestamp"].astype("datetime64[s]")
+        return pd.DataFrame(data)
+
+    def select(self, start=None, end=None, sport=None):
+        """
+        Selects the index rows of the workouts that started within [start, end].
+
+        Args:
+            start (datetime-like): First start time included, or None for no lower bound.
+            end (datetime-like): Last start time included, or None for no upper bound.
+            sport (str): Only workouts of this sport.
+
+        Returns:
+            np.ndarray: Matching index rows, sorted by start time.
+        """
+        mask = np.ones(len(self.index), dtype=bool)
+        if start is not None:
+            mask &= self.index["start"] >= np.datetime64(pd.Timestamp(start).to_datetime64(), "s")
+        if end is not None:
+            mask &= self.index["start"] <= np.datetime64(pd.Timestamp(end).to_datetime64(), "s")
+        if sport is not None:
+            mask &= self.index["sport"] == sport
+        rows = self.index[mask]
+        return rows[np.argsort(rows["start"], kind="stable")]
+
+    def slices(self, name, rows):
+        """
+        Returns zero-copy views of one channel for the given index rows.
+
+        Args:
+            name (str): Channel name.
+            rows (np.ndarray): Index rows, e.g. from select().
+
+        Returns:
+            list: One memmap slice per row.
+        """
+        channel = self.channel(name)
+        return [channel[offset:offset + length] for offset, length in zip(rows["offset"], rows["length"])]
+
+    def mean_max_power(self, durations, start=None, end=None, sport=None):
+        """
+        Mean-maximal power curves of the selected workouts, read straight from the memmaps.
+
+        Args:
+            durations (array-like of int): Durations in seconds.
+            start, end, sport: Selection, see select().
+
+        Returns:
+            pd.DataFrame: One row per workout_id, one column per duration (NaN where too short).
+        """
+        rows = self.select(start, end, sport)
+        curves = mean_max_power_batch(self.slices("power", rows), durations)
+        return pd.DataFrame(curves, index=pd.Index(rows["workout_id"], name="workout_id"),
+                            columns=pd.Index(durations, name="Duration (s)"))
+
+    def normalized_power(self, start=None, end=None, sport=None):
+        """
+        Normalized and average power of the selected workouts.
+
+        Args:
+            start, end, sport: Selection, see select().
+
+        Returns:
+            pd.DataFrame: 'normalized_power' and 'average_power' per workout_id (NaN below 30 samples).
+        """
+        rows = self.select(start, end, sport)
+        results = [NormalizedPowerAccumulator().update(power).result() for power in self.slices("power", rows)]
+        return pd.DataFrame(
+            [[np.nan if value is None else value for value in result] for result in results],
+            index=pd.Index(rows["workout_id"], name="workout_id"),
+            columns=["normalized_power", "average_power"],
+        )
+
+    def best_efforts(self, targets, tolerance=0.01, start=None, end=None, sport=None):
+        """
+        Fastest time over each target distance in the selected workouts.
+
+        Args:
+            targets (dict): Labels mapped to target distances in meters.
+            tolerance (float): Allowed deviation as a fraction of each target.
+            start, end, sport: Selection, see select().
+
+        Returns:
+            pd.DataFrame: Seconds per workout_id (rows) and target label (columns), NaN where the
+            workout has no matching segment.
+        """
+        rows = self.select(start, end, sport)
+        runs = []
+        for distance, timestamp in zip(self.slices("distance", rows), self.slices("timestamp", rows)):
+            valid = ~np.isnan(distance)
+            timestamp = timestamp[valid]
+            runs.append((distance[valid], timestamp - timestamp[0] if len(timestamp) else timestamp))
+        seconds = find_best_efforts_batch(runs, list(targets.values()), tolerance)
+        return pd.DataFrame(seconds, index=pd.Index(rows["workout_id"], name="workout_id"), columns=list(targets))
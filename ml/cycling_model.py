@@ -1,16 +1,42 @@
 import numpy as np
-from scipy.optimize import curve_fit
-import matplotlib.pyplot as plt
+import pandas as pd
 
 # Logarithmic fatigue-adjusted CP model
 def fatigue_log_cp_model(time, cp, w_prime, k, alpha, F):
     return cp + (w_prime / ((time + k) ** alpha)) - F * np.log(time + 1)
 
-def predict_long_duration_power(short_durations, short_power, long_durations_to_predict, cp20):
-    short_durations_seconds = np.array(short_durations) * 60
-    long_durations_seconds = np.array(long_durations_to_predict) * 60
-    short_power_array = np.array(short_power)
+def fatigue_log_cp_jacobian(time, cp, w_prime, k, alpha, F):
+    """
+    Analytic partial derivatives of fatigue_log_cp_model with respect to (cp, w_prime, k, alpha, F).
+
+    Args:
+    time (np.ndarray): Durations in seconds.
+    cp, w_prime, k, alpha, F (float or np.ndarray): Model parameters (broadcast against time).
+
+    Returns:
+    np.ndarray: Array of shape time.shape + (5,).
+    """
+    decay = (time + k) ** -alpha
+    return np.stack(np.broadcast_arrays(
+        np.ones_like(decay),
+        decay,
+        -alpha * w_prime * decay / (time + k),
+        -w_prime * decay * np.log(time + k),
+        -np.log(time + 1),
+    ), axis=-1)
+
+def cp_fit_start(short_durations_seconds, short_power_array, cp20):
+    """
+    Initial guess and bounds of the fatigue-log CP fit.
+
+    Args:
+    short_durations_seconds (np.ndarray): Measured durations in seconds.
+    short_power_array (np.ndarray): Best power (watts) at each measured duration.
+    cp20 (float): The athlete's 20-minute power reference.
 
+    Returns:
+    tuple: (p0, (lower_bounds, upper_bounds)) for (cp, w_prime, k, alpha, F).
+    """
     # Set a more conservative CP guess
     initial_cp = 0.95 * cp20  # Start CP at ~98% of 60-min power
     initial_w_prime = (short_power_array[0] - initial_cp) * short_durations_seconds[0]
@@ -33,6 +59,16 @@ def predict_long_duration_power(short_durations, short_power, long_durations_to_
     # Ensure initial conditions are inside bounds
     p0 = np.clip([initial_cp, initial_w_prime, initial_k, initial_alpha, initial_F],
                  bounds[0], bounds[1])
+    return p0, bounds
+
+def predict_long_duration_power(short_durations, short_power, long_durations_to_predict, cp20):
+    from scipy.optimize import curve_fit
+
+    short_durations_seconds = np.array(short_durations) * 60
+    long_durations_seconds = np.array(long_durations_to_predict) * 60
+    short_power_array = np.array(short_power)
+
+    p0, bounds = cp_fit_start(short_durations_seconds, short_power_array, cp20)
 
     popt, _ = curve_fit(
         fatigue_log_cp_model,
@@ -48,60 +84,379 @@ def predict_long_duration_power(short_durations, short_power, long_durations_to_
 
     return predicted_power, cp, w_prime, k, alpha, F
 
-cp20 = 332
-short_durations_minutes = [1, 5, 10, 20, 30, 60,90,120]
-short_power_watts = [435, 388, 332, 328, 270, 244, 241,232]  # Example power data
-long_durations_minutes_to_predict = [120, 150, 300]
-
-predicted_power_watts, fitted_cp, fitted_w_prime, fitted_k, fitted_alpha, fitted_F = predict_long_duration_power(
-    short_durations_minutes, short_power_watts, long_durations_minutes_to_predict, cp20
-)
-
-print(f"Predicted power for 120 minutes: {predicted_power_watts[0]:.2f} watts")
-print(f"Predicted power for 300 minutes: {predicted_power_watts[1]:.2f} watts")
-print(f"Fitted Critical Power (CP): {fitted_cp:.2f} watts")
-print(f"Fitted W' (W prime): {fitted_w_prime:.2f} Joules")
-print(f"Fitted k (offset factor): {fitted_k:.2f}")
-print(f"Fitted alpha (decay exponent): {fitted_alpha:.2f}")
-print(f"Fitted F (fatigue factor): {fitted_F:.2f}")
-
-all_durations_minutes = short_durations_minutes + long_durations_minutes_to_predict
-all_durations_seconds = np.array(all_durations_minutes) * 60
-all_power_watts = short_power_watts + list(predicted_power_watts)
-
-plt.figure(figsize=(10,6))
-plt.scatter(short_durations_minutes, short_power_watts, label="Measured Data", color='blue')
-plt.scatter(long_durations_minutes_to_predict, predicted_power_watts, label="Predicted Data", color='red')
-plt.plot(all_durations_minutes, fatigue_log_cp_model(np.array(all_durations_minutes)*60, fitted_cp, fitted_w_prime, fitted_k, fitted_alpha, fitted_F), label="Fitted Curve", linestyle="dashed", color="black")
-plt.xlabel("Duration (minutes)")
-plt.ylabel("Power (watts)")
-plt.title("Tanner -> Power-Duration Curve Prediction (Fatigue-Log Model)")
-plt.legend()
-plt.grid(True)
-plt.show()
+def fit_cp_models_batch(short_durations, short_powers, long_durations_to_predict, cp20s,
+                        initial_params=None, max_iter=200, ftol=1e-8, xtol=1e-8, gtol=1e-8):
+    """
+    Fit the fatigue-log CP model for many athletes in one vectorized call.
+
+    Runs a bounded Levenberg-Marquardt iteration on all athletes at once: parameters are
+    rescaled to [0, 1] within each athlete's bounds (the same bounds as
+    predict_long_duration_power), the 5x5 normal equations of every athlete are built from the
+    analytic Jacobian and solved together, and steps are projected back into the bounds.
+    Athletes drop out of the iteration as they converge.
 
+    Args:
+    short_durations (list of array-like): Measured durations (minutes) for each athlete. Athletes
+        may have different numbers of points.
+    short_powers (list of array-like): Best power (watts) at those durations for each athlete.
+    long_durations_to_predict (array-like): Durations (minutes) to predict, shared by all athletes.
+    cp20s (array-like): 20-minute power reference of each athlete.
+    initial_params (array-like): Optional (n_athletes, 5) warm start, e.g. each athlete's previous
+        (cp, w_prime, k, alpha, F). Rows containing NaN use the default initial guess.
+    max_iter (int): Maximum number of iterations.
+    ftol (float): Stop an athlete when an accepted step reduces its cost by less than this fraction.
+    xtol (float): Stop an athlete when its scaled step is smaller than this.
+    gtol (float): Stop an athlete when its projected gradient is below this fraction of its cost.
 
-def peak_avg_wattage(df, time_window):
+    Returns:
+    tuple: (results, status) where results is a list with one
+    (predicted_power, cp, w_prime, k, alpha, F) tuple per athlete, and status is a DataFrame
+    with 'converged', 'iterations' and 'rmse' columns.
     """
-    Calculate the peak average wattage over a specified time window.
+    n_athletes = len(short_durations)
+    n_points = max(len(durations) for durations in short_durations)
+    times = np.full((n_athletes, n_points), 60.0)
+    powers = np.zeros((n_athletes, n_points))
+    mask = np.zeros((n_athletes, n_points))
+    lower = np.empty((n_athletes, 5))
+    upper = np.empty((n_athletes, 5))
+    start = np.empty((n_athletes, 5))
+    for i, (durations, power, cp20) in enumerate(zip(short_durations, short_powers, cp20s)):
+        durations_seconds = np.asarray(durations, dtype=np.float64) * 60
+        power = np.asarray(power, dtype=np.float64)
+        times[i, :len(durations_seconds)] = durations_seconds
+        powers[i, :len(power)] = power
+        mask[i, :len(power)] = 1.0
+        start[i], (lower[i], upper[i]) = cp_fit_start(durations_seconds, power, cp20)
+    if initial_params is not None:
+        warm = np.asarray(initial_params, dtype=np.float64)
+        use_warm = ~np.isnan(warm).any(axis=1)
+        start[use_warm] = np.clip(warm[use_warm], lower[use_warm], upper[use_warm])
+
+    scale = upper - lower
+
+    def residuals(rows, x_rows):
+        params = lower[rows] + x_rows * scale[rows]
+        model = fatigue_log_cp_model(times[rows], *(params[:, j, None] for j in range(5)))
+        return params, mask[rows] * (model - powers[rows])
+
+    everyone = np.arange(n_athletes)
+    x = (start - lower) / scale
+    cost = (residuals(everyone, x)[1] ** 2).sum(axis=1)
+    damping = np.full(n_athletes, 1e-3)
+    converged = np.zeros(n_athletes, dtype=bool)
+    iterations = np.zeros(n_athletes, dtype=int)
+    active = everyone
+
+    for _ in range(max_iter):
+        if not len(active):
+            break
+        iterations[active] += 1
+        params, residual = residuals(active, x[active])
+        jacobian = fatigue_log_cp_jacobian(times[active], *(params[:, j, None] for j in range(5)))
+        jacobian *= mask[active][..., None] * scale[active][:, None, :]
+
+        # Damped normal equations of every active athlete, solved together. Parameters held at a
+        # bound by the gradient are frozen for this step.
+        gradient = np.einsum("anp,an->ap", jacobian, residual)
+        held = ((x[active] <= 0) & (gradient > 0)) | ((x[active] >= 1) & (gradient < 0))
+        free = (~held).astype(float)
+        hessian = np.einsum("anp,anq->apq", jacobian, jacobian) * free[:, :, None] * free[:, None, :]
+        diagonal = np.einsum("app->ap", hessian)
+        system = hessian + ((damping[active, None] * diagonal + 1e-12) * free + (1 - free))[..., None] * np.eye(5)
+        step = -np.linalg.solve(system, (gradient * free)[..., None])[..., 0]
+
+        trial_x = np.clip(x[active] + step, 0.0, 1.0)
+        trial_cost = (residuals(active, trial_x)[1] ** 2).sum(axis=1)
+        accepted = trial_cost < cost[active]
+        step_size = np.abs(trial_x - x[active]).max(axis=1)
+        reduction = (cost[active] - trial_cost) / np.maximum(cost[active], 1e-300)
+
+        accepted_rows = active[accepted]
+        x[accepted_rows] = trial_x[accepted]
+        cost[accepted_rows] = trial_cost[accepted]
+        damping[accepted_rows] = np.maximum(damping[accepted_rows] / 3, 1e-12)
+        damping[active[~accepted]] *= 4
+
+        stalled = damping[active] > 1e12
+        flat = np.abs(gradient * free).max(axis=1) < gtol * np.maximum(cost[active], 1.0)
+        done = (accepted & (reduction < ftol)) | (step_size < xtol) | flat | stalled
+        converged[active[done & ~stalled]] = True
+        active = active[~done]
+
+    fitted = lower + x * scale
+    long_durations_seconds = np.asarray(long_durations_to_predict, dtype=np.float64) * 60
+    results = []
+    for cp, w_prime, k, alpha, F in fitted:
+        predicted_power = fatigue_log_cp_model(long_durations_seconds, cp, w_prime, k, alpha, F)
+        results.append((predicted_power, cp, w_prime, k, alpha, F))
+    status = pd.DataFrame({
+        "converged": converged,
+        "iterations": iterations,
+        "rmse": np.sqrt(cost / mask.sum(axis=1)),
+    })
+    return results, status
+
+BOOTSTRAP_METHODS = ("residual", "case", "jackknife")
+
+
+def _fit_resample_chunk(chunk):
+    """Fit one chunk of resamples with fit_cp_models_batch (module level so a process pool can run it)."""
+    durations, powers, cp20s, initial_params = chunk
+    results, status = fit_cp_models_batch(durations, powers, [], cp20s, initial_params=initial_params)
+    return np.array([result[1:] for result in results]), status["converged"].to_numpy()
+
+
+def _resample_athlete(durations, power, fitted_power, n_resamples, method, rng):
+    """Draw the (durations, power) rows of one athlete's resamples."""
+    n = len(power)
+    if method == "jackknife":
+        keep = ~np.eye(n, dtype=bool)
+        return [durations[row] for row in keep], [power[row] for row in keep]
+    if method == "case":
+        index = rng.integers(0, n, size=(n_resamples, n))
+        return list(durations[index]), list(power[index])
+    # Residual bootstrap: the measured durations are kept, centred residuals of the point fit are
+    # resampled onto the fitted curve (inflated for the 5 fitted parameters when there are spare points)
+    residual = power - fitted_power
+    residual = residual - residual.mean()
+    if n > 5:
+        residual *= np.sqrt(n / (n - 5))
+    index = rng.integers(0, n, size=(n_resamples, n))
+    return [durations] * n_resamples, list(fitted_power + residual[index])
+
+
+def bootstrap_cp_models_batch(short_durations, short_powers, long_durations_to_predict, cp20s,
+                              n_resamples=1000, method="residual", percentiles=(5, 50, 95), seed=None,
+                              batch_size=4096, workers=1):
+    """
+    Estimate the uncertainty of fatigue-log CP fits by refitting resampled power curves.
+
+    Every athlete's measured points are resampled n_resamples times and all refits are run
+    through fit_cp_models_batch (warm started from the athlete's point fit), in chunks of
+    batch_size rows, optionally spread over a process pool. The resamples are drawn up front
+    from one random stream per athlete (spawned from seed), so the bands depend only on the
+    seed, not on batch_size, workers or the other athletes in the batch.
+
+    - "residual": residuals of the point fit are resampled onto the fitted curve, keeping the
+      measured durations (stable with the few points of a typical power curve).
+    - "case": the (duration, power) points themselves are drawn with replacement.
+    - "jackknife": one refit per left-out point (n_resamples is ignored); the bands are normal
+      intervals around the point fit from the jackknife standard error.
 
     Args:
-    df (pd.DataFrame): The dataframe containing time series power data.
-    time_window (int): The time window in seconds over which to calculate the average power.
+    short_durations (list of array-like): Measured durations (minutes) for each athlete.
+    short_powers (list of array-like): Best power (watts) at those durations for each athlete.
+    long_durations_to_predict (array-like): Durations (minutes) to predict, shared by all athletes.
+    cp20s (array-like): 20-minute power reference of each athlete.
+    n_resamples (int): Bootstrap resamples per athlete.
+    method (str): "residual", "case" or "jackknife".
+    percentiles (iterable): Percentiles (0-100) of the bands.
+    seed (int): Seed of the resampling; the same seed gives the same bands.
+    batch_size (int): Maximum number of refits per fit_cp_models_batch call.
+    workers (int): Number of processes for the refits (1 runs them in this process).
+
+    Returns:
+    pd.DataFrame: Indexed by (athlete, quantity), where athlete is the position in the input and
+    quantity is 'cp', 'w_prime' or 'power_<minutes>' for each predicted duration, with the point
+    fit in 'estimate', one 'p<percentile>' column per percentile and the fraction of converged
+    refits in 'converged'.
+    """
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    n_athletes = len(short_durations)
+    long_durations_seconds = np.asarray(long_durations_to_predict, dtype=np.float64) * 60
+    quantities = ["cp", "w_prime"] + [f"power_{minutes:g}" for minutes in np.asarray(long_durations_to_predict)]
+    columns = ["estimate"] + [f"p{q:g}" for q in percentiles] + ["converged"]
+    index = pd.MultiIndex.from_product([range(n_athletes), quantities], names=["athlete", "quantity"])
+    if not n_athletes:
+        return pd.DataFrame(columns=columns, index=index, dtype=np.float64)
+
+    results, _ = fit_cp_models_batch(short_durations, short_powers, long_durations_to_predict, cp20s)
+    point = np.array([result[1:] for result in results])
+
+    # Draw every athlete's resamples, then fit them all as one long batch
+    rngs = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(n_athletes)]
+    durations, powers, owners = [], [], []
+    for i, (athlete_durations, power) in enumerate(zip(short_durations, short_powers)):
+        athlete_durations = np.asarray(athlete_durations, dtype=np.float64)
+        power = np.asarray(power, dtype=np.float64)
+        fitted_power = fatigue_log_cp_model(athlete_durations * 60, *point[i])
+        rows = _resample_athlete(athlete_durations, power, fitted_power, n_resamples, method, rngs[i])
+        durations += rows[0]
+        powers += rows[1]
+        owners.append(np.full(len(rows[1]), i))
+    owners = np.concatenate(owners)
+    cp20s = np.asarray(cp20s, dtype=np.float64)
+
+    chunks = [(durations[start:start + batch_size], powers[start:start + batch_size],
+               cp20s[owners[start:start + batch_size]], point[owners[start:start + batch_size]])
+              for start in range(0, len(owners), batch_size)]
+    if workers > 1 and len(chunks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            fits = list(executor.map(_fit_resample_chunk, chunks))
+    else:
+        fits = [_fit_resample_chunk(chunk) for chunk in chunks]
+    params = np.concatenate([fit[0] for fit in fits])
+    converged = np.concatenate([fit[1] for fit in fits])
+
+    # cp, w_prime and the predicted powers of every refit
+    def quantity_values(fits):
+        return np.column_stack([fits[:, :2], fatigue_log_cp_model(long_durations_seconds, *(fits[:, j, None] for j in range(5)))])
+
+    values = quantity_values(params)
+    estimates = quantity_values(point)
+
+    bands = np.empty((n_athletes, len(quantities), len(columns)))
+    if method == "jackknife":
+        from statistics import NormalDist
+        z = np.array([NormalDist().inv_cdf(q / 100) for q in percentiles])
+    for i in range(n_athletes):
+        rows = owners == i
+        bands[i, :, 0] = estimates[i]
+        if method == "jackknife":
+            n = rows.sum()
+            spread = values[rows] - values[rows].mean(axis=0)
+            standard_error = np.sqrt((n - 1) / n * (spread ** 2).sum(axis=0))
+            bands[i, :, 1:-1] = estimates[i][:, None] + standard_error[:, None] * z
+        else:
+            bands[i, :, 1:-1] = np.percentile(values[rows], percentiles, axis=0).T
+        bands[i, :, -1] = converged[rows].mean()
+    return pd.DataFrame(bands.reshape(-1, len(columns)), index=index, columns=columns)
+
+
+def bootstrap_long_duration_power(short_durations, short_power, long_durations_to_predict, cp20,
+                                  n_resamples=1000, method="residual", percentiles=(5, 50, 95), seed=None,
+                                  workers=1):
+    """
+    Percentile bands of predict_long_duration_power for one athlete (see bootstrap_cp_models_batch).
+
+    Args:
+    short_durations (array-like): Measured durations (minutes).
+    short_power (array-like): Best power (watts) at those durations.
+    long_durations_to_predict (array-like): Durations (minutes) to predict.
+    cp20 (float): 20-minute power reference.
+    n_resamples (int): Bootstrap resamples.
+    method (str): "residual", "case" or "jackknife".
+    percentiles (iterable): Percentiles (0-100) of the bands.
+    seed (int): Seed of the resampling; the same seed gives the same bands.
+    workers (int): Number of processes for the refits.
+
+    Returns:
+    pd.DataFrame: Indexed by quantity ('cp', 'w_prime', 'power_<minutes>') with 'estimate',
+    'p<percentile>' and 'converged' columns.
+    """
+    bands = bootstrap_cp_models_batch([short_durations], [short_power], long_durations_to_predict, [cp20],
+                                      n_resamples=n_resamples, method=method, percentiles=percentiles,
+                                      seed=seed, workers=workers)
+    return bands.loc[0]
+
+
+def mmp_durations(max_duration, dense_until=60, points_per_decade=40):
+    """
+    Build a duration grid for a mean-maximal power curve.
+
+    Args:
+    max_duration (int): The longest duration (seconds) to include, usually the ride length.
+    dense_until (int): Every second up to this duration is included.
+    points_per_decade (int): Number of log-spaced durations per factor of ten beyond dense_until.
+
+    Returns:
+    np.ndarray: Sorted unique integer durations in seconds.
+    """
+    max_duration = int(max_duration)
+    dense = np.arange(1, min(dense_until, max_duration) + 1)
+    if max_duration <= dense_until:
+        return dense
+    num = int(np.ceil(np.log10(max_duration / dense_until) * points_per_decade)) + 1
+    spaced = np.round(np.logspace(np.log10(dense_until), np.log10(max_duration), num)).astype(int)
+    return np.union1d(dense, spaced)
+
+
+def mean_max_power(power, durations=None):
+    """
+    Calculate the mean-maximal power (best average power) for each duration in one ride.
+
+    Each duration is one vectorized pass over the cumulative sum of power, so the input is never
+    modified and only full windows count: a duration longer than the ride yields NaN. Compact
+    (float32 or integer) power is read as is; only the cumulative sum is float64.
+
+    Args:
+    power (array-like): 1 Hz power samples (watts). NaNs are treated as 0 W.
+    durations (array-like of int): Durations in seconds. Defaults to mmp_durations(len(power)).
 
     Returns:
-    float: The maximum average power found in the dataset over the specified time window.
+    np.ndarray: Best average power for each duration (NaN when the ride is too short).
     """
-    # Ensure 'watts' column has no NaNs
-    df['watts'] = df['watts'].fillna(0)
+    watts = np.asarray(power)
+    n = len(watts)
+    if durations is None:
+        durations = mmp_durations(n)
+    durations = np.asarray(durations, dtype=np.int64)
+
+    cumulative = np.concatenate(([0.0], np.nancumsum(watts, dtype=np.float64)))
+    curve = np.full(len(durations), np.nan)
+    for i, duration in enumerate(durations):
+        if 0 < duration <= n:
+            curve[i] = (cumulative[duration:] - cumulative[:-duration]).max() / duration
+    return curve
 
-    # Compute the rolling average power over the specified time window
-    df['rolling_avg'] = df['watts'].rolling(window=time_window, min_periods=1).mean()
 
-    # Find the peak (maximum) average power
-    peak_avg_wattage = df['rolling_avg'].max()
+def mean_max_power_batch(rides, durations, batch_size=64):
+    """
+    Calculate mean-maximal power curves for many rides at once.
 
-    return peak_avg_wattage
+    Rides are sorted by length and stacked into zero-padded matrices of batch_size rides, so each
+    duration is a single vectorized pass over the whole batch. Windows reaching into a ride's
+    padding are excluded.
+
+    Args:
+    rides (iterable of array-like): 1 Hz power samples (watts) of each ride.
+    durations (array-like of int): Durations in seconds, shared by all rides.
+    batch_size (int): Number of rides stacked per matrix (bounds memory use).
+
+    Returns:
+    np.ndarray: Array of shape (n_rides, n_durations), NaN where a ride is shorter than the duration.
+    """
+    rides = [np.asarray(ride) for ride in rides]
+    durations = np.asarray(durations, dtype=np.int64)
+    lengths = np.array([len(ride) for ride in rides], dtype=np.int64)
+    curves = np.full((len(rides), len(durations)), np.nan)
+
+    order = np.argsort(lengths, kind="stable")
+    for start in range(0, len(order), batch_size):
+        index = order[start:start + batch_size]
+        batch_lengths = lengths[index]
+        width = int(batch_lengths.max()) if len(index) else 0
+        cumulative = np.zeros((len(index), width + 1))
+        for row, ride in enumerate(index):
+            np.nancumsum(rides[ride], dtype=np.float64, out=cumulative[row, 1:batch_lengths[row] + 1])
+        for i, duration in enumerate(durations):
+            if duration <= 0 or duration > width:
+                continue
+            sums = cumulative[:, duration:] - cumulative[:, :-duration]
+            window_ends = np.arange(duration, width + 1)
+            sums[window_ends[None, :] > batch_lengths[:, None]] = -np.inf
+            best = sums.max(axis=1) / duration
+            best[batch_lengths < duration] = np.nan
+            curves[index, i] = best
+    return curves
+
+
+def peak_avg_wattage(df, time_window):
+    """
+    Calculate the peak average wattage over a specified time window.
+
+    Args:
+    df (pd.DataFrame): The dataframe containing time series power data (not modified).
+    time_window (int): The time window in seconds over which to calculate the average power.
+
+    Returns:
+    float: The maximum average power over any full time window, or NaN if the data is shorter
+    than the window.
+    """
+    return mean_max_power(df['watts'], [time_window])[0]
 
 def evaluate_peak_avg_wattages(df, time_windows):
     """
@@ -117,11 +472,12 @@ def evaluate_peak_avg_wattages(df, time_windows):
     # Get the total duration of the dataset
     total_time = df["time"].max() - df["time"].min()
 
-    # Evaluate peak average wattage for valid time windows
+    # Evaluate peak average wattage for all windows in one pass over the power data
+    curve = mean_max_power(df["watts"], time_windows)
     results = {}
-    for time_window in time_windows:
-        if total_time >= time_window:
-            results[time_window] = peak_avg_wattage(df, time_window)
+    for time_window, peak in zip(time_windows, curve):
+        if total_time >= time_window and not np.isnan(peak):
+            results[time_window] = peak
         else:
             results[time_window] = None
 
@@ -138,45 +494,147 @@ def evaluate_peak_avg_wattages(df, time_windows):
 # print(results_df)
 
 
-import pandas as pd
-import numpy as np
+NP_WINDOW_SIZE = 30
+
+
+class NormalizedPowerAccumulator:
+    """
+    Online normalized power and average power, fed one chunk of samples at a time.
+
+    Gives the same values as cycling_normalized_power over the concatenated samples: missing
+    values are skipped, and the last 29 valid samples are carried over so 30-sample rolling
+    windows span chunk boundaries. Suitable for streaming ingest and live rides.
+
+    Attributes:
+        samples (int): Number of valid power samples seen.
+        windows (int): Number of complete 30-sample windows seen.
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.windows = 0
+        self._tail = np.empty(0)
+        self._sum = 0.0
+        self._sum_fourth = 0.0
+
+    def update(self, power):
+        """
+        Adds a chunk of power samples.
+
+        Args:
+            power (array-like): Power values (watts); NaN, None and infinite values are skipped.
+
+        Returns:
+            NormalizedPowerAccumulator: self, for chaining.
+        """
+        # Lists holding None would otherwise become object arrays that slip past the mask
+        values = np.asarray(power, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        self.samples += len(values)
+        # The carried-over tail and the new samples share one buffer that becomes the cumulative sum
+        n_tail = len(self._tail)
+        cumulative = np.empty(n_tail + len(values) + 1)
+        cumulative[0] = 0.0
+        cumulative[1:n_tail + 1] = self._tail
+        cumulative[n_tail + 1:] = values
+        self._tail = cumulative[1:][-(NP_WINDOW_SIZE - 1):].copy()
+        if len(cumulative) > NP_WINDOW_SIZE:
+            np.cumsum(cumulative, out=cumulative)
+            power_30s = (cumulative[NP_WINDOW_SIZE:] - cumulative[:-NP_WINDOW_SIZE]) / NP_WINDOW_SIZE
+            self.windows += len(power_30s)
+            self._sum += power_30s.sum()
+            self._sum_fourth += (power_30s ** 4).sum()
+        return self
+
+    def result(self):
+        """
+        Returns:
+            tuple: (normalized power, average power) so far, or (None, None) before 30 valid samples.
+        """
+        if self.windows == 0:
+            return None, None
+        average_power = round(self._sum / self.windows, 0)
+        normalized_power = round((self._sum_fourth / self.windows) ** 0.25, 0)
+        return normalized_power, average_power
+
 
 def cycling_normalized_power(power):
     """
     Calculates normalized power (np) and average power for cycling data.
 
     Args:
-        power (list or pd.Series): A list or pandas Series of power values (watts).
+        power (list, np.ndarray or pd.Series): Power values (watts). The input is not copied.
 
     Returns:
         tuple: A tuple containing (normalized power, average power).
                Returns (None, None) if the input is invalid or if there are insufficient data points.
     """
-    if not isinstance(power, (list, pd.Series)):
+    if not isinstance(power, (list, np.ndarray, pd.Series)):
         return None, None
 
-    if isinstance(power, list):
-        number_series = pd.Series(power)
-    else:
-        number_series = power.copy()
-
-    number_series = number_series.dropna()
+    return NormalizedPowerAccumulator().update(power).result()
 
-    if len(number_series) < 30:
-        return None, None
 
-    window_size = 30
-    windows = number_series.rolling(window_size)
-    power_30s = windows.mean().dropna()
+def normalized_power_by_workout(df, ftp=None, power_column="power"):
+    """
+    Calculates NP, average power, intensity factor and TSS for every workout of a combined frame.
 
-    if len(power_30s) == 0:
-        return None, None
+    All workouts are handled in one vectorized pass: a single cumulative sum over the valid
+    samples gives every 30-sample window, windows that cross a workout boundary are masked, and
+    per-workout sums are gathered with bincount.
 
-    average_power = round(power_30s.mean(), 0)
+    Args:
+        df (pd.DataFrame): Frame with 'workout_id' and power columns, e.g. the output of
+            FitFileProcessor.process_directory.
+        ftp (float): Functional threshold power used for IF and TSS. If None, both are NaN.
+        power_column (str): Name of the power column ('power', or 'watts' for saved CSVs).
 
-    normalized_power = round((((power_30s**4).mean())**0.25), 0)
+    Returns:
+        pd.DataFrame: One row per workout_id with 'normalized_power', 'average_power' (both
+        rounded like cycling_normalized_power), 'intensity_factor', 'tss' and 'duration_s'
+        (number of valid 1 Hz samples). Workouts with fewer than 30 samples have NaN metrics.
+    """
+    codes, workout_ids = pd.factorize(df["workout_id"], sort=False)
+    power = df[power_column].to_numpy()
+    valid = codes >= 0
+    if power.dtype.kind == "f":
+        valid &= ~np.isnan(power)
+    codes = codes[valid]
+    power = power[valid]
+    if len(codes) and np.any(np.diff(codes) < 0):
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+        power = power[order]
+
+    n_workouts = len(workout_ids)
+    samples = np.bincount(codes, minlength=n_workouts)
+    group_starts = np.concatenate(([0], np.cumsum(samples)[:-1]))
+    position = np.arange(len(codes)) - group_starts[codes]
+
+    cumulative = np.concatenate(([0.0], np.cumsum(power, dtype=np.float64)))
+    window_end = np.flatnonzero(position >= NP_WINDOW_SIZE - 1)
+    power_30s = (cumulative[window_end + 1] - cumulative[window_end + 1 - NP_WINDOW_SIZE]) / NP_WINDOW_SIZE
+    window_codes = codes[window_end]
+
+    windows = np.bincount(window_codes, minlength=n_workouts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_power = np.bincount(window_codes, weights=power_30s, minlength=n_workouts) / windows
+        mean_fourth = np.bincount(window_codes, weights=power_30s ** 4, minlength=n_workouts) / windows
+    normalized_power = mean_fourth ** 0.25
+
+    if ftp:
+        intensity_factor = normalized_power / ftp
+        tss = samples * normalized_power * intensity_factor / (ftp * 3600) * 100
+    else:
+        intensity_factor = tss = np.full(n_workouts, np.nan)
 
-    return normalized_power, average_power
+    return pd.DataFrame({
+        "normalized_power": np.round(normalized_power, 0),
+        "average_power": np.round(mean_power, 0),
+        "intensity_factor": intensity_factor,
+        "tss": tss,
+        "duration_s": samples,
+    }, index=pd.Index(workout_ids, name="workout_id"))
 
 # Example usage
 # power_data = [100, 120, 150, 1130, 110, 180, 200, 190, 170, 160,
@@ -190,3 +648,46 @@ def cycling_normalized_power(power):
 # np_result, avg_result = cycling_normalized_power(power_data)
 # print(f"Normalized power (np): {np_result}")
 # print(f"Average power: {avg_result}")
+
+
+def demo():
+    """
+    Fit the CP model to example power data, print the fitted parameters and plot the curve.
+    """
+    import matplotlib.pyplot as plt
+
+    cp20 = 332
+    short_durations_minutes = [1, 5, 10, 20, 30, 60,90,120]
+    short_power_watts = [435, 388, 332, 328, 270, 244, 241,232]  # Example power data
+    long_durations_minutes_to_predict = [120, 150, 300]
+
+    predicted_power_watts, fitted_cp, fitted_w_prime, fitted_k, fitted_alpha, fitted_F = predict_long_duration_power(
+        short_durations_minutes, short_power_watts, long_durations_minutes_to_predict, cp20
+    )
+
+    print(f"Predicted power for 120 minutes: {predicted_power_watts[0]:.2f} watts")
+    print(f"Predicted power for 300 minutes: {predicted_power_watts[1]:.2f} watts")
+    print(f"Fitted Critical Power (CP): {fitted_cp:.2f} watts")
+    print(f"Fitted W' (W prime): {fitted_w_prime:.2f} Joules")
+    print(f"Fitted k (offset factor): {fitted_k:.2f}")
+    print(f"Fitted alpha (decay exponent): {fitted_alpha:.2f}")
+    print(f"Fitted F (fatigue factor): {fitted_F:.2f}")
+
+    all_durations_minutes = short_durations_minutes + long_durations_minutes_to_predict
+    all_durations_seconds = np.array(all_durations_minutes) * 60
+    all_power_watts = short_power_watts + list(predicted_power_watts)
+
+    plt.figure(figsize=(10,6))
+    plt.scatter(short_durations_minutes, short_power_watts, label="Measured Data", color='blue')
+    plt.scatter(long_durations_minutes_to_predict, predicted_power_watts, label="Predicted Data", color='red')
+    plt.plot(all_durations_minutes, fatigue_log_cp_model(np.array(all_durations_minutes)*60, fitted_cp, fitted_w_prime, fitted_k, fitted_alpha, fitted_F), label="Fitted Curve", linestyle="dashed", color="black")
+    plt.xlabel("Duration (minutes)")
+    plt.ylabel("Power (watts)")
+    plt.title("Tanner -> Power-Duration Curve Prediction (Fatigue-Log Model)")
+    plt.legend()
+    plt.grid(True)
+    plt.show()
+
+
+if __name__ == "__main__":
+    demo()
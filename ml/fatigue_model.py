@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+# Work already done (kJ) before an effort starts, and the effort durations (seconds) tracked
+DEFAULT_WORK_THRESHOLDS_KJ = [0, 1000, 2000, 3000]
+DEFAULT_DURABILITY_DURATIONS = [60, 300, 600, 1200, 1800, 3600]
+
+
+def fatigued_mean_max_power_batch(rides, durations=DEFAULT_DURABILITY_DURATIONS,
+                                  work_thresholds_kj=DEFAULT_WORK_THRESHOLDS_KJ, batch_size=64):
+    """
+    Calculate mean-maximal power curves conditioned on the work done before each effort.
+
+    For a threshold of X kJ, only windows starting after X kJ of cumulative work count. Since
+    cumulative work only grows, the valid starts are a suffix of the ride: each duration's
+    window sums come from one cumulative-sum pass, a reversed running maximum gives the best
+    window starting at or after every sample, and every threshold is then a single lookup.
+    Cost is linear in ride length regardless of the number of thresholds.
+
+    Rides are stacked into zero-padded matrices of batch_size rides of similar length, as in
+    mean_max_power_batch.
+
+    Args:
+        rides (iterable of array-like): 1 Hz power samples (watts) of each ride. NaNs and negative
+            values are treated as 0 W.
+        durations (array-like of int): Effort durations in seconds.
+        work_thresholds_kj (array-like): Work (kJ) that must be done before an effort starts.
+        batch_size (int): Number of rides stacked per matrix (bounds memory use).
+
+    Returns:
+        np.ndarray: Array of shape (n_rides, n_thresholds, n_durations) of best average power,
+        NaN where no full window starts after the threshold.
+    """
+    rides = [np.fmax(np.asarray(ride), 0) for ride in rides]
+    durations = np.asarray(durations, dtype=np.int64)
+    thresholds_j = np.asarray(work_thresholds_kj, dtype=np.float64) * 1000
+    lengths = np.array([len(ride) for ride in rides], dtype=np.int64)
+    curves = np.full((len(rides), len(thresholds_j), len(durations)), np.nan)
+
+    order = np.argsort(lengths, kind="stable")
+    for batch_start in range(0, len(order), batch_size):
+        index = order[batch_start:batch_start + batch_size]
+        batch_lengths = lengths[index]
+        width = int(batch_lengths.max()) if len(index) else 0
+        cumulative = np.zeros((len(index), width + 1))
+        starts = np.empty((len(index), len(thresholds_j)), dtype=np.int64)
+        for row, ride in enumerate(index):
+            length = batch_lengths[row]
+            np.cumsum(rides[ride], dtype=np.float64, out=cumulative[row, 1:length + 1])
+            # First sample at which the work done so far reaches each threshold
+            starts[row] = np.searchsorted(cumulative[row, :length + 1], thresholds_j, side="left")
+            cumulative[row, length + 1:] = cumulative[row, length]
+
+        for i, duration in enumerate(durations):
+            if duration <= 0 or duration > width:
+                continue
+            sums = cumulative[:, duration:] - cumulative[:, :-duration]
+            window_starts = np.arange(width - duration + 1)
+            sums[window_starts[None, :] + duration > batch_lengths[:, None]] = -np.inf
+            best_from = np.maximum.accumulate(sums[:, ::-1], axis=1)[:, ::-1]
+            lookup = np.minimum(starts, width - duration)
+            best = np.take_along_axis(best_from, lookup, axis=1) / duration
+            best[(starts + duration > batch_lengths[:, None]) | ~np.isfinite(best)] = np.nan
+            curves[index, :, i] = best
+    return curves
+
+
+def fatigued_mean_max_power(power, durations=DEFAULT_DURABILITY_DURATIONS,
+                            work_thresholds_kj=DEFAULT_WORK_THRESHOLDS_KJ):
+    """
+    Calculate mean-maximal power curves of one ride conditioned on the work done before each effort.
+
+    Args:
+        power (array-like): 1 Hz power samples (watts).
+        durations (array-like of int): Effort durations in seconds.
+        work_thresholds_kj (array-like): Work (kJ) that must be done before an effort starts.
+
+    Returns:
+        np.ndarray: Array of shape (n_thresholds, n_durations) of best average power.
+    """
+    return fatigued_mean_max_power_batch([power], durations, work_thresholds_kj)[0]
+
+
+def durability_profile(rides, durations=DEFAULT_DURABILITY_DURATIONS,
+                       work_thresholds_kj=DEFAULT_WORK_THRESHOLDS_KJ):
+    """
+    Best power at each duration after each amount of prior work, over a set of rides (e.g. a season).
+
+    Args:
+        rides (iterable of array-like): 1 Hz power samples (watts) of each ride.
+        durations (array-like of int): Effort durations in seconds.
+        work_thresholds_kj (array-like): Work (kJ) that must be done before an effort starts.
+
+    Returns:
+        pd.DataFrame: Best power (watts), indexed by work threshold (kJ) with one column per
+        duration (seconds). NaN where no ride had an effort of that duration after that much work.
+    """
+    curves = fatigued_mean_max_power_batch(rides, durations, work_thresholds_kj)
+    if len(curves):
+        best = np.fmax.reduce(curves, axis=0)
+    else:
+        best = np.full((len(work_thresholds_kj), len(durations)), np.nan)
+    return pd.DataFrame(
+        best,
+        index=pd.Index(work_thresholds_kj, name="Work (kJ)"),
+        columns=pd.Index(durations, name="Duration (s)"),
+    )
+
+
+def durability_score(profile, work_threshold_kj=2000, durations=(300, 1200)):
+    """
+    Durability score: fatigued best power as a fraction of fresh best power.
+
+    Args:
+        profile (pd.DataFrame): Output of durability_profile (must include the 0 kJ row).
+        work_threshold_kj (float): Prior work of the fatigued efforts.
+        durations (iterable of int): Durations (seconds) averaged into the score.
+
+    Returns:
+        float: Mean ratio of fatigued to fresh power over the durations (1.0 means no decline),
+        or NaN if the profile has no fatigued efforts of those durations.
+    """
+    durations = list(durations)
+    fresh = profile.loc[0, durations].to_numpy(dtype=np.float64)
+    fatigued = profile.loc[work_threshold_kj, durations].to_numpy(dtype=np.float64)
+    ratios = fatigued / fresh
+    ratios = ratios[np.isfinite(ratios)]
+    return float(ratios.mean()) if len(ratios) else float("nan")
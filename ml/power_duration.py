@@ -0,0 +1,217 @@
+import os
+import numpy as np
+import pandas as pd
+
+from ml.cycling_model import mean_max_power, mean_max_power_batch, mmp_durations
+
+# Durations (seconds) used by the CP fit, always kept on the grid
+CP_DURATIONS = [60, 300, 600, 1200, 1800, 3600, 5400, 7200, 9000, 10800, 14400, 18000]
+
+
+def default_durations(max_duration=36000):
+    """
+    Builds the duration grid of a power-duration store.
+
+    Args:
+        max_duration (int): The longest duration (seconds) tracked.
+
+    Returns:
+        np.ndarray: mmp_durations(max_duration) plus the CP fit durations.
+    """
+    return np.union1d(mmp_durations(max_duration), CP_DURATIONS)
+
+
+def _to_datetime64(value):
+    """Converts a datetime-like value (or integer Unix seconds) to a naive numpy datetime64[s]."""
+    if isinstance(value, (int, np.integer)):
+        return np.datetime64(int(value), "s")
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    return np.datetime64(timestamp.to_datetime64(), "s")
+
+
+class PowerDurationStore:
+    """
+    Per-athlete store of each ride's mean-maximal power curve with a merged envelope.
+
+    Curves share one duration grid and are kept sorted by ride start time, so the best curve of
+    any date range is a single reduction over a contiguous slice of rows. The all-time envelope
+    is updated in place as rides are added, so a new upload never rescans earlier rides.
+
+    Attributes:
+        path (str): The .npz file the store is saved to, or None.
+        durations (np.ndarray): Duration grid in seconds.
+        ride_ids (np.ndarray): Ride identifiers, sorted by start time.
+        start_times (np.ndarray): Ride start times (datetime64[s]), sorted.
+        curves (np.ndarray): Mean-maximal power curves, shape (n_rides, n_durations).
+        all_time (np.ndarray): Best power at each duration over all rides.
+    """
+
+    def __init__(self, path=None, durations=None):
+        """
+        Creates an empty store.
+
+        Args:
+            path (str): The .npz file used by save().
+            durations (array-like of int): Duration grid in seconds. Defaults to default_durations().
+        """
+        self.path = path
+        self.durations = np.asarray(default_durations() if durations is None else durations, dtype=np.int64)
+        self.ride_ids = np.array([], dtype=object)
+        self.start_times = np.array([], dtype="datetime64[s]")
+        self.curves = np.empty((0, len(self.durations)))
+        self.all_time = np.full(len(self.durations), np.nan)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a store saved with save(), or creates an empty one if the file does not exist.
+
+        Args:
+            path (str): The .npz file of the store.
+
+        Returns:
+            PowerDurationStore: The loaded store.
+        """
+        if not os.path.exists(path):
+            return cls(path)
+        with np.load(path, allow_pickle=False) as arrays:
+            store = cls(path, arrays["durations"])
+            store.ride_ids = arrays["ride_ids"].astype(object)
+            store.start_times = arrays["start_times"]
+            store.curves = arrays["curves"]
+        store._rebuild_all_time()
+        return store
+
+    def save(self, path=None):
+        """
+        Writes the store atomically to an .npz file.
+
+        Args:
+            path (str): Destination file. Defaults to the path the store was created with.
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path given for the power-duration store")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as store_file:
+            np.savez(store_file, durations=self.durations, ride_ids=self.ride_ids.astype(str),
+                     start_times=self.start_times, curves=self.curves)
+        os.replace(tmp_path, path)
+        self.path = path
+
+    def __len__(self):
+        return len(self.ride_ids)
+
+    def add_curve(self, ride_id, start_time, curve):
+        """
+        Adds (or replaces) one ride's mean-maximal power curve.
+
+        Args:
+            ride_id (str): The ride identifier (e.g. workout_id).
+            start_time (datetime-like): When the ride started.
+            curve (array-like): Best power for each duration of the store's grid.
+        """
+        ride_id = str(ride_id)
+        curve = np.asarray(curve, dtype=np.float64)
+        replaced = ride_id in self.ride_ids
+        if replaced:
+            self._drop(ride_id)
+
+        start_time = _to_datetime64(start_time)
+        position = np.searchsorted(self.start_times, start_time, side="right")
+        self.ride_ids = np.insert(self.ride_ids, position, ride_id)
+        self.start_times = np.insert(self.start_times, position, start_time)
+        self.curves = np.insert(self.curves, position, curve, axis=0)
+        if replaced:
+            self._rebuild_all_time()
+        else:
+            self.all_time = np.fmax(self.all_time, curve)
+
+    def add_ride(self, ride_id, start_time, power):
+        """
+        Computes and adds the mean-maximal power curve of one ride.
+
+        Args:
+            ride_id (str): The ride identifier.
+            start_time (datetime-like): When the ride started.
+            power (array-like): 1 Hz power samples (watts).
+
+        Returns:
+            np.ndarray: The ride's curve on the store's duration grid.
+        """
+        curve = mean_max_power(power, self.durations)
+        self.add_curve(ride_id, start_time, curve)
+        return curve
+
+    def add_activities(self, df, power_column="power"):
+        """
+        Adds every ride of a combined multi-workout DataFrame in one batched curve computation.
+
+        Args:
+            df (pd.DataFrame): Frame with 'workout_id', 'timestamp' and power columns, e.g. the
+                output of FitFileProcessor.process_directory (compact frames included).
+            power_column (str): Name of the power column ('power', or 'watts' for saved CSVs).
+        """
+        groups = df.groupby("workout_id", sort=False, observed=True)
+        start_times = groups["timestamp"].min()
+        powers = [group[power_column].to_numpy() for _, group in groups]
+        curves = mean_max_power_batch(powers, self.durations)
+        for (ride_id, start_time), curve in zip(start_times.items(), curves):
+            self.add_curve(ride_id, start_time, curve)
+
+    def envelope(self, start=None, end=None):
+        """
+        Best power at each duration over the rides that started within [start, end].
+
+        Args:
+            start (datetime-like): First ride start time included, or None for no lower bound.
+            end (datetime-like): Last ride start time included, or None for no upper bound.
+
+        Returns:
+            pd.Series: Best power (watts) indexed by duration in seconds (NaN where no ride was
+            long enough).
+        """
+        if start is None and end is None:
+            curve = self.all_time.copy()
+        else:
+            first = 0 if start is None else np.searchsorted(self.start_times, _to_datetime64(start), side="left")
+            last = len(self) if end is None else np.searchsorted(self.start_times, _to_datetime64(end), side="right")
+            if last > first:
+                curve = np.fmax.reduce(self.curves[first:last], axis=0)
+            else:
+                curve = np.full(len(self.durations), np.nan)
+        return pd.Series(curve, index=pd.Index(self.durations, name="Duration (s)"), name="Power (W)")
+
+    def rolling_envelope(self, days=90, end=None):
+        """
+        Best power at each duration over the trailing window of days ending at end.
+
+        Args:
+            days (int): Window length in days (e.g. 90, or 180-365 for the CP fit).
+            end (datetime-like): End of the window. Defaults to the latest ride.
+
+        Returns:
+            pd.Series: Best power (watts) indexed by duration in seconds.
+        """
+        if end is None:
+            if not len(self):
+                return self.envelope()
+            end = self.start_times[-1]
+        end = _to_datetime64(end)
+        return self.envelope(end - np.timedelta64(days, "D"), end)
+
+    def _drop(self, ride_id):
+        """Removes a ride from the store (the all-time envelope is rebuilt by the caller)."""
+        keep = self.ride_ids != ride_id
+        self.ride_ids = self.ride_ids[keep]
+        self.start_times = self.start_times[keep]
+        self.curves = self.curves[keep]
+
+    def _rebuild_all_time(self):
+        """Recomputes the all-time envelope from the stored curves."""
+        if len(self):
+            self.all_time = np.fmax.reduce(self.curves, axis=0)
+        else:
+            self.all_time = np.full(len(self.durations), np.nan)
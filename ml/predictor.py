@@ -0,0 +1,309 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from ml.cycling_model import fit_cp_models_batch
+
+# Race distances (meters) and pacing assumptions of each race format
+RACES = {
+    "ironman": {
+        "swim_m": 3800, "bike_m": 180000, "run_m": 42195,
+        "swim_factor": 1.10,     # open-water pace relative to CSS over the full distance
+        "bike_intensity": 0.92,  # fraction of the modelled sustainable power held on the bike
+        "run_fade": 1.15,        # slowdown of the run off the bike relative to a stand-alone run
+        "transitions_s": 600,
+    },
+    "70.3": {
+        "swim_m": 1900, "bike_m": 90000, "run_m": 21097.5,
+        "swim_factor": 1.06,
+        "bike_intensity": 0.95,
+        "run_fade": 1.08,
+        "transitions_s": 360,
+    },
+}
+# Flat-course bike physics
+BIKE_SETUP = {"cda": 0.25, "crr": 0.004, "air_density": 1.2, "drivetrain_efficiency": 0.975, "bike_mass": 9.0}
+RIEGEL_EXPONENT = 1.06
+CP_FIT_DURATIONS = [60, 300, 600, 1200, 1800, 3600]  # seconds of the envelope used by the CP fit
+BIKE_DURATION_GRID = np.arange(60, 601, 5)  # minutes at which the CP model is evaluated
+
+AthleteInputs = namedtuple(
+    "AthleteInputs", ["athlete_id", "durations", "power", "best_efforts", "css", "weight"],
+    defaults=(None, None, None, None, 70.0),
+)
+AthleteInputs.__doc__ = """
+Model inputs of one athlete.
+
+Attributes:
+    athlete_id (str): The athlete identifier.
+    durations (array-like): Durations (seconds) of the power-duration envelope.
+    power (array-like): Best power (watts) at each duration, e.g. PowerDurationStore.rolling_envelope().
+    best_efforts (dict): Best running times, distance in meters mapped to seconds.
+    css (float): Critical swim speed pace in seconds per 100 m.
+    weight (float): Body weight in kg.
+"""
+
+
+def athlete_inputs_from_dict(data):
+    """
+    Builds AthleteInputs from a JSON-style dict.
+
+    Args:
+        data (dict): {"athlete_id", "power_curve": {seconds: watts}, "best_efforts": {meters: seconds},
+            "css", "weight"}; everything but athlete_id is optional.
+
+    Returns:
+        AthleteInputs: The parsed inputs.
+    """
+    curve = data.get("power_curve") or {}
+    durations = np.array([float(duration) for duration in curve], dtype=np.float64)
+    power = np.array([float(value) for value in curve.values()], dtype=np.float64)
+    efforts = {float(distance): float(seconds) for distance, seconds in (data.get("best_efforts") or {}).items()}
+    return AthleteInputs(str(data["athlete_id"]), durations, power, efforts, data.get("css"),
+                         float(data.get("weight") or 70.0))
+
+
+def athlete_fingerprint(athlete, race):
+    """
+    Fingerprints everything a prediction depends on, so unchanged athletes hit the cache.
+
+    Values are rounded first (0.1 W, 0.1 s, 0.01 s/100 m), so float noise from recomputing
+    an identical envelope does not change the fingerprint.
+
+    Args:
+        athlete (AthleteInputs): The athlete's inputs.
+        race (str): Key of RACES.
+
+    Returns:
+        str: Hex digest.
+    """
+    durations = [] if athlete.durations is None else np.round(np.asarray(athlete.durations, dtype=np.float64)).tolist()
+    power = [] if athlete.power is None else np.round(np.asarray(athlete.power, dtype=np.float64), 1).tolist()
+    efforts = sorted((round(float(distance), 1), round(float(seconds), 1))
+                     for distance, seconds in (athlete.best_efforts or {}).items())
+    css = None if athlete.css is None else round(float(athlete.css), 2)
+    key = [race, RACES[race], BIKE_SETUP, athlete.athlete_id, durations, power, efforts, css,
+           round(float(athlete.weight), 1)]
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def bike_speed(power, total_mass, setup=BIKE_SETUP):
+    """
+    Solves the flat-road power balance for speed, vectorized over riders.
+
+    Args:
+        power (np.ndarray): Power at the pedals (watts).
+        total_mass (np.ndarray): Rider plus bike mass (kg).
+        setup (dict): Aerodynamic and rolling resistance parameters (see BIKE_SETUP).
+
+    Returns:
+        np.ndarray: Speed in m/s.
+    """
+    drag = 0.5 * setup["air_density"] * setup["cda"]
+    rolling = setup["crr"] * total_mass * 9.81
+    wheel_power = np.maximum(np.asarray(power, dtype=np.float64), 0) * setup["drivetrain_efficiency"]
+    speed = np.cbrt(wheel_power / drag)
+    for _ in range(8):  # Newton steps on drag*v^3 + rolling*v - wheel_power (monotonic in v)
+        speed -= (drag * speed ** 3 + rolling * speed - wheel_power) / (3 * drag * speed ** 2 + rolling)
+    return speed
+
+
+def _cp_fit_points(athlete):
+    """Selects the envelope points of the CP fit: (durations in minutes, power, cp20) or None."""
+    if athlete.durations is None or athlete.power is None:
+        return None
+    durations = np.asarray(athlete.durations, dtype=np.float64)
+    power = np.asarray(athlete.power, dtype=np.float64)
+    keep = np.isin(durations, CP_FIT_DURATIONS) & np.isfinite(power) & (power > 0)
+    if keep.sum() < 3 or not np.any(durations[keep] == 1200):
+        return None
+    order = np.argsort(durations[keep])
+    return durations[keep][order] / 60, power[keep][order], float(power[keep][durations[keep] == 1200][0])
+
+
+def predict_races(athletes, race="ironman"):
+    """
+    Predicts race splits for many athletes in one batch.
+
+    Bike power comes from one batched fatigue-log CP fit over all athletes (see
+    fit_cp_models_batch). The bike split is then solved as a fixed point: the power sustainable
+    for the current split estimate gives a speed, which gives a new split. The run is a Riegel
+    extrapolation of the longest best effort, slowed by the race's run fade. The swim is the
+    CSS pace scaled by the race's swim factor.
+
+    Args:
+        athletes (list): AthleteInputs of each athlete.
+        race (str): Key of RACES ("ironman" or "70.3").
+
+    Returns:
+        pd.DataFrame: One row per athlete_id with 'swim_s', 'bike_s', 'bike_power', 'run_s',
+        'transitions_s' and 'total_s' (NaN where inputs are missing or the fit failed).
+    """
+    profile = RACES[race]
+    n = len(athletes)
+
+    css = np.array([np.nan if athlete.css is None else float(athlete.css) for athlete in athletes])
+    swim = profile["swim_m"] / 100 * css * profile["swim_factor"]
+
+    points = [_cp_fit_points(athlete) for athlete in athletes]
+    fit_rows = [i for i, point in enumerate(points) if point is not None]
+    bike = np.full(n, np.nan)
+    bike_power = np.full(n, np.nan)
+    if fit_rows:
+        results, status = fit_cp_models_batch(
+            [points[i][0] for i in fit_rows], [points[i][1] for i in fit_rows],
+            BIKE_DURATION_GRID, [points[i][2] for i in fit_rows],
+        )
+        curves = np.array([result[0] for result in results])
+        # A fit that did not converge, or whose curve is not positive everywhere (e.g. a flat,
+        # near-zero envelope), has no meaningful bike split
+        failed = ~status["converged"].to_numpy() | ~np.all(np.isfinite(curves) & (curves > 0), axis=1)
+        mass = np.array([athletes[i].weight for i in fit_rows]) + BIKE_SETUP["bike_mass"]
+        grid_seconds = BIKE_DURATION_GRID * 60.0
+        split = np.full(len(fit_rows), profile["bike_m"] / 9.0)  # start from ~32 km/h
+        for _ in range(6):
+            clipped = np.clip(split, grid_seconds[0], grid_seconds[-1])
+            # Linear interpolation of each athlete's curve at its own split
+            position = np.interp(clipped, grid_seconds, np.arange(len(grid_seconds)))
+            low = np.floor(position).astype(int)
+            high = np.minimum(low + 1, len(grid_seconds) - 1)
+            weight = position - low
+            rows = np.arange(len(fit_rows))
+            power = (curves[rows, low] * (1 - weight) + curves[rows, high] * weight) * profile["bike_intensity"]
+            split = profile["bike_m"] / bike_speed(power, mass)
+        bike[fit_rows] = np.where(failed, np.nan, split)
+        bike_power[fit_rows] = np.where(failed, np.nan, power)
+
+    run = np.full(n, np.nan)
+    for i, athlete in enumerate(athletes):
+        efforts = {distance: seconds for distance, seconds in (athlete.best_efforts or {}).items()
+                   if distance > 0 and seconds and np.isfinite(seconds)}
+        if efforts:
+            distance = max(efforts)
+            run[i] = efforts[distance] * (profile["run_m"] / distance) ** RIEGEL_EXPONENT * profile["run_fade"]
+
+    transitions = np.full(n, float(profile["transitions_s"]))
+    return pd.DataFrame({
+        "swim_s": swim,
+        "bike_s": bike,
+        "bike_power": bike_power,
+        "run_s": run,
+        "transitions_s": transitions,
+        "total_s": swim + bike + run + transitions,
+    }, index=pd.Index([athlete.athlete_id for athlete in athletes], name="athlete_id"))
+
+
+class PredictionService:
+    """
+    Batch race predictions memoized in an LRU cache with a time-to-live.
+
+    Results are keyed by athlete_fingerprint, so an athlete is only recomputed when their
+    envelope, efforts, CSS or weight change (or the entry expires). All misses of a batch are
+    computed together in one predict_races call. Safe to share between threads.
+
+    Attributes:
+        max_entries (int): Cache capacity; least recently used entries are evicted beyond it.
+        ttl (float): Seconds an entry stays valid, or None for no expiry.
+        hits (int): Athletes served from the cache.
+        misses (int): Athletes computed.
+        evictions (int): Entries evicted for capacity.
+        expirations (int): Entries dropped because they expired.
+        batches (int): predict() calls.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600, clock=time.monotonic):
+        """
+        Creates an empty service.
+
+        Args:
+            max_entries (int): Cache capacity.
+            ttl (float): Entry lifetime in seconds, or None.
+            clock (callable): Monotonic time source.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.batches = 0
+
+    def predict(self, athletes, race="ironman"):
+        """
+        Predicts race splits, serving unchanged athletes from the cache.
+
+        Args:
+            athletes (list): AthleteInputs of each athlete.
+            race (str): Key of RACES.
+
+        Returns:
+            pd.DataFrame: The predict_races table, in the order of athletes, with a 'cached' column.
+        """
+        if race not in RACES:
+            raise ValueError(f"Unknown race: {race}")
+        fingerprints = [athlete_fingerprint(athlete, race) for athlete in athletes]
+        rows = [None] * len(athletes)
+        missing = []
+        with self._lock:
+            self.batches += 1
+            now = self.clock()
+            for i, fingerprint in enumerate(fingerprints):
+                entry = self._cache.get(fingerprint)
+                if entry is not None and self.ttl is not None and entry[0] <= now:
+                    del self._cache[fingerprint]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(fingerprint)
+                    rows[i] = dict(entry[1], cached=True)
+            self.hits += len(athletes) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            computed = predict_races([athletes[i] for i in missing], race)
+            records = computed.to_dict("records")
+            with self._lock:
+                expires = None if self.ttl is None else self.clock() + self.ttl
+                for i, record in zip(missing, records):
+                    self._cache[fingerprints[i]] = (expires, record)
+                    self._cache.move_to_end(fingerprints[i])
+                    rows[i] = dict(record, cached=False)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                    self.evictions += 1
+
+        return pd.DataFrame(rows, index=pd.Index([athlete.athlete_id for athlete in athletes], name="athlete_id"))
+
+    def cache_info(self):
+        """
+        Returns:
+            dict: Hit/miss/eviction/expiration counts, hit rate, size and capacity of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "batches": self.batches,
+                "size": len(self._cache),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+    def clear(self):
+        """Empties the cache (statistics are kept)."""
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+from ml.predictor import RACES, BIKE_SETUP, bike_speed, predict_races
+from ml.running_model import training_pace_seconds
+
+# Spread (log-scale standard deviations) of the simulated race-day factors
+SIMULATION_SPREAD = {
+    "swim_form": 0.04,           # day-to-day swim form
+    "bike_form": 0.035,          # day-to-day bike power (also how hard the athlete paces the ride)
+    "run_form": 0.05,            # day-to-day run form
+    "swim_conditions": 0.04,     # currents, water temperature, course length
+    "bike_conditions": 0.04,     # wind, road surface, course profile
+    "run_conditions": 0.04,      # heat, course profile
+    "transitions": 0.2,          # transition times
+}
+# Correlation of the bike and run conditions through the race-day weather (wind and heat)
+WEATHER_CORRELATION = 0.6
+# Run slowdown per unit of relative bike power above the athlete's planned power
+FATIGUE_CARRY_OVER = 1.5
+# Durability score (see fatigue_model.durability_score) the races' run fades are calibrated for,
+# and the extra run slowdown per unit of durability below it
+REFERENCE_DURABILITY = 0.9
+DURABILITY_WEIGHT = 1.0
+# Training zone of calculate_training_paces held over the race run
+RACE_RUN_ZONE = {"ironman": "Marathon (M)", "70.3": "Marathon (M)"}
+FINISH_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _race_baselines(athletes, race, vdots=None, durabilities=None):
+    """Planned splits of predict_races, with the fresh run from VDOT where available, as arrays."""
+    profile = RACES[race]
+    planned = predict_races(athletes, race)
+    run = planned["run_s"].to_numpy(dtype=np.float64)
+    if vdots is not None:
+        vdots = np.asarray(vdots, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pace = training_pace_seconds(vdots)[RACE_RUN_ZONE[race]]
+        run = np.where(np.isfinite(pace) & (vdots > 0), pace * profile["run_m"] / 1000 * profile["run_fade"], run)
+    fade = np.ones(len(athletes))
+    if durabilities is not None:
+        durabilities = np.asarray(durabilities, dtype=np.float64)
+        fade = np.where(np.isfinite(durabilities), 1 + DURABILITY_WEIGHT * (REFERENCE_DURABILITY - durabilities), 1.0)
+    return {
+        "swim_s": planned["swim_s"].to_numpy(dtype=np.float64),
+        "bike_power": planned["bike_power"].to_numpy(dtype=np.float64),
+        "run_s": run * fade,
+        "transitions_s": planned["transitions_s"].to_numpy(dtype=np.float64),
+        "mass": np.array([athlete.weight for athlete in athletes], dtype=np.float64) + BIKE_SETUP["bike_mass"],
+    }
+
+
+def _simulate_legs(baselines, race, n_simulations, rngs, spread=SIMULATION_SPREAD):
+    """
+    Simulated leg times of a chunk of athletes.
+
+    Args:
+        baselines (dict): Arrays of _race_baselines for the chunk.
+        race (str): Key of RACES.
+        n_simulations (int): Races per athlete.
+        rngs (list): One np.random.Generator per athlete of the chunk.
+        spread (dict): Log-scale standard deviations (see SIMULATION_SPREAD).
+
+    Returns:
+        dict: 'swim_s', 'bike_s', 'bike_power', 'run_s' and 'transitions_s' arrays of shape
+        (athletes, n_simulations).
+    """
+    profile = RACES[race]
+    # Standard normal draws, one row of 8 factors per athlete: each athlete's stream is independent
+    # of the other athletes in the chunk, so results do not depend on how the batch is split
+    z = np.stack([rng.standard_normal((8, n_simulations)) for rng in rngs], axis=1)
+    swim_form, bike_form, run_form, swim_water, weather, bike_own, run_own, transition_own = z
+    independent = np.sqrt(1 - WEATHER_CORRELATION ** 2)
+
+    swim = baselines["swim_s"][:, None] * np.exp(spread["swim_form"] * swim_form
+                                                 + spread["swim_conditions"] * swim_water)
+
+    paced = np.exp(spread["bike_form"] * bike_form)
+    bike_power = baselines["bike_power"][:, None] * paced
+    bike_conditions = np.exp(spread["bike_conditions"] * (WEATHER_CORRELATION * weather + independent * bike_own))
+    bike = profile["bike_m"] / bike_speed(bike_power, baselines["mass"][:, None]) * bike_conditions
+
+    # Riding above the planned power costs run speed, riding below it saves some
+    carry_over = np.maximum(1 + FATIGUE_CARRY_OVER * (paced - 1), 0.5)
+    run_conditions = np.exp(spread["run_conditions"] * (WEATHER_CORRELATION * weather + independent * run_own))
+    run = baselines["run_s"][:, None] * carry_over * np.exp(spread["run_form"] * run_form) * run_conditions
+
+    transitions = baselines["transitions_s"][:, None] * np.exp(spread["transitions"] * transition_own)
+    return {"swim_s": swim, "bike_s": bike, "bike_power": bike_power, "run_s": run, "transitions_s": transitions}
+
+
+def simulate_races(athletes, race="ironman", n_simulations=100000, vdots=None, durabilities=None,
+                   percentiles=FINISH_PERCENTILES, seed=None, batch_size=16):
+    """
+    Monte Carlo finish-time distributions for many athletes, e.g. for nightly recomputes.
+
+    The planned splits of predict_races (CSS swim, CP-curve bike power, and a run from VDOT
+    when given, otherwise the Riegel extrapolation) are perturbed by race-day form, course and
+    weather factors drawn as NumPy arrays. Bike and run conditions are correlated through the
+    weather, the bike split is recomputed from the sampled power, and riding harder than
+    planned slows the run (fatigue carry-over). Athletes with a durability score below the
+    reference fade more on the run. Athletes are simulated batch_size at a time, each with its
+    own random stream spawned from seed, so results depend only on the seed.
+
+    Args:
+        athletes (list): AthleteInputs of each athlete.
+        race (str): Key of RACES ("ironman" or "70.3").
+        n_simulations (int): Simulated races per athlete.
+        vdots (array-like): Optional VDOT of each athlete (NaN to use the best efforts).
+        durabilities (array-like): Optional durability score of each athlete (NaN for none).
+        percentiles (iterable): Percentiles (0-100) of the finish time to report.
+        seed (int): Seed of the simulation; the same seed gives the same distributions.
+        batch_size (int): Athletes simulated together (bounds memory to about
+            batch_size * n_simulations * 100 bytes).
+
+    Returns:
+        pd.DataFrame: One row per athlete_id with the median 'swim_s', 'bike_s', 'run_s' and
+        'transitions_s', the finish time 'mean_s' and 'std_s', and one 'p<percentile>_s' column
+        per percentile (NaN where predict_races has no split for a leg).
+    """
+    if race not in RACES:
+        raise ValueError(f"Unknown race: {race}")
+    n = len(athletes)
+    baselines = _race_baselines(athletes, race, vdots, durabilities)
+    rngs = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(n)]
+    legs = ["swim_s", "bike_s", "run_s", "transitions_s"]
+    columns = legs + ["mean_s", "std_s"] + [f"p{q:g}_s" for q in percentiles]
+    summary = np.full((n, len(columns)), np.nan)
+
+    for start in range(0, n, batch_size):
+        chunk = slice(start, min(start + batch_size, n))
+        simulated = _simulate_legs({key: value[chunk] for key, value in baselines.items()}, race,
+                                   n_simulations, rngs[chunk])
+        total = sum(simulated[leg] for leg in legs)
+        summary[chunk, len(legs)] = total.mean(axis=1)
+        summary[chunk, len(legs) + 1] = total.std(axis=1)
+        # One partial sort for the leg medians and the finish percentiles
+        quantiles = np.percentile(np.stack([simulated[leg] for leg in legs] + [total]),
+                                  [50] + list(percentiles), axis=-1)
+        summary[chunk, :len(legs)] = quantiles[0, :len(legs)].T
+        summary[chunk, len(legs) + 2:] = quantiles[1:, -1].T
+
+    return pd.DataFrame(summary, columns=columns,
+                        index=pd.Index([athlete.athlete_id for athlete in athletes], name="athlete_id"))
+
+
+def simulate_race(athlete, race="ironman", n_simulations=100000, vdot=None, durability=None, seed=None):
+    """
+    Simulated races of one athlete (see simulate_races).
+
+    Args:
+        athlete (AthleteInputs): The athlete's inputs.
+        race (str): Key of RACES.
+        n_simulations (int): Simulated races.
+        vdot (float): Optional VDOT of the athlete.
+        durability (float): Optional durability score of the athlete.
+        seed (int): Seed of the simulation.
+
+    Returns:
+        pd.DataFrame: One row per simulated race with 'swim_s', 'bike_s', 'bike_power', 'run_s',
+        'transitions_s' and 'total_s'.
+    """
+    if race not in RACES:
+        raise ValueError(f"Unknown race: {race}")
+    baselines = _race_baselines([athlete], race, None if vdot is None else [vdot],
+                                None if durability is None else [durability])
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+    simulated = {key: value[0] for key, value in _simulate_legs(baselines, race, n_simulations, [rng]).items()}
+    races = pd.DataFrame(simulated)
+    races["total_s"] = races["swim_s"] + races["bike_s"] + races["run_s"] + races["transitions_s"]
+    return races
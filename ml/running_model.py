@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 def format_time_diff(time_diff):
@@ -17,6 +18,132 @@ def format_time_diff(time_diff):
     seconds = total_seconds % 60
     return f"{hours:02}:{minutes:02}:{seconds:02}"
 
+def _segment_seconds(distance, elapsed, targets, tolerance):
+    """
+    Elapsed time of the longest segment ending at every row within tolerance of each target.
+
+    Returns:
+        tuple: (starts, seconds) arrays of shape (targets, rows); seconds is inf where the segment
+               ending at a row is not within tolerance of the target.
+    """
+    lower_bound = (targets * (1 - tolerance))[:, None]
+    upper_bound = (targets * (1 + tolerance))[:, None]
+
+    starts = np.searchsorted(distance, distance[None, :] - upper_bound, side="left")
+    # Settle floating point ties the same way the direct difference comparison does
+    starts += (distance[None, :] - distance[starts]) > upper_bound
+    previous = np.maximum(starts - 1, 0)
+    starts -= (starts > 0) & ((distance[None, :] - distance[previous]) <= upper_bound)
+
+    distance_diff = distance[None, :] - distance[starts]
+    seconds = np.abs(elapsed[None, :] - elapsed[starts])
+    seconds[(distance_diff < lower_bound) | (distance_diff > upper_bound)] = np.inf
+    return starts, seconds
+
+
+def find_best_efforts(distance, elapsed, targets, tolerance=0.01):
+    """
+    Find the fastest segment covering each target distance in one vectorized pass.
+
+    For every row (segment end) the earliest start within the upper distance bound is found
+    with a binary search over the monotonic distance array, which is exactly the start the
+    two-pointer scan reaches. Segments whose distance is within tolerance of the target are
+    then compared by elapsed time.
+
+    Args:
+        distance (array-like): Cumulative distance in meters, monotonically increasing.
+        elapsed (array-like): Elapsed time of each row in seconds.
+        targets (array-like): Target distances in meters.
+        tolerance (float): Allowed deviation as a fraction of each target (default 0.01).
+
+    Returns:
+        tuple: (start_rows, end_rows, seconds) arrays with one entry per target. Rows are -1 and
+               seconds NaN where no segment matches.
+    """
+    distance = np.asarray(distance, dtype=np.float64)
+    elapsed = np.asarray(elapsed, dtype=np.float64)
+    targets = np.atleast_1d(np.asarray(targets, dtype=np.float64))
+    starts, seconds = _segment_seconds(distance, elapsed, targets, tolerance)
+
+    start_rows = np.full(len(targets), -1)
+    end_rows = np.full(len(targets), -1)
+    best_seconds = np.full(len(targets), np.nan)
+    if seconds.shape[1]:
+        ends = seconds.argmin(axis=1)
+        found = np.isfinite(seconds[np.arange(len(targets)), ends])
+        end_rows[found] = ends[found]
+        start_rows[found] = starts[found, ends[found]]
+        best_seconds[found] = seconds[found, ends[found]]
+    return start_rows, end_rows, best_seconds
+
+
+def find_best_efforts_batch(runs, targets, tolerance=0.01, max_samples=200000):
+    """
+    Find the fastest time over each target distance in many runs at once.
+
+    Runs are laid end to end in one distance array, each starting further past the previous
+    run's end than the longest target, so no segment can span two runs. The searchsorted pass
+    of find_best_efforts then covers up to max_samples samples of runs at a time, and the best
+    segment of each run is a segmented minimum.
+
+    Args:
+        runs (iterable): (distance, elapsed) arrays of each run, as for find_best_efforts.
+        targets (array-like): Target distances in meters.
+        tolerance (float): Allowed deviation as a fraction of each target (default 0.01).
+        max_samples (int): Samples searched per pass (bounds memory to about
+            40 * len(targets) * max_samples bytes; longer runs get a pass of their own).
+
+    Returns:
+        np.ndarray: Seconds of shape (n_runs, n_targets), NaN where a run has no matching segment.
+    """
+    runs = [(np.asarray(distance, dtype=np.float64), np.asarray(elapsed, dtype=np.float64))
+            for distance, elapsed in runs]
+    targets = np.atleast_1d(np.asarray(targets, dtype=np.float64))
+    best = np.full((len(runs), len(targets)), np.nan)
+    if not len(targets):
+        return best
+    gap = targets.max() * (1 + tolerance) + 1.0
+
+    batches, batch, batch_samples = [], [], 0
+    for i, (distance, _) in enumerate(runs):
+        if not len(distance):
+            continue
+        if batch and batch_samples + len(distance) > max_samples:
+            batches.append(batch)
+            batch, batch_samples = [], 0
+        batch.append(i)
+        batch_samples += len(distance)
+    if batch:
+        batches.append(batch)
+
+    for batch in batches:
+        spans = np.array([runs[i][0][-1] - runs[i][0][0] for i in batch])
+        bases = np.concatenate(([0.0], np.cumsum(spans + gap)[:-1]))
+        distance = np.concatenate([runs[i][0] - runs[i][0][0] + base for i, base in zip(batch, bases)])
+        elapsed = np.concatenate([runs[i][1] for i in batch])
+        run_starts = np.cumsum([0] + [len(runs[i][0]) for i in batch[:-1]])
+
+        _, seconds = _segment_seconds(distance, elapsed, targets, tolerance)
+        seconds = np.minimum.reduceat(seconds, run_starts, axis=1).T
+        seconds[np.isinf(seconds)] = np.nan
+        best[batch] = seconds
+    return best
+
+
+def _effort_arrays(df):
+    """Returns the valid rows of a run as (timestamps, distance, elapsed seconds) arrays."""
+    valid = df[['distance', 'timestamp']].notna().all(axis=1).to_numpy()
+    timestamps = df['timestamp'].to_numpy()
+    if timestamps.dtype.kind in "iu":
+        # Compact frames store integer seconds since the Unix epoch
+        timestamps = timestamps.astype("datetime64[s]")[valid]
+    else:
+        timestamps = pd.to_datetime(df['timestamp']).to_numpy()[valid]
+    distance = df['distance'].to_numpy()[valid]
+    elapsed = (timestamps - timestamps[0]) / np.timedelta64(1, 's') if len(timestamps) else np.empty(0)
+    return timestamps, distance, elapsed
+
+
 def find_min_max_timestamp_monotonic(df, target_diff=5000, tolerance=0.01):
     """
     Find the pair of timestamps with the smallest time delta where the distance
@@ -29,41 +156,23 @@ def find_min_max_timestamp_monotonic(df, target_diff=5000, tolerance=0.01):
         tolerance (float): Allowed deviation as a fraction of target_diff (default 0.01).
 
     Returns:
-        tuple: (min_timestamp, max_timestamp, time_diff_hms)
-    """
-    # Define the tolerance range
-    lower_bound = target_diff * (1 - tolerance)
-    upper_bound = target_diff * (1 + tolerance)
-
-    # Initialize variables to track the result
-    min_time_delta = float('inf')
-    result = (None, None)
-
-    # Use two pointers to find the closest distance pairs
-    start = 0
-    for end in range(1, len(df)):
-        while df['distance'][end] - df['distance'][start] > upper_bound:
-            start += 1
-        distance_diff = df['distance'][end] - df['distance'][start]
-        if lower_bound <= distance_diff <= upper_bound:
-            time_delta = abs((df['timestamp'][end] - df['timestamp'][start]).total_seconds())
-            if time_delta < min_time_delta:
-                min_time_delta = time_delta
-                result = (df['timestamp'][start], df['timestamp'][end])
-
-    # Calculate time difference in H:M:S format
-    if result[0] and result[1]:
-        time_diff = result[1] - result[0]
-        time_diff_hms = str(format_time_diff(time_diff))
-        return time_diff_hms, result[0], result[1],
-    else:
+        tuple: (time_diff_hms, min_timestamp, max_timestamp)
+    """
+    timestamps, distance, elapsed = _effort_arrays(df)
+    start_rows, end_rows, _ = find_best_efforts(distance, elapsed, [target_diff], tolerance)
+    if start_rows[0] < 0:
         return None, None, None
+    min_timestamp = pd.Timestamp(timestamps[start_rows[0]])
+    max_timestamp = pd.Timestamp(timestamps[end_rows[0]])
+    return str(format_time_diff(max_timestamp - min_timestamp)), min_timestamp, max_timestamp
 
 
 def analyze_distances(df, target_distances, tolerance=0.01):
     """
     Analyze the DataFrame for multiple target distances.
 
+    All target distances are searched in a single vectorized call.
+
     Args:
         df (pd.DataFrame): DataFrame with 'distance' and 'timestamp' columns.
         target_distances (dict): Dictionary where keys are labels (e.g., "400m")
@@ -75,27 +184,57 @@ def analyze_distances(df, target_distances, tolerance=0.01):
     """
     # Filter valid distances
     max_distance = df['distance'].max()
-    results = []
+    labels = [label for label, target_diff in target_distances.items() if target_diff <= max_distance]
+    targets = [target_distances[label] for label in labels]
 
-    for label, target_diff in target_distances.items():
-        if target_diff <= max_distance:
-            # Call the function to find the timestamps for this distance
-            time_diff_hms, min_timestamp, max_timestamp = find_min_max_timestamp_monotonic(df, target_diff, tolerance)
+    timestamps, distance, elapsed = _effort_arrays(df)
+    start_rows, end_rows, _ = find_best_efforts(distance, elapsed, targets, tolerance)
+
+    results = []
+    for label, target_diff, start, end in zip(labels, targets, start_rows, end_rows):
+        if start >= 0:
+            min_timestamp = pd.Timestamp(timestamps[start])
+            max_timestamp = pd.Timestamp(timestamps[end])
+            time_diff_hms = str(format_time_diff(max_timestamp - min_timestamp))
+        else:
+            min_timestamp = max_timestamp = time_diff_hms = None
 
-            # Append the result
-            results.append({
-                'Target Distance': label,
-                'Distance (m)': target_diff,
-                'Min Timestamp': min_timestamp,
-                'Max Timestamp': max_timestamp,
-                'Time Difference (H:M:S)': time_diff_hms
-            })
+        results.append({
+            'Target Distance': label,
+            'Distance (m)': target_diff,
+            'Min Timestamp': min_timestamp,
+            'Max Timestamp': max_timestamp,
+            'Time Difference (H:M:S)': time_diff_hms
+        })
 
     # Convert results to DataFrame
     results_df = pd.DataFrame(results)
     return results_df
 
 
+def analyze_distances_batch(df, target_distances, tolerance=0.01):
+    """
+    Fastest time over each target distance in every run of a combined multi-workout DataFrame.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'workout_id', 'distance' and 'timestamp' columns, e.g. the
+                           output of FitFileProcessor.process_directory (default or compact schema).
+        target_distances (dict): Labels mapped to target distances in meters.
+        tolerance (float): Allowed deviation as a fraction of each target (default 0.01).
+
+    Returns:
+        pd.DataFrame: Seconds per workout_id (rows) and target label (columns), NaN where the run
+        has no matching segment.
+    """
+    workout_ids, runs = [], []
+    for workout_id, run_df in df.groupby('workout_id', sort=False, observed=True):
+        _, distance, elapsed = _effort_arrays(run_df)
+        workout_ids.append(workout_id)
+        runs.append((distance, elapsed))
+    seconds = find_best_efforts_batch(runs, list(target_distances.values()), tolerance)
+    return pd.DataFrame(seconds, index=pd.Index(workout_ids, name='workout_id'), columns=list(target_distances))
+
+
 # Target distances in meters
 target_distances = {
     '400m': 400,
@@ -114,27 +253,42 @@ target_distances = {
 }
 
 
-import vdot_calculator as vdot
 import datetime
 
 def make_time(hour, minute, second):
     return datetime.time(hour=hour, minute=minute, second=second)
 
+# Training zone paces as a fraction of the VDOT base pace (Jack Daniels' method)
+TRAINING_PACE_FACTORS = {
+    'Easy (E)': 0.74,
+    'Marathon (M)': 0.88,
+    'Threshold (T)': 0.92,
+    'Interval (I)': 1.00,
+    'Repetition (R)': 1.05,
+}
+
+
+def training_pace_seconds(vdot_value):
+    """
+    Calculate training paces in seconds per kilometer from VDOT (vectorized).
+
+    Args:
+        vdot_value (float or array-like): VDOT of one or many athletes.
+
+    Returns:
+        dict: Zone names mapped to paces in seconds per km (arrays for array input).
+    """
+    # Base pace in seconds per kilometer
+    base_pace_sec_per_km = 3600 / (np.asarray(vdot_value, dtype=np.float64) * 0.298)  # Approximation based on Daniels' formula
+    return {zone: base_pace_sec_per_km / factor for zone, factor in TRAINING_PACE_FACTORS.items()}
+
+
 # Function to calculate training paces based on VDOT
 def calculate_training_paces(vdot_value):
     """
     Calculate training paces (min/km) based on VDOT using Jack Daniels' method.
     """
-    # Base pace in seconds per kilometer
-    base_pace_sec_per_km = 3600 / (vdot_value * 0.298)  # Approximation based on Daniels' formula
-
-    zones = {
-        'Easy (E)': base_pace_sec_per_km / 0.74,
-        'Marathon (M)': base_pace_sec_per_km / 0.88,
-        'Threshold (T)': base_pace_sec_per_km / 0.92,
-        'Interval (I)': base_pace_sec_per_km / 1.00,
-        'Repetition (R)': base_pace_sec_per_km / 1.05,
-    }
+    zones = training_pace_seconds(vdot_value)
     # Convert paces to readable min:sec format
     zones_formatted = {
         zone: f"{int(pace // 60)}:{int(pace % 60):02d} per km"
@@ -143,6 +297,7 @@ def calculate_training_paces(vdot_value):
     return zones_formatted
 
 # # Calculate the highest VDOT and corresponding paces
+# import vdot_calculator as vdot
 # vdot_value = 0
 # distance_in_meters = None
 
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+# Time trial distances (meters) of the CSS test: CSS = (400 - 200) / (T400 - T200)
+CSS_TEST_DISTANCES = (200, 400)
+
+
+def _workout_codes(lengths, laps):
+    """Integer codes of the workouts in lengths and laps, over the union of their workout ids."""
+    ids = [frame["workout_id"].to_numpy() for frame in (lengths, laps) if frame is not None and len(frame)]
+    workouts = pd.Index(pd.unique(np.concatenate(ids))) if ids else pd.Index([])
+    codes = [workouts.get_indexer(frame["workout_id"].to_numpy()) if frame is not None and len(frame) else None
+             for frame in (lengths, laps)]
+    return workouts, codes[0], codes[1]
+
+
+def best_swim_efforts(lengths, laps=None, distances=CSS_TEST_DISTANCES, tolerance=0.01):
+    """
+    Find the fastest continuous swim over each distance in every session, in one vectorized pass.
+
+    Lengths of all sessions are processed together: a running-start index marks where each
+    unbroken run of active lengths begins (a rest length or a new session breaks it), and one
+    cumulative sum gives the time of every window of k consecutive lengths ending at each row.
+    k is the number of lengths covering the distance in that session's pool (rounded up, with
+    the time scaled back to the distance, e.g. for 25 yd pools). Laps whose distance is within
+    tolerance of the target (e.g. a time trial recorded as one lap, or an open-water swim
+    without lengths) also count.
+
+    Args:
+        lengths (pd.DataFrame): Pool lengths with 'workout_id', 'elapsed_time' (s), 'active' and
+            'pool_length' (m), in swim order within each session (see FitFileProcessor swim=True).
+        laps (pd.DataFrame): Optional laps with 'workout_id', 'timer_time' (s) and 'distance' (m).
+        distances (iterable): Target distances in meters.
+        tolerance (float): Allowed deviation of a lap's distance, as a fraction of the target.
+
+    Returns:
+        pd.DataFrame: One row per workout_id with a 'best_<distance>_s' column per distance
+        (NaN where the session has no such swim).
+    """
+    workouts, length_codes, lap_codes = _workout_codes(lengths, laps)
+    best = np.full((len(workouts), len(distances)), np.inf)
+
+    if length_codes is not None:
+        order = np.lexsort((lengths["length_index"].to_numpy(), length_codes)) if "length_index" in lengths else None
+        time = lengths["elapsed_time"].to_numpy(dtype=np.float64)
+        active = lengths["active"].to_numpy(dtype=bool)
+        pool = lengths["pool_length"].to_numpy(dtype=np.float64)
+        codes = length_codes
+        if order is not None:
+            time, active, pool, codes = time[order], active[order], pool[order], codes[order]
+        active = active & np.isfinite(time) & (time > 0)
+
+        n = len(time)
+        index = np.arange(n)
+        starts = active.copy()
+        starts[1:] &= ~active[:-1] | (codes[1:] != codes[:-1])
+        run_start = np.maximum.accumulate(np.where(starts, index, 0))
+        run_lengths = np.where(active, index - run_start + 1, 0)
+        cumulative = np.concatenate(([0.0], np.cumsum(np.where(active, time, 0.0))))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for j, distance in enumerate(distances):
+                counts = np.ceil(distance / pool - 1e-9)
+                valid = np.isfinite(counts) & (counts >= 1) & (run_lengths >= np.nan_to_num(counts))
+                ends = index[valid]
+                k = counts[valid].astype(np.intp)
+                seconds = (cumulative[ends + 1] - cumulative[ends + 1 - k]) * distance / (k * pool[valid])
+                np.minimum.at(best[:, j], codes[valid], seconds)
+
+    if lap_codes is not None:
+        lap_time = laps["timer_time"].to_numpy(dtype=np.float64)
+        lap_distance = laps["distance"].to_numpy(dtype=np.float64)
+        for j, distance in enumerate(distances):
+            valid = (np.abs(lap_distance - distance) <= tolerance * distance) & (lap_time > 0)
+            np.minimum.at(best[:, j], lap_codes[valid], lap_time[valid])
+
+    best[np.isinf(best)] = np.nan
+    return pd.DataFrame(best, index=pd.Index(workouts, name="workout_id"),
+                        columns=[f"best_{distance:g}_s" for distance in distances])
+
+
+def critical_swim_speed(t200, t400):
+    """
+    Calculate Critical Swim Speed from 200 m and 400 m time trial times (vectorized).
+
+    Args:
+        t200 (array-like): 200 m times in seconds.
+        t400 (array-like): 400 m times in seconds.
+
+    Returns:
+        tuple: (speed in m/s, pace in seconds per 100 m) arrays, NaN where the times are
+               missing or the 400 m is not slower than the 200 m.
+    """
+    t200 = np.asarray(t200, dtype=np.float64)
+    t400 = np.asarray(t400, dtype=np.float64)
+    difference = np.where(t400 > t200, t400 - t200, np.nan)
+    speed = (CSS_TEST_DISTANCES[1] - CSS_TEST_DISTANCES[0]) / difference
+    return speed, 100 / speed
+
+
+def swim_sessions(lengths, laps=None):
+    """
+    Summarize every swim session with its best 200/400 m and the CSS they imply.
+
+    Args:
+        lengths (pd.DataFrame): Pool lengths (see best_swim_efforts).
+        laps (pd.DataFrame): Optional laps (see best_swim_efforts).
+
+    Returns:
+        pd.DataFrame: One row per workout_id with 'pool_length', 'active_lengths', 'distance' (m),
+        'swim_time' (s of active lengths), 'best_200_s', 'best_400_s', 'css_speed' (m/s) and
+        'css_pace' (s/100 m).
+    """
+    sessions = best_swim_efforts(lengths, laps)
+    if len(lengths):
+        active = lengths[lengths["active"].astype(bool)]
+        totals = active.groupby("workout_id", sort=False).agg(
+            pool_length=("pool_length", "first"),
+            active_lengths=("elapsed_time", "size"),
+            swim_time=("elapsed_time", "sum"),
+        )
+        totals["distance"] = totals["active_lengths"] * totals["pool_length"]
+        sessions = totals.reindex(sessions.index).join(sessions)
+    else:
+        for column in ("pool_length", "active_lengths", "swim_time", "distance"):
+            sessions[column] = np.nan
+    sessions["css_speed"], sessions["css_pace"] = critical_swim_speed(sessions["best_200_s"], sessions["best_400_s"])
+    return sessions[["pool_length", "active_lengths", "distance", "swim_time", "best_200_s", "best_400_s",
+                     "css_speed", "css_pace"]]
+
+
+def athlete_css(sessions):
+    """
+    Calculate an athlete's CSS from their best 200 m and 400 m over a set of sessions.
+
+    The two efforts may come from different sessions, so a CSS test split over two days (or a
+    season's best efforts) still gives a threshold.
+
+    Args:
+        sessions (pd.DataFrame): Output of swim_sessions (or best_swim_efforts) for one athlete.
+
+    Returns:
+        tuple: (speed in m/s, pace in seconds per 100 m), NaN if either effort is missing.
+    """
+    speed, pace = critical_swim_speed(sessions["best_200_s"].min(), sessions["best_400_s"].min())
+    return float(speed), float(pace)
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+GAP_POLICIES = ("zero", "hold", "split")
+# Columns that count time: rebuilt on the 1 Hz grid instead of being held
+CLOCK_COLUMNS = ("timestamp", "elapsed_time", "time")
+# Channels that are 0 while paused under the "zero" policy (everything else is held)
+ZERO_FILL_COLUMNS = ("power", "watts", "cadence", "speed", "velocity_smooth")
+
+
+def _clock_seconds(series):
+    """Whole seconds of a clock column (datetime64, Unix-second integers or seconds) and a validity mask."""
+    values = series.to_numpy()
+    if np.issubdtype(values.dtype, np.datetime64):
+        seconds = values.astype("datetime64[s]")
+        return seconds.astype(np.int64), ~np.isnat(seconds)
+    values = values.astype(np.float64)
+    valid = np.isfinite(values)
+    return np.floor(np.where(valid, values, 0)).astype(np.int64), valid
+
+
+def _find_time_column(df):
+    """The first of CLOCK_COLUMNS present in df."""
+    time_column = next((column for column in CLOCK_COLUMNS if column in df.columns), None)
+    if time_column is None:
+        raise ValueError(f"No clock column ({', '.join(CLOCK_COLUMNS)}) in the frame")
+    return time_column
+
+
+def normalize_timeline(df, gap_policy="hold", max_gap=10, time_column=None, indicator=False,
+                       zero_columns=ZERO_FILL_COLUMNS):
+    """
+    Resample the activities of a (combined multi-workout) frame onto a regular 1 Hz grid.
+
+    Window metrics such as mean_max_power, peak_avg_wattage and normalized power count rows, so
+    they are only correct on one row per second. Rows are placed at their whole second (the
+    first row wins when several fall in the same second). Gaps up to max_gap seconds are
+    sampling gaps (e.g. smart recording) and are filled by holding the previous row. Longer
+    gaps are pauses, handled by gap_policy:
+
+    - "zero": pause seconds are inserted with 0 in zero_columns (power, cadence, speed) and
+      False in boolean columns (e.g. Strava's 'moving'); other channels hold their last value.
+    - "hold": pause seconds are inserted holding every channel.
+    - "split": nothing is inserted; the rows after the pause start a new 'segment' (column
+      added), so windows can be kept within segments.
+
+    Clock columns (timestamp, elapsed_time, time) are rebuilt on the grid. All workouts are
+    handled at once: each kept row is repeated over the seconds up to the next row, so the
+    output is one vectorized take of the input rows. A frame that is already regular (every
+    workout contiguous, in order, one row per second) is returned as is, without a copy.
+
+    Args:
+        df (pd.DataFrame): Frame with 'workout_id' and a clock column, e.g. the output of
+            FitFileProcessor.process_directory or a Strava stream frame.
+        gap_policy (str): "zero", "hold" or "split".
+        max_gap (int): Longest gap (s) treated as a sampling gap rather than a pause.
+        time_column (str): Clock column that defines the grid; by default the first of
+            CLOCK_COLUMNS present in df.
+        indicator (bool): Add a boolean 'filled' column marking inserted rows (always a copy).
+        zero_columns (iterable): Channels set to 0 in pauses under the "zero" policy.
+
+    Returns:
+        pd.DataFrame: The regular frame with a fresh RangeIndex (or df itself when already
+        regular and no columns are added). Rows without a valid time are dropped.
+
+    Raises:
+        ValueError: If gap_policy is unknown or the frame has no clock column.
+    """
+    if gap_policy not in GAP_POLICIES:
+        raise ValueError(f"Unknown gap policy: {gap_policy}")
+    if time_column is None:
+        time_column = _find_time_column(df)
+
+    codes, _ = pd.factorize(df["workout_id"], sort=False)
+    seconds, valid = _clock_seconds(df[time_column])
+    rows = np.arange(len(df))
+    step = np.diff(seconds)
+    same_workout = codes[1:] == codes[:-1]
+    in_order = np.all(np.diff(codes) >= 0) and np.all(step[same_workout] >= 0)
+    if valid.all() and in_order and np.all(step[same_workout] == 1) and not indicator and gap_policy != "split":
+        return df
+
+    if not valid.all():
+        rows, codes, seconds = rows[valid], codes[valid], seconds[valid]
+    if not in_order:
+        order = np.lexsort((seconds, codes))
+        rows, codes, seconds = rows[order], codes[order], seconds[order]
+    if len(rows) > 1:
+        duplicate = np.concatenate(([False], (codes[1:] == codes[:-1]) & (seconds[1:] == seconds[:-1])))
+        if duplicate.any():
+            rows, codes, seconds = rows[~duplicate], codes[~duplicate], seconds[~duplicate]
+
+    # Seconds until the next row of the same workout (1 for the last row of each workout)
+    n = len(rows)
+    gap = np.ones(n, dtype=np.int64)
+    if n > 1:
+        next_in_workout = codes[1:] == codes[:-1]
+        gap[:-1] = np.where(next_in_workout, seconds[1:] - seconds[:-1], 1)
+    pause = gap > max_gap
+    repeats = np.where(pause, 1, gap) if gap_policy == "split" else gap
+
+    source = np.repeat(np.arange(n), repeats)
+    offset = np.arange(len(source)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    filled = offset > 0
+
+    result = df.iloc[rows[source]].reset_index(drop=True)
+    for column in CLOCK_COLUMNS:
+        if column not in result.columns:
+            continue
+        values = result[column].to_numpy()
+        if np.issubdtype(values.dtype, np.datetime64):
+            result[column] = values.astype("datetime64[s]") + offset
+        elif pd.api.types.is_numeric_dtype(values.dtype):
+            result[column] = (values + offset).astype(values.dtype) if values.dtype.kind in "iu" else values + offset
+
+    if gap_policy == "zero" and filled.any():
+        paused = filled & pause[source]
+        for column in result.columns:
+            if column in zero_columns:
+                result.loc[paused, column] = 0
+            elif pd.api.types.is_bool_dtype(result[column].dtype):
+                result.loc[paused, column] = False
+    elif gap_policy == "split":
+        workout_start = np.ones(n, dtype=bool)
+        workout_start[1:] = codes[1:] != codes[:-1]
+        new_segment = np.zeros(n, dtype=np.int64)
+        new_segment[1:] = pause[:-1] & ~workout_start[1:]
+        cumulative = np.cumsum(new_segment)
+        first_row = np.maximum.accumulate(np.where(workout_start, np.arange(n), 0))
+        result["segment"] = (cumulative - cumulative[first_row])[source]
+    if indicator:
+        result["filled"] = filled
+    return result
+
+
+def timeline_summary(df, time_column=None, max_gap=10):
+    """
+    Describe how far each workout is from a regular 1 Hz timeline.
+
+    Args:
+        df (pd.DataFrame): Frame with 'workout_id' and a clock column.
+        time_column (str): Clock column; by default the first of CLOCK_COLUMNS present.
+        max_gap (int): Longest gap (s) counted as a sampling gap rather than a pause.
+
+    Returns:
+        pd.DataFrame: One row per workout_id with 'rows', 'duration_s' (last - first second + 1),
+        'duplicates', 'sampling_gaps', 'pauses' and 'paused_s'.
+
+    Raises:
+        ValueError: If the frame has no clock column and time_column is not given.
+    """
+    if time_column is None:
+        time_column = _find_time_column(df)
+    codes, workout_ids = pd.factorize(df["workout_id"], sort=False)
+    seconds, valid = _clock_seconds(df[time_column])
+    codes, seconds = codes[valid], seconds[valid]
+    order = np.lexsort((seconds, codes))
+    codes, seconds = codes[order], seconds[order]
+
+    n_workouts = len(workout_ids)
+    same = codes[1:] == codes[:-1]
+    step = np.diff(seconds)
+    step_codes = codes[1:][same]
+    step = step[same]
+    pause = step > max_gap
+
+    first = np.full(n_workouts, np.iinfo(np.int64).max)
+    last = np.full(n_workouts, np.iinfo(np.int64).min)
+    np.minimum.at(first, codes, seconds)
+    np.maximum.at(last, codes, seconds)
+    rows = np.bincount(codes, minlength=n_workouts)
+    return pd.DataFrame({
+        "rows": rows,
+        "duration_s": np.where(rows > 0, last - first + 1, 0),
+        "duplicates": np.bincount(step_codes[step == 0], minlength=n_workouts),
+        "sampling_gaps": np.bincount(step_codes[(step > 1) & ~pause], minlength=n_workouts),
+        "pauses": np.bincount(step_codes[pause], minlength=n_workouts),
+        "paused_s": np.bincount(step_codes[pause], weights=step[pause] - 1, minlength=n_workouts).astype(np.int64),
+    }, index=pd.Index(workout_ids, name="workout_id"))
@@ -0,0 +1,465 @@
+"""
+Batch pipeline: ingest, metrics, model fit and race prediction for many athletes.
+
+The manifest lists one athlete per row, either as a CSV with a header or as JSON lines, with
+'athlete_id' and 'activity_dir' (relative paths are resolved against the manifest's directory)
+and optionally 'weight' (kg). Athletes are spread over worker processes. Each athlete's result is
+written as soon as it is done, and a line is appended to the checkpoint. A rerun skips athletes
+whose activity files have not changed since their checkpoint, so an interrupted nightly run
+resumes where it stopped and the next night only recomputes athletes with new uploads.
+
+Output layout:
+    <output_dir>/athletes/<athlete_id>/result.json          metrics and predictions
+    <output_dir>/athletes/<athlete_id>/power_duration.npz   power-duration store
+    <output_dir>/athletes/<athlete_id>/ingest_stats.jsonl   ingest stage timings
+    <output_dir>/checkpoint.jsonl                           one line per finished athlete
+    <output_dir>/predictions.csv                            predictions of all finished athletes
+
+With --shard i/n only the athletes hashed to shard i of n are processed, and the checkpoint
+and predictions files get a '-<i>-of-<n>' suffix, so several boxes can share one output
+directory.
+
+Usage (from the repository root):
+    python run.py manifest.csv output/ --workers 8
+    python run.py manifest.jsonl output/ --shard 0/4 --races ironman 70.3
+"""
+import os
+import sys
+import csv
+import json
+import time
+import zlib
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+from FitFileProcessor import FitFileProcessor  # noqa: E402
+from ml.fatigue_model import durability_profile, durability_score  # noqa: E402
+from ml.power_duration import CP_DURATIONS, PowerDurationStore  # noqa: E402
+from ml.predictor import RACES, AthleteInputs  # noqa: E402
+from ml.race_simulator import simulate_races  # noqa: E402
+from ml.running_model import analyze_distances_batch, target_distances  # noqa: E402
+from ml.swimming_model import athlete_css, swim_sessions  # noqa: E402
+from ml.timeline import normalize_timeline  # noqa: E402
+from ml.vdot import best_vdot  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_EXTENSIONS = (".fit", ".fit.gz")
+
+
+def read_manifest(path):
+    """
+    Reads the athletes of a manifest.
+
+    Args:
+        path (str): CSV file with a header, or JSON-lines file (.jsonl/.json), with 'athlete_id',
+            'activity_dir' and optionally 'weight'.
+
+    Returns:
+        list: One dict per athlete with 'athlete_id', 'activity_dir' (absolute) and 'weight'.
+    """
+    with open(path, newline="") as manifest_file:
+        if path.endswith((".jsonl", ".json")):
+            rows = [json.loads(line) for line in manifest_file if line.strip()]
+        else:
+            rows = list(csv.DictReader(manifest_file))
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    athletes = []
+    seen = set()
+    for line_number, row in enumerate(rows, start=1):
+        if not row.get("athlete_id") or not row.get("activity_dir"):
+            raise ValueError(f"Manifest row {line_number} needs an athlete_id and an activity_dir")
+        athlete_id = str(row["athlete_id"])
+        if athlete_id in seen:
+            raise ValueError(f"Duplicate athlete_id in manifest: {athlete_id}")
+        seen.add(athlete_id)
+        athletes.append({
+            "athlete_id": athlete_id,
+            "activity_dir": os.path.join(base_dir, os.path.expanduser(str(row["activity_dir"]))),
+            "weight": float(row.get("weight") or 70.0),
+        })
+    return athletes
+
+
+def input_fingerprint(activity_dir):
+    """
+    Fingerprints the activity files of a directory by name, size and modification time.
+
+    Args:
+        activity_dir (str): Directory of .fit/.fit.gz files.
+
+    Returns:
+        tuple: (hex digest, number of files, total bytes).
+    """
+    digest = hashlib.sha1()
+    n_files = n_bytes = 0
+    for filename in sorted(os.listdir(activity_dir)):
+        filepath = os.path.join(activity_dir, filename)
+        if filename.endswith(ACTIVITY_EXTENSIONS) and os.path.isfile(filepath):
+            stat = os.stat(filepath)
+            digest.update(f"{filename}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+            n_files += 1
+            n_bytes += stat.st_size
+    return digest.hexdigest(), n_files, n_bytes
+
+
+def shard_of(athlete_id, n_shards):
+    """Stable shard number of an athlete (the same on every box and every run)."""
+    return zlib.crc32(str(athlete_id).encode("utf-8")) % n_shards
+
+
+def athlete_dir_name(athlete_id):
+    """Directory name of an athlete's outputs (path separators are replaced)."""
+    return str(athlete_id).replace(os.sep, "_").replace("/", "_")
+
+
+def _json_value(value):
+    """Converts numpy scalars and NaN to JSON-compatible values."""
+    if isinstance(value, (np.floating, float)):
+        return None if not np.isfinite(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def _write_json(path, data):
+    """Writes a JSON file atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as json_file:
+        json.dump(data, json_file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def athlete_metrics(df, lengths, laps, store, days=180):
+    """
+    Computes the model inputs of one athlete from their processed activities.
+
+    Args:
+        df (pd.DataFrame): Combined frame of FitFileProcessor.process_directory (compact schema).
+        lengths (pd.DataFrame): Pool lengths of FitFileProcessor.swim_frames.
+        laps (pd.DataFrame): Swim laps of FitFileProcessor.swim_frames.
+        store (PowerDurationStore): Store of the athlete's earlier rides; only rides it does not
+            hold yet are added.
+        days (int): Window of the power-duration envelope, in days before the latest ride.
+
+    Returns:
+        dict: 'durations' and 'power' (envelope arrays), 'durability', 'best_efforts'
+        (meters -> seconds), 'vdot', 'vdot_distance' and 'css_pace' (s/100 m), NaN or empty
+        where the athlete has no activities of a sport.
+    """
+    metrics = {"durations": np.array([]), "power": np.array([]), "durability": np.nan,
+               "best_efforts": {}, "vdot": np.nan, "vdot_distance": None, "css_pace": np.nan}
+    if not df.empty:
+        sports = df["sport_type"].astype(str).to_numpy()
+
+        rides = df[sports == "cycling"]
+        if not rides.empty:
+            # Window metrics count rows, so rides are put on a 1 Hz grid with 0 W in pauses first
+            rides = normalize_timeline(rides, gap_policy="zero")
+            new_rides = rides[~rides["workout_id"].astype(str).isin(store.ride_ids)]
+            if not new_rides.empty:
+                store.add_activities(new_rides)
+            envelope = store.rolling_envelope(days)
+            metrics["durations"] = envelope.index.to_numpy(dtype=np.float64)
+            metrics["power"] = envelope.to_numpy()
+            powers = [group["power"].to_numpy(dtype=np.float64)
+                      for _, group in rides.groupby("workout_id", sort=False, observed=True)]
+            metrics["durability"] = durability_score(durability_profile(powers))
+
+        runs = df[sports == "running"]
+        if not runs.empty:
+            targets = np.array(list(target_distances.values()))
+            seconds = analyze_distances_batch(runs, target_distances).to_numpy()
+            best = np.fmin.reduce(seconds, axis=0, initial=np.nan)  # fastest of all runs, ignoring NaN
+            found = np.isfinite(best)
+            metrics["best_efforts"] = dict(zip(targets[found].tolist(), best[found].tolist()))
+            metrics["vdot"], metrics["vdot_distance"] = best_vdot(targets, best)
+
+    if len(lengths):
+        metrics["css_pace"] = athlete_css(swim_sessions(lengths, laps if len(laps) else None))[1]
+    return metrics
+
+
+def process_athlete(athlete, output_dir, races=("ironman", "70.3"), n_simulations=100000, seed=0, days=180,
+                    cache_dir=None):
+    """
+    Runs ingest, metrics, model fit and race prediction for one athlete and writes the result.
+
+    Args:
+        athlete (dict): Manifest entry ('athlete_id', 'activity_dir', 'weight').
+        output_dir (str): Root output directory of the run.
+        races (iterable): Keys of RACES to predict.
+        n_simulations (int): Simulated races per prediction (see simulate_races).
+        seed (int): Base seed; each athlete's simulation seed also depends on their athlete_id.
+        days (int): Window of the power-duration envelope in days.
+        cache_dir (str): Root of per-athlete ActivityCache directories, or None.
+
+    Returns:
+        dict: Checkpoint record with 'athlete_id', 'status' ("ok" or "failed"), 'fingerprint',
+        'files', 'bytes', 'rows', per-stage seconds and 'error' for failures.
+    """
+    athlete_id = athlete["athlete_id"]
+    record = {"athlete_id": athlete_id, "status": "failed", "fingerprint": None, "files": 0, "bytes": 0,
+              "rows": 0}
+    started = time.perf_counter()
+    try:
+        record["fingerprint"], record["files"], record["bytes"] = input_fingerprint(athlete["activity_dir"])
+        athlete_dir = os.path.join(output_dir, "athletes", athlete_dir_name(athlete_id))
+        os.makedirs(athlete_dir, exist_ok=True)
+
+        stage_start = time.perf_counter()
+        processor = FitFileProcessor(
+            athlete["activity_dir"], athlete_dir, compact=True, swim=True,
+            cache_dir=None if cache_dir is None else os.path.join(cache_dir, athlete_dir_name(athlete_id)),
+            stats_path=os.path.join(athlete_dir, "ingest_stats.jsonl"),
+        )
+        df = processor.process_directory()
+        lengths, laps = processor.swim_frames()
+        record["rows"] = len(df)
+        record["ingest_s"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        store = PowerDurationStore.load(os.path.join(athlete_dir, "power_duration.npz"))
+        metrics = athlete_metrics(df, lengths, laps, store, days)
+        if len(store):
+            store.save()
+        record["metrics_s"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        inputs = AthleteInputs(athlete_id, metrics["durations"], metrics["power"], metrics["best_efforts"],
+                               None if np.isnan(metrics["css_pace"]) else metrics["css_pace"], athlete["weight"])
+        predictions = {}
+        for race in races:
+            simulated = simulate_races([inputs], race, n_simulations, vdots=[metrics["vdot"]],
+                                       durabilities=[metrics["durability"]],
+                                       seed=[seed, zlib.crc32(athlete_id.encode("utf-8"))])
+            predictions[race] = {key: _json_value(value) for key, value in simulated.iloc[0].items()}
+        record["predict_s"] = time.perf_counter() - stage_start
+
+        _write_json(os.path.join(athlete_dir, "result.json"), {
+            "athlete_id": athlete_id,
+            "fingerprint": record["fingerprint"],
+            "files": record["files"],
+            "rows": record["rows"],
+            "metrics": {
+                "power_envelope": {str(int(duration)): _json_value(power)
+                                   for duration, power in zip(metrics["durations"], metrics["power"])
+                                   if duration in CP_DURATIONS and np.isfinite(power)},
+                "durability": _json_value(metrics["durability"]),
+                "best_efforts": {f"{distance:g}": seconds for distance, seconds in metrics["best_efforts"].items()},
+                "vdot": _json_value(metrics["vdot"]),
+                "vdot_distance": metrics["vdot_distance"],
+                "css_pace": _json_value(metrics["css_pace"]),
+            },
+            "predictions": predictions,
+        })
+        record["status"] = "ok"
+    except Exception as e:
+        logger.error(f"Athlete {athlete_id} failed: {e}")
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = time.perf_counter() - started
+    return record
+
+
+def load_checkpoint(path):
+    """
+    Reads the latest checkpoint record of every athlete.
+
+    Args:
+        path (str): Checkpoint JSON-lines file (missing means nothing is done yet).
+
+    Returns:
+        dict: athlete_id mapped to their last record. A torn last line (from a killed run) is ignored.
+    """
+    records = {}
+    if os.path.exists(path):
+        with open(path) as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["athlete_id"]] = record
+    return records
+
+
+def collect_predictions(output_dir, athletes, checkpoint):
+    """
+    Flattens the results of the finished athletes into one table.
+
+    Args:
+        output_dir (str): Root output directory of the run.
+        athletes (list): Manifest entries of the shard.
+        checkpoint (dict): Output of load_checkpoint.
+
+    Returns:
+        pd.DataFrame: One row per athlete and race, with 'athlete_id', 'race', the
+        simulate_races columns and the athlete's 'vdot', 'css_pace' and 'durability'.
+    """
+    rows = []
+    for athlete in athletes:
+        if checkpoint.get(athlete["athlete_id"], {}).get("status") != "ok":
+            continue
+        result_path = os.path.join(output_dir, "athletes", athlete_dir_name(athlete["athlete_id"]), "result.json")
+        if not os.path.exists(result_path):
+            continue
+        with open(result_path) as result_file:
+            result = json.load(result_file)
+        for race, prediction in result["predictions"].items():
+            rows.append(dict({"athlete_id": result["athlete_id"], "race": race}, **prediction,
+                             vdot=result["metrics"]["vdot"], css_pace=result["metrics"]["css_pace"],
+                             durability=result["metrics"]["durability"]))
+    return pd.DataFrame(rows)
+
+
+def run_pipeline(athletes, output_dir, workers=None, shard=(0, 1), races=("ironman", "70.3"),
+                 n_simulations=100000, seed=0, days=180, cache_dir=None, force=False):
+    """
+    Processes the athletes of a shard, skipping those already checkpointed with unchanged inputs.
+
+    Athletes are processed in a pool of worker processes, one athlete per task. Every finished
+    athlete is appended to the checkpoint right away by this process (the only writer), so
+    stopping the run at any point loses at most the athletes in flight.
+
+    Args:
+        athletes (list): Manifest entries (see read_manifest).
+        output_dir (str): Root output directory.
+        workers (int): Number of worker processes (None for one per CPU, 1 to run in this process).
+        shard (tuple): (index, count): only athletes with shard_of(athlete_id, count) == index run.
+        races (iterable): Keys of RACES to predict.
+        n_simulations (int): Simulated races per prediction.
+        seed (int): Base seed of the simulations.
+        days (int): Window of the power-duration envelope in days.
+        cache_dir (str): Root of per-athlete ActivityCache directories, or None.
+        force (bool): Recompute every athlete of the shard regardless of the checkpoint.
+
+    Returns:
+        dict: Throughput summary: athlete counts ('total', 'processed', 'skipped', 'failed'),
+        'files', 'bytes', 'rows', 'elapsed_s', 'athletes_per_min', 'files_per_s' and the summed
+        seconds of each stage.
+    """
+    shard_index, n_shards = shard
+    suffix = "" if n_shards == 1 else f"-{shard_index}-of-{n_shards}"
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, f"checkpoint{suffix}.jsonl")
+    predictions_path = os.path.join(output_dir, f"predictions{suffix}.csv")
+
+    athletes = [athlete for athlete in athletes if shard_of(athlete["athlete_id"], n_shards) == shard_index]
+    checkpoint = {} if force else load_checkpoint(checkpoint_path)
+    pending = []
+    for athlete in athletes:
+        done = checkpoint.get(athlete["athlete_id"])
+        if done is not None and done.get("status") == "ok" and os.path.isdir(athlete["activity_dir"]) \
+                and done.get("fingerprint") == input_fingerprint(athlete["activity_dir"])[0]:
+            continue
+        pending.append(athlete)
+    logger.info(f"{len(athletes)} athletes in shard {shard_index}/{n_shards}, {len(pending)} to process")
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    options = {"races": tuple(races), "n_simulations": n_simulations, "seed": seed, "days": days,
+               "cache_dir": cache_dir}
+    summary = {"total": len(athletes), "processed": 0, "skipped": len(athletes) - len(pending), "failed": 0,
+               "files": 0, "bytes": 0, "rows": 0, "ingest_s": 0.0, "metrics_s": 0.0, "predict_s": 0.0}
+    started = time.perf_counter()
+
+    def finish(record):
+        with open(checkpoint_path, "a") as checkpoint_file:
+            checkpoint_file.write(json.dumps(record) + "\n")
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        checkpoint[record["athlete_id"]] = record
+        summary["processed"] += 1
+        summary["failed"] += record["status"] != "ok"
+        for key in ("files", "bytes", "rows", "ingest_s", "metrics_s", "predict_s"):
+            summary[key] += record.get(key, 0)
+        logger.info(f"[{summary['processed']}/{len(pending)}] {record['athlete_id']}: {record['status']} "
+                    f"({record['files']} files, {record['seconds']:.1f}s)")
+
+    if workers <= 1 or len(pending) <= 1:
+        for athlete in pending:
+            finish(process_athlete(athlete, output_dir, **options))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process_athlete, athlete, output_dir, **options) for athlete in pending]
+            try:
+                for future in as_completed(futures):
+                    finish(future.result())
+            except KeyboardInterrupt:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    elapsed = time.perf_counter() - started
+    predictions = collect_predictions(output_dir, athletes, checkpoint)
+    if not predictions.empty:
+        predictions.to_csv(predictions_path + ".tmp", index=False)
+        os.replace(predictions_path + ".tmp", predictions_path)
+    summary.update({
+        "elapsed_s": elapsed,
+        "athletes_per_min": summary["processed"] / elapsed * 60 if elapsed > 0 else None,
+        "files_per_s": summary["files"] / elapsed if elapsed > 0 else None,
+        "workers": workers,
+    })
+    return summary
+
+
+def print_summary(summary):
+    """Prints the throughput summary of run_pipeline."""
+    def rate(value, unit):
+        return "n/a" if value is None else f"{value:.2f} {unit}"
+
+    print(f"Athletes: {summary['processed']} processed ({summary['failed']} failed), "
+          f"{summary['skipped']} skipped of {summary['total']}")
+    print(f"Files: {summary['files']} ({summary['bytes'] / 1e6:.1f} MB), rows: {summary['rows']}")
+    print(f"Elapsed: {summary['elapsed_s']:.1f}s on {summary['workers']} workers - "
+          f"{rate(summary['athletes_per_min'], 'athletes/min')}, {rate(summary['files_per_s'], 'files/s')}")
+    print(f"Stage time (summed over workers): ingest {summary['ingest_s']:.1f}s, "
+          f"metrics {summary['metrics_s']:.1f}s, predict {summary['predict_s']:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("manifest", help="CSV or JSON-lines manifest of athletes (athlete_id, activity_dir, weight).")
+    parser.add_argument("output_dir", help="Directory for results, checkpoints and the predictions table.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--shard", default="0/1", help="Shard of the athletes to process, as index/count.")
+    parser.add_argument("--races", nargs="+", default=["ironman", "70.3"], choices=sorted(RACES))
+    parser.add_argument("--simulations", type=int, default=100000, help="Simulated races per prediction.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=180, help="Window of the power-duration envelope in days.")
+    parser.add_argument("--cache-dir", default=None, help="Root directory of per-athlete ingest caches.")
+    parser.add_argument("--force", action="store_true", help="Ignore the checkpoint and recompute every athlete.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # Per-file ingest logging would drown the per-athlete progress
+    logging.getLogger("FitFileProcessor").setLevel(logging.WARNING)
+
+    try:
+        shard_index, n_shards = (int(part) for part in args.shard.split("/"))
+        if not 0 <= shard_index < n_shards:
+            raise ValueError
+    except ValueError:
+        parser.error(f"--shard must be index/count with 0 <= index < count, got {args.shard}")
+
+    athletes = read_manifest(args.manifest)
+    try:
+        summary = run_pipeline(athletes, args.output_dir, args.workers, (shard_index, n_shards), args.races,
+                               args.simulations, args.seed, args.days, args.cache_dir, args.force)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted: rerun the same command to resume from the checkpoint")
+        return 130
+    print_summary(summary)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,957 @@
 import os
 import gzip
+import copy
+import json
+import time
+import struct
+import hashlib
+import functools
+import datetime
+import itertools
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from fitparse import FitFile
+from fitparse.profile import MESSAGE_TYPES, FIELD_TYPES
 import logging
 
+logger = logging.getLogger(__name__)
+
+FIT_EPOCH_OFFSET = 631065600  # Seconds between the Unix epoch and the FIT epoch (1989-12-31 UTC)
+FIT_TIMESTAMP_DEF_NUM = 253
+FIT_MIN_ABSOLUTE_TIMESTAMP = 0x10000000  # Smaller values are relative (system) times
+FIT_SPORT_MESG_NUM = 12
+FIT_SESSION_MESG_NUM = 18
+FIT_LAP_MESG_NUM = 19
+FIT_RECORD_MESG_NUM = 20
+FIT_LENGTH_MESG_NUM = 101
+FIT_FIELD_DESCRIPTION_MESG_NUM = 206
+
+# FIT base type number -> (numpy type code, invalid value). Strings and byte arrays are
+# left to fitparse.
+FIT_BASE_TYPES = {
+    0x00: ("u1", 0xFF),                  # enum
+    0x01: ("i1", 0x7F),                  # sint8
+    0x02: ("u1", 0xFF),                  # uint8
+    0x83: ("i2", 0x7FFF),                # sint16
+    0x84: ("u2", 0xFFFF),                # uint16
+    0x85: ("i4", 0x7FFFFFFF),            # sint32
+    0x86: ("u4", 0xFFFFFFFF),            # uint32
+    0x88: ("f4", None),                  # float32 (invalid is NaN)
+    0x89: ("f8", None),                  # float64 (invalid is NaN)
+    0x0A: ("u1", 0),                     # uint8z
+    0x8B: ("u2", 0),                     # uint16z
+    0x8C: ("u4", 0),                     # uint32z
+    0x8E: ("i8", 0x7FFFFFFFFFFFFFFF),    # sint64
+    0x8F: ("u8", 0xFFFFFFFFFFFFFFFF),    # uint64
+    0x90: ("u8", 0),                     # uint64z
+}
+
+FIT_DATE_TIME_FIELDS = ("timestamp", "start_time")
+EARTH_RADIUS_M = 6371008.8  # Mean Earth radius
+DERIVED_CHANNELS = ["gps_distance", "smoothed_altitude", "elevation_gain", "grade", "vam"]
+
+# Fields of the messages a pool swim is analyzed from (see FitFileProcessor swim=True)
+SWIM_MESSAGES = {
+    FIT_LENGTH_MESG_NUM: ("timestamp", "message_index", "start_time", "total_elapsed_time", "total_timer_time",
+                          "total_strokes", "swim_stroke", "length_type"),
+    FIT_LAP_MESG_NUM: ("timestamp", "message_index", "start_time", "total_elapsed_time", "total_timer_time",
+                       "total_distance", "num_lengths", "first_length_index", "num_active_lengths"),
+    FIT_SESSION_MESG_NUM: ("sub_sport", "pool_length"),
+}
+
+FitFieldSpec = namedtuple("FitFieldSpec", ["column", "scale", "offset", "bits", "bit_offset", "supported"])
+
+
+class FitDecodeFallback(Exception):
+    """Raised by the native decoder when a file needs the full fitparse path."""
+
+
+@functools.lru_cache(maxsize=None)
+def fit_field_lookup(key_fields):
+    """
+    Precomputes which FIT profile fields feed each key column, per global message number.
+
+    Components (e.g. record ``speed`` expanding into ``enhanced_speed``) are included so the
+    native decoder yields the same columns as fitparse. Accumulated components are flagged
+    as unsupported, which sends the file down the fitparse path.
+
+    Args:
+        key_fields (tuple): Lower-cased key field names.
+
+    Returns:
+        dict: {global_mesg_num: {field_def_num: [FitFieldSpec, ...]}}
+    """
+    lookup = {}
+    for mesg_num, mesg_type in MESSAGE_TYPES.items():
+        fields = {}
+        for def_num, field in mesg_type.fields.items():
+            for component in field.components or ():
+                if component.name in key_fields:
+                    fields.setdefault(def_num, []).append(FitFieldSpec(
+                        component.name, component.scale, component.offset,
+                        component.bits, component.bit_offset, not component.accumulate,
+                    ))
+            if field.name in key_fields:
+                fields.setdefault(def_num, []).append(
+                    FitFieldSpec(field.name, field.scale, field.offset, None, 0, True)
+                )
+        if fields:
+            lookup[mesg_num] = fields
+    return lookup
+
+
+FitRecordChunk = namedtuple("FitRecordChunk", ["activity_type", "columns"])
+
+
+class _FitLayout:
+    """Rows of one FIT message layout, gathered as byte offsets for a single vectorized decode."""
+
+    def __init__(self, columns, dtype, header_rows):
+        self.columns = columns  # [(field name in dtype, FitFieldSpec, numpy code, invalid), ...]
+        self.dtype = dtype
+        self.header_rows = header_rows  # Whether compressed-timestamp messages become rows
+        self.offsets = []
+        self.rows = []
+        self.header_timestamps = {}  # position in self.rows -> timestamp from a compressed header
+        self.table = None  # _FitLayout of the same messages in their message table, if any
+
+
+class _FitDefinition:
+    """A parsed FIT definition message bound to its local message number."""
+
+    __slots__ = ("global_num", "size", "layout", "timestamp", "sport_offset", "name_field")
+
+    def __init__(self, global_num, size, layout, timestamp, sport_offset, name_field):
+        self.global_num = global_num
+        self.size = size
+        self.layout = layout
+        self.timestamp = timestamp  # (byte offset, struct format) of field 253, if any
+        self.sport_offset = sport_offset
+        self.name_field = name_field  # (byte offset, size) of a field_description field_name
+
+
+class FitColumnDecoder:
+    """
+    Decodes FIT bytes straight into typed NumPy column arrays without building per-field objects.
+
+    Message headers are walked once to collect the byte offset of every message carrying a
+    key field; each message layout is then decoded in a single vectorized gather. Rows follow
+    the same rules as the fitparse path: one row per message that has at least one key field.
+
+    The decoder keeps its state (definitions, timestamp accumulator, position in chained
+    files) between calls to decode, so a file can be fed in arbitrary blocks.
+
+    Message tables (e.g. the length and lap messages of a pool swim) are collected in the same
+    pass: every message of a table's global number becomes one row of that table, regardless of
+    the key field rows.
+
+    Attributes:
+        key_fields (tuple): Lower-cased key field names.
+        mesg_nums (tuple): Global message numbers that produce rows, or None for all messages.
+        messages (dict): Message tables to collect, {global_mesg_num: tuple of field names}.
+        sport_value (int): Raw value of the most recent sport message, if any.
+    """
+
+    def __init__(self, key_fields, mesg_nums=None, messages=None):
+        """
+        Initializes the decoder.
+
+        Args:
+            key_fields (tuple): Lower-cased key field names.
+            mesg_nums (tuple): Only messages with these global numbers produce rows
+                (e.g. (20,) for record messages). None keeps every message with a key field.
+            messages (dict): Also collect these message tables, {global_mesg_num: tuple of
+                field names} (see SWIM_MESSAGES); read them with message_columns.
+        """
+        self.key_fields = key_fields
+        self.mesg_nums = mesg_nums
+        self.lookup = fit_field_lookup(key_fields)
+        if mesg_nums is not None:
+            self.lookup = {num: fields for num, fields in self.lookup.items() if num in mesg_nums}
+        self.messages = messages or {}
+        self.message_lookup = {num: fit_field_lookup(tuple(fields)).get(num, {}) for num, fields in self.messages.items()}
+        self.message_parts = {num: [] for num in self.messages}
+        self.header_timestamp = "timestamp" in key_fields
+        self.layouts = {}
+        self.local_defs = {}
+        self.sport_value = None
+        self.data_left = 0
+        self.in_file = False
+        self.ts_accumulator = 0
+        self.ts_source = None  # Position of the latest timestamp field in the current block
+        self.ts_pending = None  # Latest timestamp value carried over from a previous block
+
+    @property
+    def activity_type(self):
+        """str: The sport of the most recent sport message, or None."""
+        if self.sport_value is None or self.sport_value == 0xFF:
+            return None
+        return FIELD_TYPES["sport"].values.get(self.sport_value, self.sport_value)
+
+    def _parse_definition(self, data, pos, has_dev_fields):
+        """
+        Parses a definition message body starting at ``pos`` (just after the header byte).
+
+        Returns:
+            tuple: (_FitDefinition, position after the definition), or (None, pos) if the
+                   definition is not complete in ``data`` yet.
+        """
+        if pos + 5 > len(data):
+            return None, pos
+        endian = ">" if data[pos + 1] else "<"
+        global_num, num_fields = struct.unpack_from(endian + "HB", data, pos + 2)
+        end = pos + 5 + 3 * num_fields
+        if end + has_dev_fields > len(data):
+            return None, pos
+        field_defs = tuple(data[pos + 5:end])
+        dev_size = 0
+        if has_dev_fields:
+            num_dev_fields = data[end]
+            if end + 1 + 3 * num_dev_fields > len(data):
+                return None, pos
+            dev_size = sum(data[end + 2:end + 1 + 3 * num_dev_fields:3])
+            end += 1 + 3 * num_dev_fields
+
+        key = (endian, global_num, field_defs)
+        layout = self.layouts.get(key)
+        if layout is None:
+            columns, dtype = self._layout_columns(self.lookup.get(global_num, {}), field_defs, endian)
+            header_rows = self.header_timestamp and (self.mesg_nums is None or global_num in self.mesg_nums)
+            layout = self.layouts[key] = _FitLayout(columns, dtype, header_rows)
+            if global_num in self.messages:
+                columns, dtype = self._layout_columns(self.message_lookup[global_num], field_defs, endian)
+                layout.table = _FitLayout(columns, dtype, "timestamp" in self.messages[global_num])
+
+        timestamp = sport_offset = name_field = None
+        offset = 0
+        for i in range(0, len(field_defs), 3):
+            def_num, size, base_type = field_defs[i:i + 3]
+            if def_num == FIT_TIMESTAMP_DEF_NUM:
+                timestamp = (offset, endian + "I") if size == 4 else (offset, None)
+            elif global_num == FIT_SPORT_MESG_NUM and def_num == 0:
+                sport_offset = offset
+            elif global_num == FIT_FIELD_DESCRIPTION_MESG_NUM and def_num == 3:
+                name_field = (offset, size)
+            offset += size
+
+        return _FitDefinition(global_num, offset + dev_size, layout, timestamp, sport_offset, name_field), end
+
+    @staticmethod
+    def _layout_columns(mesg_fields, field_defs, endian):
+        """Builds the (columns, structured dtype) that gather the given fields of a message layout."""
+        names, formats, byte_offsets, columns = [], [], [], []
+        offset = 0
+        for i in range(0, len(field_defs), 3):
+            def_num, size, base_type = field_defs[i:i + 3]
+            for spec in mesg_fields.get(def_num, ()):
+                code, invalid = FIT_BASE_TYPES.get(base_type, (None, None))
+                if not spec.supported or code is None or int(code[1]) != size:
+                    raise FitDecodeFallback(f"Unsupported encoding for field {spec.column}")
+                name = f"f{len(names)}"
+                names.append(name)
+                formats.append(endian + code)
+                byte_offsets.append(offset)
+                columns.append((name, spec, code, invalid))
+            offset += size
+        dtype = np.dtype({"names": names, "formats": formats, "offsets": byte_offsets,
+                          "itemsize": max(offset, 1)})
+        return columns, dtype
+
+    def _latest_timestamp(self, data):
+        """Resolves the raw value of the most recent timestamp field, for compressed headers."""
+        if self.ts_source is not None:
+            ts_offset, ts_format = self.ts_source
+            self.ts_source = None
+            if ts_format is None:
+                raise FitDecodeFallback("Unsupported timestamp encoding")
+            self.ts_pending = struct.unpack_from(ts_format, data, ts_offset)[0]
+        if self.ts_pending is not None:
+            if self.ts_pending == 0xFFFFFFFF:
+                raise FitDecodeFallback("Invalid timestamp before compressed header")
+            self.ts_accumulator = self.ts_pending
+            self.ts_pending = None
+        return self.ts_accumulator
+
+    def decode(self, data):
+        """
+        Decodes every complete message at the start of ``data``.
+
+        Args:
+            data (bytes): FIT bytes following those consumed by the previous call.
+
+        Returns:
+            tuple: (dict of column name -> np.ndarray, number of bytes consumed). Values are
+                   float64 with NaN for invalid data; ``timestamp`` holds seconds since the
+                   FIT epoch. Only columns present in the decoded messages are returned.
+
+        Raises:
+            FitDecodeFallback: If the file uses features only the fitparse path handles.
+        """
+        pos = 0
+        size = len(data)
+        n_rows = 0
+
+        while True:
+            if self.data_left <= 0:
+                if self.in_file:
+                    if pos + 2 > size:
+                        break
+                    pos += 2  # Skip the file CRC; chained files follow immediately
+                    self.in_file = False
+                if pos + 12 > size or pos + data[pos] > size:
+                    break
+                if data[pos + 8:pos + 12] != b".FIT":
+                    raise FitDecodeFallback("Invalid FIT file header")
+                self.data_left = int.from_bytes(data[pos + 4:pos + 8], "little")
+                pos += data[pos]
+                self.in_file = True
+                self.local_defs = {}
+                self.ts_accumulator = 0
+                self.ts_source = self.ts_pending = None
+                continue
+            if pos >= size:
+                break
+
+            header = data[pos]
+            if header & 0x80:
+                definition = self.local_defs[(header >> 5) & 0x3]
+                time_offset = header & 0x1F
+            elif header & 0x40:
+                definition, end = self._parse_definition(data, pos + 1, bool(header & 0x20))
+                if definition is None:
+                    break
+                self.local_defs[header & 0x0F] = definition
+                self.data_left -= end - pos
+                pos = end
+                continue
+            else:
+                definition = self.local_defs[header & 0x0F]
+                time_offset = None
+            if pos + 1 + definition.size > size:
+                break
+            pos += 1
+
+            layout = definition.layout
+            if time_offset is not None:
+                ts_accumulator = self._latest_timestamp(data)
+                base = ts_accumulator & ~0x1F
+                if time_offset < (ts_accumulator & 0x1F):
+                    base += 0x20
+                self.ts_accumulator = base + time_offset
+                if layout.header_rows:
+                    layout.header_timestamps[len(layout.rows)] = self.ts_accumulator
+                if layout.table is not None and layout.table.header_rows:
+                    layout.table.header_timestamps[len(layout.table.rows)] = self.ts_accumulator
+            elif definition.timestamp is not None:
+                self.ts_source = (pos + definition.timestamp[0], definition.timestamp[1])
+
+            if layout.columns or (time_offset is not None and layout.header_rows):
+                layout.offsets.append(pos)
+                layout.rows.append(n_rows)
+                n_rows += 1
+            if layout.table is not None:
+                layout.table.offsets.append(pos)
+                layout.table.rows.append(len(layout.table.rows))
+
+            if definition.sport_offset is not None:
+                self.sport_value = data[pos + definition.sport_offset]
+            elif definition.name_field is not None:
+                offset, name_size = definition.name_field
+                name = data[pos + offset:pos + offset + name_size].split(b"\0", 1)[0]
+                if name.decode("utf-8", "replace").lower() in self.key_fields:
+                    raise FitDecodeFallback("Developer field shadows a key field")
+            pos += definition.size
+            self.data_left -= 1 + definition.size
+
+        # Offsets refer to this block, so settle the timestamp source before it is released
+        if self.ts_source is not None and self.ts_source[1] is not None:
+            self.ts_pending = struct.unpack_from(self.ts_source[1], data, self.ts_source[0])[0]
+            self.ts_source = None
+        return self._gather(data, n_rows), pos
+
+    def message_columns(self, global_num):
+        """
+        Returns the message table collected so far for a global message number.
+
+        Args:
+            global_num (int): One of the keys of messages.
+
+        Returns:
+            dict: Field name -> np.ndarray (float64, NaN for invalid data; date_time fields in
+            seconds since the FIT epoch) for every field of the table, one row per message.
+        """
+        parts = self.message_parts[global_num]
+        return {
+            field: np.concatenate([columns.get(field, np.full(size, np.nan)) for columns, size in parts])
+            if parts else np.empty(0)
+            for field in self.messages[global_num]
+        }
+
+    def _gather(self, data, n_rows):
+        """Decodes the rows collected by decode into column arrays and resets the layouts."""
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        columns = {}
+        for (_, global_num, _), layout in self.layouts.items():
+            table = layout.table
+            if table is not None and table.rows:
+                table_columns = {}
+                self._gather_layout(buffer, table, table_columns, len(table.rows))
+                self.message_parts[global_num].append((table_columns, len(table.rows)))
+            self._gather_layout(buffer, layout, columns, n_rows)
+        return {key: columns[key] for key in self.key_fields if key in columns}
+
+    @staticmethod
+    def _gather_layout(buffer, layout, columns, n_rows):
+        """Decodes the rows collected in one layout into columns (of n_rows rows) and resets it."""
+        if not layout.rows:
+            return
+        rows = np.asarray(layout.rows, dtype=np.intp)
+        if layout.columns:
+            offsets = np.asarray(layout.offsets, dtype=np.intp)
+            gathered = buffer[offsets[:, None] + np.arange(layout.dtype.itemsize)]
+            records = gathered.view(layout.dtype).ravel()
+        for name, spec, code, invalid in layout.columns:
+            raw = records[name]
+            if code[0] == "f":
+                missing = np.isnan(raw)
+            else:
+                missing = raw == invalid
+                if spec.bits is not None:
+                    raw = (raw >> spec.bit_offset) & ((1 << spec.bits) - 1)
+            values = raw.astype(np.float64)
+            if spec.column in FIT_DATE_TIME_FIELDS:
+                missing |= values < FIT_MIN_ABSOLUTE_TIMESTAMP
+            if spec.scale:
+                values /= spec.scale
+            if spec.offset:
+                values -= spec.offset
+            values[missing] = np.nan
+            column = columns.get(spec.column)
+            if column is None:
+                column = columns[spec.column] = np.full(n_rows, np.nan)
+            column[rows] = values
+        if layout.header_timestamps:
+            column = columns.get("timestamp")
+            if column is None:
+                column = columns["timestamp"] = np.full(n_rows, np.nan)
+            positions = np.fromiter(layout.header_timestamps.keys(), dtype=np.intp)
+            values = np.fromiter(layout.header_timestamps.values(), dtype=np.float64)
+            values[values < FIT_MIN_ABSOLUTE_TIMESTAMP] = np.nan
+            column[rows[positions]] = values
+        layout.offsets = []
+        layout.rows = []
+        layout.header_timestamps = {}
+
+
+def decode_fit_columns(data, key_fields):
+    """
+    Decodes a complete FIT file into typed NumPy column arrays.
+
+    Args:
+        data (bytes): Raw (decompressed) FIT file contents.
+        key_fields (tuple): Lower-cased key field names.
+
+    Returns:
+        tuple: (activity_type, dict of column name -> np.ndarray). Values are float64 with NaN
+               for invalid data; ``timestamp`` holds seconds since the FIT epoch.
+
+    Raises:
+        FitDecodeFallback: If the file uses features only the fitparse path handles.
+    """
+    decoder = FitColumnDecoder(key_fields)
+    columns, _ = decoder.decode(data)
+    return decoder.activity_type, columns
+
+
+def semicircles_to_degrees(values):
+    """
+    Converts raw FIT latitude/longitude values (semicircles) to decimal degrees.
+
+    Args:
+        values (array-like): Raw semicircle values (NaN or None for missing fixes).
+
+    Returns:
+        np.ndarray: float64 degrees.
+    """
+    return np.asarray(values, dtype=np.float64) / 2147483648.0 * 180
+
+
+def _segment_starts(segments):
+    """Index of the first row of each row's segment (segments: one integer id per row, in runs)."""
+    n = len(segments)
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = segments[1:] != segments[:-1]
+    return np.maximum.accumulate(np.where(starts, np.arange(n), 0)) if n else np.zeros(0, dtype=np.intp)
+
+
+def _segment_cumsum(values, segment_start):
+    """Cumulative sum of values restarting at every segment start."""
+    cumulative = np.cumsum(values)
+    return cumulative - (cumulative[segment_start] - values[segment_start])
+
+
+def derive_channel_arrays(latitude, longitude, altitude, elapsed, distance=None, segments=None,
+                          smoothing_window=30, grade_window=30, min_run=5.0):
+    """
+    Derives GPS distance, smoothed altitude, elevation gain, grade and VAM from whole arrays.
+
+    Any number of activities can be processed in one call by passing segments (e.g. workout
+    codes); windows and running sums never cross a segment boundary. Windows are time based:
+    every row looks at the rows of its segment within +/- window/2 seconds, located with one
+    searchsorted over a (segment, time) key, and window sums come from cumulative sums, so
+    there are no per-row Python loops.
+
+    Args:
+        latitude (array-like): Latitude in degrees (NaN where there is no fix).
+        longitude (array-like): Longitude in degrees.
+        altitude (array-like): Altitude in meters (NaN allowed).
+        elapsed (array-like): Seconds since the start of each activity, in time order.
+        distance (array-like): Device distance in meters, used for grade where it increases;
+            GPS distance is used otherwise. None uses GPS distance only.
+        segments (array-like): Integer activity id of each row (rows of an activity contiguous),
+            or None for a single activity.
+        smoothing_window (float): Width (s) of the centered moving average of altitude.
+        grade_window (float): Width (s) over which grade and VAM are measured.
+        min_run (float): Grade is NaN where less than this many meters are covered in the window.
+
+    Returns:
+        dict: 'gps_distance' (cumulative haversine distance, m), 'smoothed_altitude' (m),
+        'elevation_gain' (cumulative ascent of the smoothed altitude, m), 'grade' (%) and
+        'vam' (vertical ascent rate, m/h; 0 when descending), one float64 array each.
+    """
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    altitude = np.asarray(altitude, dtype=np.float64)
+    elapsed = np.asarray(elapsed, dtype=np.float64)
+    n = len(elapsed)
+    segments = np.zeros(n, dtype=np.int64) if segments is None else np.asarray(segments)
+    index = np.arange(n)
+    segment_start = _segment_starts(segments)
+
+    # Haversine distance from the previous valid fix of the same activity
+    valid = np.isfinite(latitude) & np.isfinite(longitude)
+    last_valid = np.maximum.accumulate(np.where(valid, index, -1)) if n else np.zeros(0, dtype=np.intp)
+    previous = np.full(n, -1)
+    previous[1:] = last_valid[:-1]
+    has_previous = valid & (previous >= segment_start)
+    lat = np.radians(latitude)
+    lon = np.radians(longitude)
+    step = np.zeros(n)
+    i, j = index[has_previous], previous[has_previous]
+    a = np.sin((lat[i] - lat[j]) / 2) ** 2 + np.cos(lat[i]) * np.cos(lat[j]) * np.sin((lon[i] - lon[j]) / 2) ** 2
+    step[has_previous] = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    gps_distance = _segment_cumsum(step, segment_start) if n else step
+
+    # Time-based windows that stay within the activity: one sorted (segment, time) key
+    rank = np.cumsum(np.concatenate(([0], segments[1:] != segments[:-1]))) if n else index
+    span = (np.nanmax(elapsed) - np.nanmin(elapsed) + max(smoothing_window, grade_window) + 1) if n else 1.0
+    key = np.maximum.accumulate(rank * span + np.nan_to_num(elapsed - elapsed[segment_start]))
+
+    def window_bounds(width):
+        low = np.searchsorted(key, key - width / 2, side="left")
+        high = np.searchsorted(key, key + width / 2, side="right") - 1
+        return low, high
+
+    altitude_valid = np.isfinite(altitude)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(altitude_valid, altitude, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(altitude_valid)))
+    low, high = window_bounds(smoothing_window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        smoothed = (sums[high + 1] - sums[low]) / (counts[high + 1] - counts[low])
+
+    climb = np.zeros(n)
+    climb[1:] = np.diff(smoothed)
+    climb[segment_start == index] = 0
+    climb = np.where(np.isfinite(climb) & (climb > 0), climb, 0.0)
+    elevation_gain = _segment_cumsum(climb, segment_start) if n else climb
+
+    low, high = window_bounds(grade_window)
+    rise = smoothed[high] - smoothed[low]
+    run = gps_distance[high] - gps_distance[low]
+    if distance is not None:
+        distance = np.asarray(distance, dtype=np.float64)
+        # Carry the last reading over dropouts (and rows of other messages) within the activity
+        last_reading = np.maximum.accumulate(np.where(np.isfinite(distance), index, -1))
+        distance = np.where(last_reading >= segment_start, distance[last_reading], np.nan)
+        device_run = distance[high] - distance[low]
+        run = np.where(np.isfinite(device_run) & (device_run > 0), device_run, run)
+    seconds = elapsed[high] - elapsed[low]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grade = np.where(run >= min_run, 100 * rise / run, np.nan)
+        vam = np.where(seconds > 0, np.maximum(rise, 0) / seconds * 3600, np.nan)
+
+    return {
+        "gps_distance": gps_distance,
+        "smoothed_altitude": smoothed,
+        "elevation_gain": elevation_gain,
+        "grade": grade,
+        "vam": vam,
+    }
+
+
+def derive_channels(frame, **kwargs):
+    """
+    Adds the derived channels of derive_channel_arrays to a frame of one or many activities.
+
+    Args:
+        frame (pd.DataFrame): Processed activity rows with 'workout_id', 'elapsed_time',
+            'latitude', 'longitude' (degrees), 'altitude' and optionally 'distance', in time order
+            within each workout.
+        **kwargs: Window settings passed to derive_channel_arrays.
+
+    Returns:
+        pd.DataFrame: The frame with DERIVED_CHANNELS columns added.
+    """
+    codes, _ = pd.factorize(frame["workout_id"])
+    channels = derive_channel_arrays(
+        frame["latitude"].to_numpy(dtype=np.float64), frame["longitude"].to_numpy(dtype=np.float64),
+        frame["altitude"].to_numpy(dtype=np.float64), frame["elapsed_time"].to_numpy(dtype=np.float64),
+        frame["distance"].to_numpy(dtype=np.float64) if "distance" in frame.columns else None,
+        segments=codes, **kwargs,
+    )
+    return frame.assign(**channels)
+
+
+class ActivityCache:
+    """
+    An on-disk cache of processed per-activity DataFrames, stored as one columnar .npz per file.
+
+    Entries are validated against the source file's size and modification time (or its content
+    hash), so only new or changed files need decoding. The whole cache is invalidated when the
+    schema passed to use_schema (e.g. key_fields/file_dtypes) changes, and the least recently
+    used entries are evicted once the cache grows past max_bytes.
+
+    Attributes:
+        cache_dir (str): Directory holding the .npz files and manifest.json.
+        max_bytes (int): Size limit of the cached data, or None for no limit.
+        content_hash (bool): Validate entries by SHA-1 of the file contents instead of size+mtime.
+        schema (str): Fingerprint of the settings that shape the cached frames.
+        entries (dict): Manifest entries keyed by absolute source path (or entry name, see entry_name).
+    """
+
+    VERSION = 1
+    MANIFEST = "manifest.json"
+
+    def __init__(self, cache_dir, max_bytes=None, content_hash=False):
+        """
+        Opens (or creates) a cache directory.
+
+        Args:
+            cache_dir (str): Directory holding the cached activities.
+            max_bytes (int): Evict least recently used entries beyond this many bytes.
+            content_hash (bool): Validate entries by content hash rather than size+mtime.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.schema = None
+        self.entries = {}
+        manifest_path = os.path.join(cache_dir, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            self.schema = manifest.get("schema")
+            self.entries = manifest.get("entries", {})
+        self.dirty = False
+
+    def use_schema(self, schema):
+        """
+        Sets the settings the cached frames are built with, dropping every entry if they changed.
+
+        Args:
+            schema (object): JSON-serializable settings that shape the cached frames.
+        """
+        fingerprint = hashlib.sha1(
+            json.dumps([self.VERSION, schema], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        if fingerprint == self.schema:
+            return
+        for entry in self.entries.values():
+            self._remove_data(entry)
+        self.entries = {}
+        self.schema = fingerprint
+        self.dirty = True
+
+    def source_key(self, filepath):
+        """
+        Computes the validation key of a source file.
+
+        Args:
+            filepath (str): The path to the source file.
+
+        Returns:
+            str: SHA-1 of the contents, or "<size>:<mtime_ns>".
+        """
+        if self.content_hash:
+            digest = hashlib.sha1()
+            with open(filepath, "rb") as source:
+                for block in iter(lambda: source.read(1 << 20), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+        stat = os.stat(filepath)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def entry_name(self, filepath, key=None):
+        """
+        Names the manifest entry of a source: its absolute path, or the name itself when an
+        explicit validation key is given (e.g. "strava:<activity id>" for downloaded streams).
+        """
+        return os.path.abspath(filepath) if key is None else filepath
+
+    def is_current(self, filepath, key=None):
+        """
+        Checks from the manifest alone, without loading any data, whether a source has a valid entry.
+
+        Args:
+            filepath (str): The path to the source file, or the entry name when key is given.
+            key (str): Validation key to compare instead of the source file's own key.
+
+        Returns:
+            bool: True if get() would find the entry (barring a corrupt data file).
+        """
+        entry = self.entries.get(self.entry_name(filepath, key))
+        return (entry is not None and entry["key"] == (self.source_key(filepath) if key is None else key)
+                and os.path.exists(os.path.join(self.cache_dir, entry["file"])))
+
+    def get(self, filepath, key=None):
+        """
+        Loads the cached DataFrame of a source file.
+
+        Args:
+            filepath (str): The path to the source file, or the entry name when key is given.
+            key (str): Validation key to compare instead of the source file's own key, for
+                entries that have no source file.
+
+        Returns:
+            pd.DataFrame: The cached frame, or None if missing or stale.
+        """
+        path = self.entry_name(filepath, key)
+        entry = self.entries.get(path)
+        if entry is None or entry["key"] != (self.source_key(filepath) if key is None else key):
+            return None
+        try:
+            with np.load(os.path.join(self.cache_dir, entry["file"]), allow_pickle=False) as arrays:
+                columns = {}
+                for i, name in enumerate(arrays["names"]):
+                    values = arrays[f"col_{i}"]
+                    if f"cat_{i}" in arrays.files:
+                        categories = arrays[f"cat_{i}"].astype(object)
+                        values = np.where(values >= 0, categories[np.maximum(values, 0)], None)
+                    columns[str(name)] = values
+        except (OSError, KeyError, ValueError):
+            self._remove_data(self.entries.pop(path))
+            self.dirty = True
+            return None
+        entry["last_used"] = time.time()
+        self.dirty = True
+        return pd.DataFrame(columns)
+
+    def put(self, filepath, file_df, key=None):
+        """
+        Stores the processed DataFrame of a source file.
+
+        Args:
+            filepath (str): The path to the source file, or the entry name when key is given.
+            file_df (pd.DataFrame): The processed frame.
+            key (str): Validation key stored instead of the source file's own key.
+        """
+        path = self.entry_name(filepath, key)
+        arrays = {"names": np.array(file_df.columns, dtype=str)}
+        for i, name in enumerate(file_df.columns):
+            series = file_df[name]
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+                arrays[f"col_{i}"] = series.to_numpy()
+            else:
+                codes, categories = pd.factorize(series)
+                arrays[f"col_{i}"] = codes.astype(np.int32)
+                arrays[f"cat_{i}"] = np.array(categories, dtype=str)
+
+        data_file = hashlib.sha1(path.encode("utf-8")).hexdigest() + ".npz"
+        data_path = os.path.join(self.cache_dir, data_file)
+        np.savez(data_path, **arrays)
+        self.entries[path] = {
+            "key": self.source_key(filepath) if key is None else key,
+            "file": data_file,
+            "bytes": os.path.getsize(data_path),
+            "last_used": time.time(),
+        }
+        self.dirty = True
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        if self.max_bytes is None:
+            return
+        total = sum(entry["bytes"] for entry in self.entries.values())
+        for path, entry in sorted(self.entries.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            self._remove_data(self.entries.pop(path))
+            total -= entry["bytes"]
+            self.dirty = True
+
+    def save(self):
+        """Applies eviction and writes the manifest if anything changed."""
+        self.evict()
+        if not self.dirty:
+            return
+        manifest_path = os.path.join(self.cache_dir, self.MANIFEST)
+        with open(manifest_path + ".tmp", "w") as manifest_file:
+            json.dump({"schema": self.schema, "entries": self.entries}, manifest_file)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        self.dirty = False
+
+    def _remove_data(self, entry):
+        """Deletes the data file of a manifest entry."""
+        try:
+            os.remove(os.path.join(self.cache_dir, entry["file"]))
+        except OSError:
+            pass
+
+
+class IngestStats:
+    """
+    Per-file and aggregate stage timings and counters of the ingest pipeline.
+
+    Timing a stage costs two perf_counter calls and a dict update, so stats are always collected.
+    Each finished file is kept as a record in files and, when jsonl_path is set, appended to that
+    file as one JSON line.
+
+    Attributes:
+        jsonl_path (str): File the per-file records and summaries are appended to, or None.
+        files (list): One record per processed file: name, status, per-stage seconds and counters.
+        totals (dict): Seconds spent in each stage over all files.
+        counters (dict): Totals of records (decoded FIT messages), rows (output rows),
+            bytes_read (file bytes) and bytes_decoded (FIT bytes after decompression).
+    """
+
+    STAGES = ("cache", "read", "decompress", "decode", "frame_build", "coordinate_conversion",
+              "derived_channels", "dtype_cast", "combine", "csv_write")
+    COUNTERS = ("records", "rows", "bytes_read", "bytes_decoded")
+
+    def __init__(self, jsonl_path=None):
+        """
+        Creates empty stats.
+
+        Args:
+            jsonl_path (str): Append per-file records and summaries to this file as JSON lines.
+        """
+        self.jsonl_path = jsonl_path
+        self.files = []
+        self.totals = dict.fromkeys(self.STAGES, 0.0)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.current = None
+        self.started = time.perf_counter()
+
+    def start_file(self, filepath):
+        """
+        Starts the record of one file; stage times and counts go to it until finish_file.
+
+        Args:
+            filepath (str): The file being processed.
+        """
+        self.current = {"file": os.path.basename(filepath), "status": None, "stages": {}}
+        self.current.update(dict.fromkeys(self.COUNTERS, 0))
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as the given stage (of the current file, if any).
+
+        Args:
+            name (str): One of STAGES.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.totals[name] += elapsed
+            if self.current is not None:
+                self.current["stages"][name] = self.current["stages"].get(name, 0.0) + elapsed
+
+    def count(self, **counts):
+        """
+        Adds to the counters (of the current file, if any), e.g. count(rows=3600).
+        """
+        for name, value in counts.items():
+            self.counters[name] += value
+            if self.current is not None:
+                self.current[name] += value
+
+    def finish_file(self, status):
+        """
+        Completes the current file's record.
+
+        Args:
+            status (str): "ok", "cached", "unsupported" or "error".
+
+        Returns:
+            dict: The file's record.
+        """
+        record, self.current = self.current, None
+        record["status"] = status
+        self.files.append(record)
+        self._write_line(dict(record, type="file"))
+        return record
+
+    def add_file(self, record):
+        """
+        Merges the record of a file processed elsewhere (e.g. in a worker process).
+
+        Args:
+            record (dict): A record returned by finish_file.
+        """
+        for name, seconds in record["stages"].items():
+            self.totals[name] += seconds
+        for name in self.COUNTERS:
+            self.counters[name] += record[name]
+        self.files.append(record)
+        self._write_line(dict(record, type="file"))
+
+    def summary(self):
+        """
+        Aggregates the stats collected so far.
+
+        Returns:
+            dict: File counts by status, seconds per stage, counters, and the wall time and rows/s
+            since the stats were created.
+        """
+        statuses = {}
+        for record in self.files:
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+        wall_time = time.perf_counter() - self.started
+        return {
+            "files": len(self.files),
+            "status": statuses,
+            "stages": {name: round(seconds, 6) for name, seconds in self.totals.items() if seconds},
+            **self.counters,
+            "wall_time": round(wall_time, 6),
+            "rows_per_s": round(self.counters["rows"] / wall_time, 1) if wall_time else None,
+        }
+
+    def write_summary(self):
+        """
+        Appends the summary to the JSON-lines file (if any).
+
+        Returns:
+            dict: The summary.
+        """
+        summary = self.summary()
+        self._write_line(dict(summary, type="summary"))
+        return summary
+
+    def _write_line(self, record):
+        """Appends one JSON line to jsonl_path."""
+        if self.jsonl_path is not None:
+            with open(self.jsonl_path, "a") as jsonl_file:
+                jsonl_file.write(json.dumps(record) + "\n")
+
+
 class FitFileProcessor:
     """
     A class to process .fit.gz files containing activity data and convert them into structured DataFrames.
@@ -14,19 +961,51 @@ class FitFileProcessor:
         output_dir (str): The directory to save logs and processed outputs.
         key_fields (list): List of relevant fields to extract from the FIT files.
         file_dtypes (dict): Data types for the resulting DataFrame columns.
-        all_data (list): Accumulated data from processed files.
+        decoder (str): "native" for the vectorized decoder (with fitparse fallback) or "fitparse".
+        keep_records (bool): Whether processed rows are also accumulated in all_data.
+        all_data (list): Accumulated data from processed files (only filled when keep_records is set).
+        cache (ActivityCache): Cache of processed files, or None.
+        stats (IngestStats): Stage timings and counters of the files processed so far.
+        compact (bool): Whether frames use the compact schema of file_dtypes.
+        power_dtype (type): Integer type of the combined power column.
+        swim (bool): Whether pool swim length/lap tables are extracted in the same decode pass.
+        derived_channels (bool): Whether frames get the DERIVED_CHANNELS columns (see derive_channels).
+        swim_lengths (list): One lengths frame per processed swim (see build_swim_frames).
+        swim_laps (list): One laps frame per processed swim.
     """
 
-    def __init__(self, data_dir, output_dir):
+    def __init__(self, data_dir, output_dir, decoder="native", keep_records=False,
+                 cache_dir=None, cache_max_bytes=None, cache_content_hash=False, stats_path=None,
+                 compact=False, swim=False, derived_channels=False):
         """
         Initializes the FitFileProcessor with input and output directories.
 
         Args:
             data_dir (str): Path to the directory containing .fit.gz files.
             output_dir (str): Path to the directory to save logs and processed outputs.
+            decoder (str): "native" to decode record columns with NumPy, or "fitparse" to always
+                use the per-field fitparse path.
+            keep_records (bool): Also accumulate every processed row in all_data as a dict. Off by
+                default since it keeps a second copy of every row in memory.
+            cache_dir (str): Directory of an ActivityCache of processed files. None disables caching.
+            cache_max_bytes (int): Size limit of the cache; least recently used entries are evicted.
+            cache_content_hash (bool): Validate cache entries by content hash instead of size+mtime.
+            stats_path (str): Append per-file stage timings and counters, and a summary after each
+                process_directory call, to this JSON-lines file.
+            compact (bool): Use the compact schema: float32 channels, int16 power, categorical
+                workout_id/sport_type and int64 Unix-second timestamps (rows without a
+                timestamp are dropped per file).
+            swim (bool): Also decode the length, lap and session messages of swims in the same
+                pass as the records, collecting them in swim_lengths/swim_laps (see swim_frames).
+            derived_channels (bool): Add GPS distance, smoothed altitude, elevation gain, grade
+                and VAM columns to every frame (see derive_channels).
         """
+        if decoder not in ("native", "fitparse"):
+            raise ValueError(f"Unknown decoder: {decoder}")
         self.data_dir = data_dir
         self.output_dir = output_dir
+        self.decoder = decoder
+        self.keep_records = keep_records
         self.key_fields = [
             "timestamp", "heart_rate", "distance", "cadence", "enhanced_altitude",
             "enhanced_speed", "temperature", "position_lat", "position_long", "power",
@@ -46,23 +1025,47 @@ class FitFileProcessor:
             'total_calories': 'float64',
             'total_ascent': 'float64'
         }
+        self.power_dtype = int
+        self.compact = compact
+        if compact:
+            # Roughly a third of the memory: 32-bit channels, categorical ids and integer
+            # timestamps (seconds since the Unix epoch). Coordinates keep float64 precision.
+            self.file_dtypes = {
+                'workout_id': 'category',
+                'timestamp': 'int64',
+                'elapsed_time': 'int32',
+                'distance': 'float32',
+                'speed': 'float32',
+                'heartrate': 'float32',
+                'cadence': 'float32',
+                'altitude': 'float32',
+                'latitude': 'float64',
+                'longitude': 'float64',
+                'power': 'float32',
+                'total_calories': 'float32',
+                'total_ascent': 'float32',
+                'sport_type': 'category'
+            }
+            self.power_dtype = np.int16
+        self.derived_channels = derived_channels
+        if derived_channels:
+            self.file_dtypes.update(dict.fromkeys(DERIVED_CHANNELS, "float32" if compact else "float64"))
+        self.swim = swim
+        self.swim_lengths = []
+        self.swim_laps = []
         self.all_data = []
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = ActivityCache(cache_dir, max_bytes=cache_max_bytes, content_hash=cache_content_hash)
+        self.stats = IngestStats(stats_path)
         os.makedirs(output_dir, exist_ok=True)
-
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.FileHandler(os.path.join(output_dir, "processing.log")),
-                logging.StreamHandler()
-            ]
-        )
-        self.logger = logging.getLogger()
+        self.logger = logger
 
     @staticmethod
     def convert_to_decimal_degrees(value):
         """
-        Converts a raw latitude/longitude value to decimal degrees.
+        Converts a raw latitude/longitude value to decimal degrees (see semicircles_to_degrees
+        for whole arrays).
 
         Args:
             value (int): The raw latitude/longitude value.
@@ -72,124 +1075,625 @@ class FitFileProcessor:
         """
         return value / 2147483648.0 * 180
 
-    def process_file(self, filepath):
+    def read_fit_bytes(self, filepath):
         """
-        Processes a single .fit or .fit.gz file and extracts relevant activity data into a DataFrame.
+        Reads the raw FIT contents of a .fit or .fit.gz file.
 
         Args:
             filepath (str): The path to the .fit or .fit.gz file.
 
         Returns:
-            pd.DataFrame: A DataFrame containing the processed data from the file.
+            bytes: The decompressed file contents, or None if the format is unsupported.
         """
-        try:
-            # Support both .fit and .fit.gz files
-            if filepath.endswith(".fit.gz"):
-                with gzip.open(filepath, "rb") as fit_stream:
-                    fitfile = FitFile(fit_stream.read())  # read into memory
-            elif filepath.endswith(".fit"):
-                with open(filepath, "rb") as fit_stream:
-                    fitfile = FitFile(fit_stream.read())  # read into memory
+        # Support both .fit and .fit.gz files
+        if not (filepath.endswith(".fit.gz") or filepath.endswith(".fit")):
+            return None
+        with self.stats.stage("read"):
+            with open(filepath, "rb") as fit_stream:
+                data = fit_stream.read()  # read into memory
+        self.stats.count(bytes_read=len(data))
+        if filepath.endswith(".fit.gz"):
+            with self.stats.stage("decompress"):
+                data = gzip.decompress(data)
+        self.stats.count(bytes_decoded=len(data))
+        return data
 
-            else:
-                self.logger.warning(f"Unsupported file format: {filepath}")
-                return pd.DataFrame()
+    def decode_fitparse(self, data):
+        """
+        Decodes FIT bytes with fitparse, one message and field at a time, in a single pass.
+
+        Args:
+            data (bytes): Raw FIT file contents.
+
+        Returns:
+            tuple: (activity_type, pd.DataFrame of raw key field values, message tables) where
+            message tables maps each SWIM_MESSAGES number to its columns when swim is set
+            (empty otherwise), in the layout of FitColumnDecoder.message_columns.
+        """
+        fitfile = FitFile(data)
+        key_fields = {key.lower() for key in self.key_fields}
+        table_fields = SWIM_MESSAGES if self.swim else {}
+        tables = {num: [] for num in table_fields}
 
-            activity_type = None
-            for record in fitfile.get_messages("sport"):
+        activity_type = None
+        file_data = []
+        for record in fitfile.get_messages():
+            if record.mesg_num == FIT_SPORT_MESG_NUM:
                 for field in record:
                     if field.name == "sport":
                         activity_type = field.value
                         break
+            elif record.mesg_num in tables:
+                # Raw values for enums and date_times, like the native decoder
+                tables[record.mesg_num].append({
+                    field.name: field.raw_value if isinstance(field.value, (str, datetime.datetime)) else field.value
+                    for field in record if field.name in table_fields[record.mesg_num]
+                })
 
-            self.logger.info(f"Processing file: {os.path.basename(filepath)} (Activity: {activity_type})")
+            record_data = {}
+            for field in record:
+                if field.name.lower() in key_fields:
+                    record_data[field.name.lower()] = field.value
 
-            file_data = []
-            for record in fitfile.get_messages():
-                record_data = {"activity_type": activity_type, "file_name": os.path.basename(filepath)}
-                for field in record:
-                    if field.name.lower() in [key.lower() for key in self.key_fields]:
-                        record_data[field.name.lower()] = field.value
-
-                if len(record_data) > 2:
-                    file_data.append(record_data)
-
-            file_df = pd.DataFrame(file_data)
-            for field in self.key_fields:
-                if field.lower() not in file_df.columns:
-                    file_df[field.lower()] = 0 if field != "timestamp" else pd.NaT
-
-            if "timestamp" in file_df.columns:
-                file_df["timestamp"] = pd.to_datetime(file_df["timestamp"], errors="coerce")
-                if file_df["timestamp"].notna().any():
-                    file_df["elapsed_time"] = (
-                        (file_df["timestamp"] - file_df["timestamp"].min()).dt.total_seconds()
-                    ).fillna(0).astype(int)
-                else:
-                    file_df["elapsed_time"] = 0
-
-            # Remove both extensions
-            workout_id = os.path.basename(filepath).replace(".fit.gz", "").replace(".fit", "")
-            file_df["workout_id"] = workout_id
-
-            rename_columns = {
-                "enhanced_altitude": "altitude",
-                "enhanced_speed": "speed",
-                "position_lat": "latitude",
-                "position_long": "longitude",
-                "heart_rate": "heartrate",
+            if record_data:
+                file_data.append(record_data)
+
+        file_df = pd.DataFrame(file_data)
+        if "timestamp" in file_df.columns:
+            file_df["timestamp"] = pd.to_datetime(file_df["timestamp"], errors="coerce")
+        messages = {
+            num: {
+                field: pd.to_numeric(frame[field], errors="coerce").to_numpy(dtype=np.float64)
+                for field in table_fields[num]
             }
+            for num, frame in ((num, pd.DataFrame(rows, columns=list(table_fields[num])))
+                               for num, rows in tables.items())
+        }
+        return activity_type, file_df, messages
 
-            file_df.rename(columns=rename_columns, inplace=True)
+    def decode_native(self, data):
+        """
+        Decodes FIT bytes into typed columns with the vectorized decoder.
+
+        Args:
+            data (bytes): Raw FIT file contents.
+
+        Returns:
+            tuple: (activity_type, pd.DataFrame of raw key field values, message tables) where
+            message tables maps each SWIM_MESSAGES number to its columns when swim is set
+            (empty otherwise).
+
+        Raises:
+            FitDecodeFallback: If the file needs the fitparse path.
+        """
+        key_fields = tuple(key.lower() for key in self.key_fields)
+        decoder = FitColumnDecoder(key_fields, messages=SWIM_MESSAGES if self.swim else None)
+        columns, _ = decoder.decode(data)
+        if "timestamp" in columns:
+            columns["timestamp"] = pd.to_datetime(columns["timestamp"] + FIT_EPOCH_OFFSET, unit="s")
+        messages = {num: decoder.message_columns(num) for num in decoder.messages}
+        return decoder.activity_type, pd.DataFrame(columns), messages
+
+    def iter_record_chunks(self, filepath, chunk_size=3600, block_size=1 << 20):
+        """
+        Streams the record messages of a .fit or .fit.gz file as typed column batches.
+
+        The file is read (and decompressed) block by block and decoded incrementally, so neither
+        the full decompressed bytes nor a DataFrame of the whole activity is ever held in memory.
+
+        Args:
+            filepath (str): The path to the .fit or .fit.gz file.
+            chunk_size (int): Number of rows per yielded chunk (the last chunk may be shorter).
+            block_size (int): Number of decompressed bytes read per step.
+
+        Yields:
+            FitRecordChunk: (activity_type, columns) where columns maps every key field to an
+            array of chunk rows: ``timestamp`` as datetime64[s], all other fields as float64
+            with NaN for missing values. activity_type is the latest sport seen so far.
+
+        Raises:
+            FitDecodeFallback: If the file uses features only the fitparse path handles.
+        """
+        if filepath.endswith(".fit.gz"):
+            opener = gzip.open
+        elif filepath.endswith(".fit"):
+            opener = open
+        else:
+            raise ValueError(f"Unsupported file format: {filepath}")
+
+        key_fields = tuple(key.lower() for key in self.key_fields)
+        decoder = FitColumnDecoder(key_fields, mesg_nums=(FIT_RECORD_MESG_NUM,))
+        pending = []
+        pending_rows = 0
+        with opener(filepath, "rb") as fit_stream:
+            buffer = b""
+            while True:
+                block = fit_stream.read(block_size)
+                if block:
+                    buffer = buffer + block if buffer else block
+                columns, consumed = decoder.decode(buffer)
+                buffer = buffer[consumed:]
+                n_rows = len(next(iter(columns.values()))) if columns else 0
+                if n_rows:
+                    pending.append((columns, n_rows))
+                    pending_rows += n_rows
+                while pending_rows >= chunk_size or (not block and pending_rows):
+                    rows = min(chunk_size, pending_rows)
+                    yield FitRecordChunk(decoder.activity_type, self._take_rows(pending, rows, key_fields))
+                    pending_rows -= rows
+                if not block:
+                    break
+
+    @staticmethod
+    def _take_rows(pending, n_rows, key_fields):
+        """Pops the first n_rows decoded rows off pending as a full set of typed columns."""
+        parts = []
+        taken = 0
+        while taken < n_rows:
+            columns, size = pending[0]
+            count = min(size, n_rows - taken)
+            if count == size:
+                pending.pop(0)
+                parts.append((columns, size))
+            else:
+                parts.append(({key: values[:count] for key, values in columns.items()}, count))
+                pending[0] = ({key: values[count:] for key, values in columns.items()}, size - count)
+            taken += count
+
+        batch = {}
+        for key in key_fields:
+            values = np.concatenate([
+                columns[key] if key in columns else np.full(size, np.nan) for columns, size in parts
+            ])
+            if key == "timestamp":
+                timestamps = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[s]")
+                valid = ~np.isnan(values)
+                timestamps[valid] = (values[valid] + FIT_EPOCH_OFFSET).astype(np.int64)
+                values = timestamps
+            batch[key] = values
+        return batch
+
+    def decode(self, data, filepath):
+        """
+        Decodes FIT bytes with the configured decoder, falling back to fitparse for unusual files.
 
-            column_order = [
-                "workout_id", "timestamp", "elapsed_time", "distance", "speed",
-                "heartrate", "cadence", "altitude", "latitude", "longitude",
-                "power", "total_calories", "total_ascent"
+        Args:
+            data (bytes): Raw FIT file contents.
+            filepath (str): The source path, used for logging.
+
+        Returns:
+            tuple: (activity_type, pd.DataFrame of raw key field values, message tables)
+        """
+        if self.decoder == "native":
+            try:
+                return self.decode_native(data)
+            except (FitDecodeFallback, KeyError, IndexError, ValueError, struct.error) as e:
+                self.logger.info(f"Falling back to fitparse for {os.path.basename(filepath)}: {e}")
+        return self.decode_fitparse(data)
+
+    def build_frame(self, file_df, activity_type, filepath):
+        """
+        Shapes decoded key field values into the standard per-file activity DataFrame.
+
+        Args:
+            file_df (pd.DataFrame): Raw key field values, one row per FIT message.
+            activity_type (str): The sport of the activity.
+            filepath (str): The source path, used to derive the workout id.
+
+        Returns:
+            pd.DataFrame: The processed activity data.
+        """
+        with self.stats.stage("frame_build"):
+            file_df = self._shape_frame(file_df, activity_type, filepath)
+
+        with self.stats.stage("coordinate_conversion"):
+            for column in ("latitude", "longitude"):
+                if column in file_df.columns:
+                    file_df[column] = semicircles_to_degrees(file_df[column].to_numpy())
+
+        if self.derived_channels:
+            with self.stats.stage("derived_channels"):
+                file_df = derive_channels(file_df)
+
+        with self.stats.stage("dtype_cast"):
+            if self.compact:
+                if file_df["timestamp"].isna().any():
+                    file_df = file_df[file_df["timestamp"].notna()]
+                file_df = file_df.assign(
+                    timestamp=file_df["timestamp"].to_numpy().astype("datetime64[s]").astype(np.int64)
+                )
+            return file_df.astype(self.file_dtypes)
+
+    def combine_frames(self, frames):
+        """
+        Concatenates processed per-file frames into one frame of the configured schema.
+
+        Categorical columns are given the union of all files' categories before concatenating, so
+        they stay categorical. Columns are only cast, and rows only filtered, when needed, which
+        avoids full copies of the combined frame.
+
+        Args:
+            frames (list): Processed frames, as returned by process_file.
+
+        Returns:
+            pd.DataFrame: The combined frame with integer power and one row per workout timestamp.
+        """
+        categorical = [column for column, dtype in self.file_dtypes.items() if dtype == "category"]
+        if categorical and len(frames) > 1:
+            categories = {
+                column: pd.api.types.union_categoricals(
+                    [frame[column].astype("category") for frame in frames], ignore_order=True
+                ).categories
+                for column in categorical
+            }
+            frames = [
+                frame.assign(**{
+                    column: frame[column].astype("category").cat.set_categories(categories[column])
+                    for column in categorical
+                })
+                for frame in frames
             ]
+        with self.stats.stage("combine"):
+            combined_df = pd.concat(frames, ignore_index=True)
 
-            for col in column_order:
-                if col not in file_df.columns:
-                    file_df[col] = np.nan if col != "timestamp" else pd.NaT
+        with self.stats.stage("dtype_cast"):
+            mismatched = {
+                column: dtype for column, dtype in self.file_dtypes.items()
+                if column in combined_df.columns and combined_df[column].dtype != pd.api.types.pandas_dtype(dtype)
+            }
+            if mismatched:
+                combined_df = combined_df.astype(mismatched)
 
-            file_df = file_df[column_order]
-            file_df['total_calories'] = np.nanmax(file_df['total_calories'])
-            file_df['total_ascent'] = 0 if file_df['total_ascent'].isna().all() else np.nanmax(file_df['total_ascent'])
-            file_df['sport_type'] = activity_type
+        if not combined_df.empty:
+            with self.stats.stage("combine"):
+                combined_df['power'] = combined_df['power'].fillna(0).astype(self.power_dtype)
+                keep = ~combined_df.duplicated(subset=['workout_id', 'timestamp']) & combined_df['timestamp'].notna()
+                if not keep.all():
+                    combined_df = combined_df[keep]
+        return combined_df
 
-            if "latitude" in file_df.columns:
-                file_df["latitude"] = file_df["latitude"].apply(self.convert_to_decimal_degrees)
-            if "longitude" in file_df.columns:
-                file_df["longitude"] = file_df["longitude"].apply(self.convert_to_decimal_degrees)
+    def _shape_frame(self, file_df, activity_type, filepath):
+        """Adds the derived columns and puts the columns in the standard order."""
+        for field in self.key_fields:
+            if field.lower() not in file_df.columns:
+                file_df[field.lower()] = 0 if field != "timestamp" else pd.NaT
 
-            file_df = file_df.astype(self.file_dtypes)
+        if "timestamp" in file_df.columns:
+            if file_df["timestamp"].notna().any():
+                file_df["elapsed_time"] = (
+                    (file_df["timestamp"] - file_df["timestamp"].min()).dt.total_seconds()
+                ).fillna(0).astype(int)
+            else:
+                file_df["elapsed_time"] = 0
+
+        # Remove both extensions
+        workout_id = os.path.basename(filepath).replace(".fit.gz", "").replace(".fit", "")
+        file_df["workout_id"] = workout_id
+
+        rename_columns = {
+            "enhanced_altitude": "altitude",
+            "enhanced_speed": "speed",
+            "position_lat": "latitude",
+            "position_long": "longitude",
+            "heart_rate": "heartrate",
+        }
+
+        file_df.rename(columns=rename_columns, inplace=True)
+
+        column_order = [
+            "workout_id", "timestamp", "elapsed_time", "distance", "speed",
+            "heartrate", "cadence", "altitude", "latitude", "longitude",
+            "power", "total_calories", "total_ascent"
+        ]
+
+        for col in column_order:
+            if col not in file_df.columns:
+                file_df[col] = np.nan if col != "timestamp" else pd.NaT
+
+        file_df = file_df[column_order]
+        file_df['total_calories'] = np.nanmax(file_df['total_calories'])
+        file_df['total_ascent'] = 0 if file_df['total_ascent'].isna().all() else np.nanmax(file_df['total_ascent'])
+        file_df['sport_type'] = activity_type
+        return file_df
+
+    def build_swim_frames(self, messages, activity_type, filepath):
+        """
+        Shapes the length and lap message tables of a swim into per-file frames.
+
+        Args:
+            messages (dict): Message tables returned by decode (SWIM_MESSAGES numbers -> columns).
+            activity_type (str): The sport of the activity; only swims produce frames.
+            filepath (str): The source path, used to derive the workout id.
+
+        Returns:
+            tuple: (lengths, laps) DataFrames, or None if the file is not a swim. Both have
+            'workout_id', 'start_time' (datetime64[s]), 'elapsed_time' and 'timer_time'
+            (seconds) and 'pool_length' (meters, NaN for open water); lengths add
+            'length_index', 'strokes', 'stroke' and 'active', laps add 'lap_index',
+            'distance', 'lengths', 'active_lengths' and 'first_length_index'.
+        """
+        if activity_type != "swimming" or not messages:
+            return None
+        workout_id = os.path.basename(filepath).replace(".fit.gz", "").replace(".fit", "")
+        pool_lengths = messages[FIT_SESSION_MESG_NUM]["pool_length"]
+        pool_lengths = pool_lengths[np.isfinite(pool_lengths) & (pool_lengths > 0)]
+        pool_length = pool_lengths[0] if len(pool_lengths) else np.nan
+
+        def start_times(columns):
+            seconds = columns["start_time"]
+            times = np.full(len(seconds), np.datetime64("NaT"), dtype="datetime64[s]")
+            valid = np.isfinite(seconds)
+            times[valid] = (seconds[valid] + FIT_EPOCH_OFFSET).astype(np.int64)
+            return times
+
+        def index(values):
+            return np.where(np.isfinite(values), values, np.arange(len(values))).astype(np.int64)
+
+        lengths = messages[FIT_LENGTH_MESG_NUM]
+        strokes = lengths["swim_stroke"]
+        stroke_names = FIELD_TYPES["swim_stroke"].values
+        lengths_df = pd.DataFrame({
+            "workout_id": workout_id,
+            "length_index": index(lengths["message_index"]),
+            "start_time": start_times(lengths),
+            "elapsed_time": lengths["total_elapsed_time"],
+            "timer_time": lengths["total_timer_time"],
+            "strokes": lengths["total_strokes"],
+            "stroke": [stroke_names.get(int(value), str(int(value))) if np.isfinite(value) else None
+                       for value in strokes],
+            "active": lengths["length_type"] == 1,  # length_type: 0 idle (rest), 1 active
+            "pool_length": pool_length,
+        })
+        laps = messages[FIT_LAP_MESG_NUM]
+        laps_df = pd.DataFrame({
+            "workout_id": workout_id,
+            "lap_index": index(laps["message_index"]),
+            "start_time": start_times(laps),
+            "elapsed_time": laps["total_elapsed_time"],
+            "timer_time": laps["total_timer_time"],
+            "distance": laps["total_distance"],
+            "lengths": laps["num_lengths"],
+            "active_lengths": laps["num_active_lengths"],
+            "first_length_index": laps["first_length_index"],
+            "pool_length": pool_length,
+        })
+        return lengths_df, laps_df
+
+    def swim_frames(self):
+        """
+        Combines the swim tables collected so far (see the swim option).
+
+        Returns:
+            tuple: (lengths, laps) DataFrames over all processed swims.
+        """
+        lengths = pd.concat(self.swim_lengths, ignore_index=True) if self.swim_lengths else pd.DataFrame()
+        laps = pd.concat(self.swim_laps, ignore_index=True) if self.swim_laps else pd.DataFrame()
+        return lengths, laps
+
+    def load_cached(self, filepath):
+        """
+        Loads a previously processed file from the cache.
+
+        Args:
+            filepath (str): The path to the .fit or .fit.gz file.
+
+        Returns:
+            pd.DataFrame: The cached frame, or None if caching is off or the entry is missing or stale.
+        """
+        if self.cache is None:
+            return None
+        self.cache.use_schema({"key_fields": self.key_fields, "file_dtypes": self.file_dtypes})
+        file_df = self.cache.get(filepath)
+        if file_df is None:
+            return None
+        self.logger.debug(f"Loaded cached file: {os.path.basename(filepath)}")
+        return file_df.astype(self.file_dtypes)
+
+    def load_cached_file(self, filepath):
+        """
+        Loads a previously processed file, including its swim frames when swim is set.
+
+        Args:
+            filepath (str): The path to the .fit or .fit.gz file.
+
+        Returns:
+            tuple: (file_df, swim frames or None), or None if the file has to be processed (also
+            when it is a swim whose swim frames are not cached).
+        """
+        file_df = self.load_cached(filepath)
+        if file_df is None:
+            return None
+        if not self.swim or file_df.empty or file_df["sport_type"].iloc[0] != "swimming":
+            return file_df, None
+        name = self.cache.entry_name(filepath)
+        key = self.cache.entries[name]["key"]
+        lengths = self.cache.get(f"{name}#lengths", key=key)
+        laps = self.cache.get(f"{name}#laps", key=key)
+        if lengths is None or laps is None:
+            return None
+        return file_df, (lengths, laps)
+
+    def cache_file(self, filepath, file_df, swim=None):
+        """
+        Adds a processed file (and its swim frames, if any) to the cache.
+
+        Args:
+            filepath (str): The path to the .fit or .fit.gz file.
+            file_df (pd.DataFrame): The processed frame.
+            swim (tuple): (lengths, laps) swim frames, or None.
+        """
+        self.cache.put(filepath, file_df)
+        if swim is not None:
+            # Stored under the source's validation key, so they go stale together with the frame
+            name = self.cache.entry_name(filepath)
+            key = self.cache.entries[name]["key"]
+            for suffix, frame in zip(("lengths", "laps"), swim):
+                self.cache.put(f"{name}#{suffix}", frame, key=key)
+
+    def keep_swim(self, swim):
+        """Appends a file's swim frames (if any) to swim_lengths and swim_laps."""
+        if swim is not None:
+            self.swim_lengths.append(swim[0])
+            self.swim_laps.append(swim[1])
+
+    def process_file(self, filepath):
+        """
+        Processes a single .fit or .fit.gz file and extracts relevant activity data into a DataFrame.
+
+        When a cache is configured, unchanged files are loaded from it and newly processed files
+        are added to it (the manifest is written by process_directory or cache.save()). With swim
+        set, the length and lap tables of swims are appended to swim_lengths and swim_laps.
+
+        Args:
+            filepath (str): The path to the .fit or .fit.gz file.
+
+        Returns:
+            pd.DataFrame: A DataFrame containing the processed data from the file.
+        """
+        file_df, swim = self._process_file(filepath)
+        self.keep_swim(swim)
+        if self.keep_records:
             self.all_data.extend(file_df.to_dict("records"))
-            return file_df
+        return file_df
+
+    def _process_file(self, filepath):
+        """Processes one file as process_file does; returns (file_df, swim frames or None)."""
+        stats = self.stats
+        stats.start_file(filepath)
+        try:
+            with stats.stage("cache"):
+                cached = self.load_cached_file(filepath)
+            if cached is not None:
+                stats.count(rows=len(cached[0]))
+                stats.finish_file("cached")
+                return cached
+
+            data = self.read_fit_bytes(filepath)
+            if data is None:
+                self.logger.warning(f"Unsupported file format: {filepath}")
+                stats.finish_file("unsupported")
+                return pd.DataFrame(), None
+
+            with stats.stage("decode"):
+                activity_type, file_df, messages = self.decode(data, filepath)
+            stats.count(records=len(file_df))
+            self.logger.info(f"Processing file: {os.path.basename(filepath)} (Activity: {activity_type})")
+
+            file_df = self.build_frame(file_df, activity_type, filepath)
+            with stats.stage("frame_build"):
+                swim = self.build_swim_frames(messages, activity_type, filepath)
+            stats.count(rows=len(file_df))
+            if self.cache is not None and not file_df.empty:
+                with stats.stage("cache"):
+                    self.cache_file(filepath, file_df, swim)
+            stats.finish_file("ok")
+            return file_df, swim
         except Exception as e:
             self.logger.error(f"Error processing file {os.path.basename(filepath)}: {e}")
-            return pd.DataFrame()
+            if stats.current is not None:
+                stats.finish_file("error")
+            return pd.DataFrame(), None
+
+    def list_activity_files(self):
+        """
+        Lists the .fit.gz and .fit files in the data directory in a deterministic (sorted) order.
+
+        Returns:
+            list: Paths of the activity files to process.
+        """
+        filepaths = []
+        for filename in sorted(os.listdir(self.data_dir)):
+            filepath = os.path.join(self.data_dir, filename)
+            if os.path.isfile(filepath) and (filename.endswith(".fit.gz") or filename.endswith(".fit")):
+                filepaths.append(filepath)
+        return filepaths
+
+    def iter_processed_files(self, filepaths, workers=1):
+        """
+        Processes files and yields their DataFrames in the same order as filepaths.
+
+        With more than one worker, files are decoded in a process pool. At most two files per
+        worker are in flight at once, so results never pile up ahead of the consumer and memory
+        stays bounded however many files there are.
+
+        Args:
+            filepaths (list): Paths of the .fit or .fit.gz files to process.
+            workers (int): Number of worker processes. 1 processes files in this process and
+                None uses one worker per CPU.
+
+        Yields:
+            pd.DataFrame: The processed data of each file (empty if the file failed).
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or len(filepaths) <= 1:
+            for filepath in filepaths:
+                yield self.process_file(filepath)
+            return
+
+        # Workers get their own copy without accumulated records or cache; both are handled here
+        worker = copy.copy(self)
+        worker.all_data = []
+        worker.swim_lengths = []
+        worker.swim_laps = []
+        worker.keep_records = False
+        worker.cache = None
+        worker.stats = IngestStats()  # per-file records are sent back and merged into self.stats
+        remaining = iter(filepaths)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_ingest_worker,
+                                 initargs=(worker,)) as executor:
+
+            def submit(filepath):
+                self.stats.start_file(filepath)
+                with self.stats.stage("cache"):
+                    cached = self.load_cached_file(filepath)
+                if cached is not None:
+                    self.stats.count(rows=len(cached[0]))
+                    self.stats.finish_file("cached")
+                    return filepath, cached
+                self.stats.current = None
+                return filepath, executor.submit(_ingest_worker, filepath)
+
+            pending = deque(submit(filepath) for filepath in itertools.islice(remaining, 2 * workers))
+            while pending:
+                filepath, result = pending.popleft()
+                if isinstance(result, tuple):
+                    file_df, swim = result
+                else:
+                    file_df, swim, record = result.result()
+                    self.stats.add_file(record)
+                    if self.cache is not None and not file_df.empty:
+                        with self.stats.stage("cache"):
+                            self.cache_file(filepath, file_df, swim)
+                self.keep_swim(swim)
+                next_filepath = next(remaining, None)
+                if next_filepath is not None:
+                    pending.append(submit(next_filepath))
+                if self.keep_records:
+                    self.all_data.extend(file_df.to_dict("records"))
+                yield file_df
 
-    def process_directory(self, file_name=False):
+    def process_directory(self, file_name=False, workers=1):
         """
         Processes all .fit.gz and .fit files in the specified directory and combines their data into a single DataFrame.
 
+        Args:
+            file_name (str): If given, the combined data is also saved to <output_dir>/<file_name>.csv.
+            workers (int): Number of worker processes used to decode files (None for one per CPU).
+                Output order is the sorted file order regardless of the worker count.
+
         Returns:
             pd.DataFrame: A DataFrame containing combined data from all processed files.
         """
         all_dfs = []
-        for filename in os.listdir(self.data_dir):
-            filepath = os.path.join(self.data_dir, filename)
-            if os.path.isfile(filepath) and (filename.endswith(".fit.gz") or filename.endswith(".fit")):
-                file_df = self.process_file(filepath)
-                if not file_df.empty:
-                    all_dfs.append(file_df)
+        for file_df in self.iter_processed_files(self.list_activity_files(), workers=workers):
+            if not file_df.empty:
+                all_dfs.append(file_df)
+        if self.cache is not None:
+            self.cache.save()
 
         if all_dfs:
-            combined_df = pd.concat(all_dfs, ignore_index=True)
-            combined_df = combined_df.astype(self.file_dtypes)
-            if not combined_df.empty:
-                combined_df['power'] = combined_df['power'].fillna(0).astype(int)
-                combined_df = combined_df.drop_duplicates(subset=['workout_id', 'timestamp']).dropna(subset=['timestamp'])
+            combined_df = self.combine_frames(all_dfs)
             self.logger.info("Processing complete. Returning combined DataFrame.")
             if file_name:
                 # Rename columns before saving
@@ -199,18 +1703,44 @@ class FitFileProcessor:
                 }, inplace=True)
 
                 csv_path = os.path.join(self.output_dir, f"{file_name}.csv")
-                combined_df.to_csv(csv_path, index=False)
+                with self.stats.stage("csv_write"):
+                    combined_df.to_csv(csv_path, index=False)
                 self.logger.info(f"Saved DataFrame to {csv_path}")
+            self.logger.info(f"Ingest stats: {json.dumps(self.stats.write_summary())}")
             return combined_df
         else:
             self.logger.warning("No valid data processed. Returning empty DataFrame.")
+            self.logger.info(f"Ingest stats: {json.dumps(self.stats.write_summary())}")
             return pd.DataFrame()
 
 
+_worker_processor = None
+
+
+def _init_ingest_worker(processor):
+    """Installs the processor used by _ingest_worker in a pool process."""
+    global _worker_processor
+    _worker_processor = processor
+
+
+def _ingest_worker(filepath):
+    """Processes one file in a pool process, returning its frame, swim frames and stats record."""
+    file_df, swim = _worker_processor._process_file(filepath)
+    return file_df, swim, _worker_processor.stats.files.pop()
+
+
 # Example usage
 if __name__ == "__main__":
     data_dir = "/Users/joshuagordon/Documents/sandbox/strava-im-estimator/ironman-estimator/example_data/"  #dirctory with fit.gz files
     output_dir = "/Users/joshuagordon/Documents/sandbox/strava-im-estimator/ironman-estimator/example_data/"
     file_name = 'test'
-    processor = FitFileProcessor(data_dir, output_dir)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler(os.path.join(output_dir, "processing.log")),
+            logging.StreamHandler()
+        ]
+    )
+    processor = FitFileProcessor(data_dir, output_dir, stats_path=os.path.join(output_dir, "ingest_stats.jsonl"))
     result_df = processor.process_directory(file_name)
@@ -0,0 +1,237 @@
+"""
+Benchmarks the ingest and analytics hot paths on reproducible synthetic activities.
+
+Each benchmark reports its throughput (samples/s, files/s or fits/s) from the fastest of
+--repeat timed runs, and the peak memory allocated during one extra traced run. Results can be
+saved as JSON and compared against a saved baseline, failing when a throughput drops by more
+than --tolerance.
+
+Usage (from the repository root):
+    python scripts/benchmark.py --hours 1 4 17 --json benchmark.json
+    python scripts/benchmark.py --baseline benchmark.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from FitFileProcessor import FitFileProcessor, derive_channel_arrays  # noqa: E402
+from synthetic_activities import synthetic_activity, strava_stream_frame, write_activity  # noqa: E402
+from ml.cycling_model import (  # noqa: E402
+    cycling_normalized_power, evaluate_peak_avg_wattages, mean_max_power, peak_avg_wattage,
+    predict_long_duration_power,
+)
+from ml.running_model import analyze_distances, target_distances  # noqa: E402
+
+PEAK_WINDOWS = [5, 60, 300, 600, 1200, 3600, 7200, 10800, 14400, 18000]
+# predict_long_duration_power takes durations in minutes
+CP_SHORT_DURATIONS = [1, 5, 10, 20, 30, 60]
+CP_LONG_DURATIONS = [90, 120, 150, 180, 240, 300]
+
+BenchmarkResult = namedtuple("BenchmarkResult", ["name", "items", "unit", "seconds", "throughput", "peak_mb"])
+
+
+def run_benchmark(name, func, items, unit, repeat=3):
+    """
+    Times a benchmark and measures its peak memory.
+
+    Args:
+        name (str): Benchmark name.
+        func (callable): Zero-argument callable running one iteration.
+        items (int): Work items (samples, files, fits) processed per iteration.
+        unit (str): Name of the work item, e.g. 'samples'.
+        repeat (int): Number of timed runs after one warm-up run; the fastest is reported.
+
+    Returns:
+        BenchmarkResult: The measurements.
+    """
+    func()  # warm-up: lazy imports and first-call caches are not part of the timings
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+
+    # Memory is traced in a separate run so tracing overhead does not skew the timings
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(name, items, unit, seconds, items / seconds if seconds else float("inf"), peak / 2**20)
+
+
+def benchmark_suite(hours, workdir, repeat=3, workers=1, seed=0):
+    """
+    Generates the synthetic inputs and runs every benchmark.
+
+    Args:
+        hours (list of float): Activity durations (hours); one activity is generated per value.
+        workdir (str): Scratch directory for the generated files.
+        repeat (int): Timed runs per benchmark.
+        workers (int): Worker processes for the process_directory benchmark.
+        seed (int): Base random seed.
+
+    Returns:
+        list: BenchmarkResult for each benchmark.
+    """
+    fit_dir = os.path.join(workdir, "fit")
+    output_dir = os.path.join(workdir, "output")
+    os.makedirs(fit_dir, exist_ok=True)
+
+    rides, runs, fit_paths = [], [], []
+    for i, duration in enumerate(hours):
+        streams = synthetic_activity(duration, sport="cycling", seed=seed + i)
+        rides.append(strava_stream_frame(streams, activity_id=i))
+        extension = "fit.gz" if i % 2 else "fit"
+        fit_paths.append(write_activity(os.path.join(fit_dir, f"ride_{i}.{extension}"), streams,
+                                        compressed_timestamps=True))
+        run = synthetic_activity(min(duration, 6), sport="running", seed=seed + 100 + i)
+        runs.append(pd.DataFrame({"timestamp": pd.to_datetime(run["timestamp"]), "distance": run["distance"]}))
+
+    samples = sum(len(ride) for ride in rides)
+    run_samples = sum(len(run) for run in runs)
+    processor = FitFileProcessor(fit_dir, output_dir)
+    processor.logger.setLevel(logging.WARNING)  # per-file progress messages would swamp the report
+    results = []
+
+    def process_files():
+        for path in fit_paths:
+            processor.process_file(path)
+
+    results.append(run_benchmark("process_file", process_files, samples, "samples", repeat))
+    results.append(run_benchmark("process_directory", lambda: processor.process_directory(workers=workers),
+                                 len(fit_paths), "files", repeat))
+
+    def peak_wattage():
+        for ride in rides:
+            for window in PEAK_WINDOWS:
+                peak_avg_wattage(ride, window)
+
+    results.append(run_benchmark("peak_avg_wattage", peak_wattage, samples * len(PEAK_WINDOWS), "samples", repeat))
+    results.append(run_benchmark("evaluate_peak_avg_wattages",
+                                 lambda: [evaluate_peak_avg_wattages(ride, PEAK_WINDOWS) for ride in rides],
+                                 samples, "samples", repeat))
+    results.append(run_benchmark("cycling_normalized_power",
+                                 lambda: [cycling_normalized_power(ride["watts"]) for ride in rides],
+                                 samples, "samples", repeat))
+    results.append(run_benchmark("derive_channels",
+                                 lambda: derive_channel_arrays(
+                                     np.concatenate([ride["latitude"] for ride in rides]),
+                                     np.concatenate([ride["longitude"] for ride in rides]),
+                                     np.concatenate([ride["altitude"] for ride in rides]),
+                                     np.concatenate([ride["time"] for ride in rides]),
+                                     segments=np.concatenate([ride["id"] for ride in rides])),
+                                 samples, "samples", repeat))
+    results.append(run_benchmark("analyze_distances",
+                                 lambda: [analyze_distances(run, target_distances) for run in runs],
+                                 run_samples, "samples", repeat))
+
+    short_seconds = np.array(CP_SHORT_DURATIONS) * 60
+    curves = [mean_max_power(ride["watts"], short_seconds) for ride in rides]
+    fits = [(CP_SHORT_DURATIONS, curve, CP_LONG_DURATIONS, curve[3]) for curve in curves if not np.isnan(curve).any()]
+    if fits:
+        # Sanity check: predicted power beyond one hour is positive and at most the 60-minute best
+        for fit in fits:
+            predicted = predict_long_duration_power(*fit)[0]
+            assert np.all(predicted > 0) and np.all(predicted <= fit[1][-1]), \
+                f"implausible long-duration power prediction: {predicted}"
+        results.append(run_benchmark("predict_long_duration_power",
+                                     lambda: [predict_long_duration_power(*fit) for fit in fits],
+                                     len(fits), "fits", repeat))
+    return results
+
+
+def format_results(results):
+    """
+    Formats benchmark results as a text table.
+
+    Args:
+        results (list): BenchmarkResult for each benchmark.
+
+    Returns:
+        str: The table.
+    """
+    lines = [f"{'benchmark':<30}{'items':>12}{'seconds':>10}{'throughput':>22}{'peak MB':>10}"]
+    for result in results:
+        lines.append(
+            f"{result.name:<30}{result.items:>12}{result.seconds:>10.4f}"
+            f"{result.throughput:>15.0f} {result.unit + '/s':<6}{result.peak_mb:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Finds benchmarks whose throughput dropped by more than tolerance against a baseline.
+
+    Only benchmarks that processed the same number of items (i.e. ran with the same --hours) are
+    compared.
+
+    Args:
+        results (list): BenchmarkResult for each benchmark.
+        baseline (dict): {name: result dict} loaded from an earlier --json run.
+        tolerance (float): Allowed fractional throughput drop (e.g. 0.2 for 20%).
+
+    Returns:
+        list: Description of each regression.
+    """
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.name)
+        if previous and previous["items"] == result.items and result.throughput < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{result.name}: {result.throughput:.0f} {result.unit}/s vs {previous['throughput']:.0f} in the baseline"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 4, 17], help="Synthetic activity durations in hours.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the fastest is reported.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for process_directory.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic activities.")
+    parser.add_argument("--workdir", help="Directory for generated files (default: a temporary directory).")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional throughput drop.")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ironman-benchmark-")
+    try:
+        results = benchmark_suite(args.hours, workdir, args.repeat, args.workers, args.seed)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_results(results))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({result.name: result._asdict() for result in results}, json_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as json_file:
+            regressions = compare_to_baseline(results, json.load(json_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
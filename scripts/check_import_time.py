@@ -0,0 +1,90 @@
+"""
+Checks that importing the ml package is side-effect free and fast.
+
+Every ml module is imported together in a fresh interpreter. The check fails if the cold import
+takes longer than the budget, prints anything, or pulls in a dependency that should only be
+loaded by the functions that need it. tests/test_utils.py runs the same check with the default
+budget, so a regression fails the test suite.
+
+Usage (from the repository root):
+    python scripts/check_import_time.py --budget 1.0
+"""
+import os
+import sys
+import json
+import pkgutil
+import argparse
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_DEPENDENCIES = ["matplotlib", "scipy", "vdot_calculator"]
+
+CHILD_CODE = """
+import sys, time, json
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def ml_modules():
+    """
+    Lists the modules of the ml package without importing it.
+
+    Returns:
+        list: Dotted module names, starting with the package itself.
+    """
+    package_dir = os.path.join(REPO_ROOT, "ml")
+    return ["ml"] + [f"ml.{module.name}" for module in pkgutil.iter_modules([package_dir])]
+
+
+def measure_import(modules):
+    """
+    Imports modules in a fresh interpreter.
+
+    Args:
+        modules (list): Dotted module names to import.
+
+    Returns:
+        tuple: (elapsed seconds, list of lazy dependencies that got loaded, unexpected output)
+    """
+    code = CHILD_CODE.format(
+        imports="\n".join(f"import {module}" for module in modules),
+        lazy=LAZY_DEPENDENCIES,
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    *output, summary = result.stdout.strip().splitlines()
+    summary = json.loads(summary)
+    return summary["elapsed"], summary["loaded"], "\n".join(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum cold import time in seconds.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs; the fastest is compared.")
+    args = parser.parse_args()
+
+    modules = ml_modules()
+    runs = [measure_import(modules) for _ in range(args.repeat)]
+    elapsed = min(run[0] for run in runs)
+    loaded = sorted(set(name for run in runs for name in run[1]))
+    output = runs[0][2]
+
+    print(f"Imported {len(modules)} modules in {elapsed:.3f}s (budget {args.budget:.3f}s)")
+    failures = []
+    if elapsed > args.budget:
+        failures.append(f"import took {elapsed:.3f}s, over the {args.budget:.3f}s budget")
+    if loaded:
+        failures.append(f"import loaded {', '.join(loaded)}")
+    if output:
+        failures.append(f"import printed output:\n{output}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
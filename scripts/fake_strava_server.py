@@ -0,0 +1,258 @@
+"""
+A local fake of the Strava API endpoints used by fetch_strava_data.py, for offline runs.
+
+It serves /athlete/activities (paginated, with after/before filters) and
+/activities/<id>/streams for a set of synthetic athletes. It enforces 15-minute and daily
+request budgets with Strava's X-RateLimit headers and 429 responses, and can fail a fraction
+of requests with 503 to exercise retries.
+
+Usage (from the repository root):
+    python scripts/fake_strava_server.py --port 8099 --athletes 3 --activities 40
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import urllib.parse
+from datetime import datetime, timezone
+
+import numpy as np
+
+from synthetic_activities import synthetic_activity
+
+STRAVA_TYPES = {"cycling": "Ride", "running": "Run"}
+
+
+class FakeStravaServer:
+    """
+    An asyncio HTTP/1.1 server (keep-alive) imitating the Strava API.
+
+    Athlete i (0-based) has token "token-<i>" and activities with ids i * 100000 + j, one per
+    day going back from the end date and alternating rides and runs.
+
+    Attributes:
+        tokens (dict): Access tokens mapped to athlete indexes.
+        requests (int): Requests served (including rejected ones).
+        short_usage (int): Requests counted in the current short window.
+        daily_usage (int): Requests counted in the current day.
+        connections (int): Connections accepted.
+        base_url (str): The API base URL, set by start().
+    """
+
+    def __init__(self, athletes=2, activities=20, hours=1.0, short_limit=100, daily_limit=1000,
+                 short_window=900, fail_rate=0.0, seed=0, end_date="2024-12-31"):
+        """
+        Creates the fake athletes.
+
+        Args:
+            athletes (int): Number of athletes.
+            activities (int): Activities per athlete.
+            hours (float): Duration of each activity's streams.
+            short_limit (int): Requests allowed per short window.
+            daily_limit (int): Requests allowed per day.
+            short_window (float): Short window length in seconds (900 on Strava).
+            fail_rate (float): Fraction of requests answered with 503.
+            seed (int): Random seed of the failures.
+            end_date (str): Start date of each athlete's most recent activity.
+        """
+        self.tokens = {f"token-{i}": i for i in range(athletes)}
+        self.activities = activities
+        self.hours = hours
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.short_window = short_window
+        self.fail_rate = fail_rate
+        self.rng = np.random.default_rng(seed)
+        self.end = datetime.fromisoformat(end_date).replace(tzinfo=timezone.utc).timestamp()
+        self.requests = 0
+        self.connections = 0
+        self.short_usage = 0
+        self.daily_usage = 0
+        self._windows = (None, None)
+        self.base_url = None
+        self._server = None
+        self._handlers = set()
+
+    def activity_list(self, athlete):
+        """All activity summaries of an athlete, oldest first."""
+        summaries = []
+        for j in reversed(range(self.activities)):
+            start = self.end - j * 86400 + 6 * 3600
+            summaries.append({
+                "id": athlete * 100000 + j,
+                "start_date": datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "type": STRAVA_TYPES[self.sport(athlete * 100000 + j)],
+                "start": start,
+            })
+        return summaries
+
+    @staticmethod
+    def sport(activity_id):
+        """Even activity ids are rides, odd ones runs."""
+        return "cycling" if activity_id % 2 == 0 else "running"
+
+    def streams(self, activity_id):
+        """The streams of one activity in Strava's key_by_type layout (dropouts are nulls)."""
+        sport = self.sport(activity_id)
+        activity = synthetic_activity(self.hours, sport=sport, seed=activity_id)
+
+        def data(values, decimals):
+            values = np.round(values, decimals)
+            return [None if np.isnan(value) else float(value) for value in values]
+
+        latlng = [[None, None] if np.isnan(lat) else [round(float(lat), 6), round(float(lng), 6)]
+                  for lat, lng in zip(activity["latitude"], activity["longitude"])]
+        moving = np.ones(len(activity["elapsed"]), dtype=bool)
+        moving[1:] = np.diff(activity["elapsed"]) == 1
+        streams = {
+            "time": [int(value) for value in activity["elapsed"]],
+            "distance": data(activity["distance"], 1),
+            "latlng": latlng,
+            "altitude": data(activity["altitude"], 1),
+            "velocity_smooth": data(activity["speed"], 2),
+            "heartrate": data(activity["heart_rate"], 0),
+            "cadence": data(activity["cadence"], 0),
+            "temp": data(activity["temperature"], 0),
+            "moving": moving.tolist(),
+        }
+        if sport == "cycling":
+            streams["watts"] = data(activity["power"], 0)
+        return {name: {"data": values, "series_type": "time", "original_size": len(values),
+                       "resolution": "high"} for name, values in streams.items()}
+
+    def _rate_limit(self):
+        """Counts a request; returns (allowed, headers)."""
+        now = time.time()
+        short_id, day_id = int(now // self.short_window), int(now // 86400)
+        if short_id != self._windows[0]:
+            self.short_usage = 0
+        if day_id != self._windows[1]:
+            self.daily_usage = 0
+        self._windows = (short_id, day_id)
+        allowed = self.short_usage < self.short_limit and self.daily_usage < self.daily_limit
+        if allowed:
+            self.short_usage += 1
+            self.daily_usage += 1
+        return allowed, {
+            "X-RateLimit-Limit": f"{self.short_limit},{self.daily_limit}",
+            "X-RateLimit-Usage": f"{self.short_usage},{self.daily_usage}",
+        }
+
+    def route(self, path, query, headers):
+        """Answers one request: (status, extra headers, JSON-serializable body)."""
+        self.requests += 1
+        allowed, limit_headers = self._rate_limit()
+        if not allowed:
+            return 429, limit_headers, {"message": "Rate Limit Exceeded"}
+        if self.fail_rate and self.rng.random() < self.fail_rate:
+            return 503, limit_headers, {"message": "Service Unavailable"}
+        token = headers.get("authorization", "").removeprefix("Bearer ")
+        if token not in self.tokens:
+            return 401, limit_headers, {"message": "Authorization Error"}
+        athlete = self.tokens[token]
+
+        if path.endswith("/athlete/activities"):
+            page = int(query.get("page", 1))
+            per_page = int(query.get("per_page", 30))
+            after = float(query.get("after", "-inf"))
+            before = float(query.get("before", "inf"))
+            summaries = [{key: value for key, value in summary.items() if key != "start"}
+                         for summary in self.activity_list(athlete) if after < summary["start"] < before]
+            return 200, limit_headers, summaries[(page - 1) * per_page:page * per_page]
+
+        parts = path.strip("/").split("/")
+        if len(parts) >= 3 and parts[-1] == "streams" and parts[-3] == "activities":
+            activity_id = int(parts[-2])
+            if activity_id // 100000 != athlete or activity_id % 100000 >= self.activities:
+                return 404, limit_headers, {"message": "Record Not Found"}
+            return 200, limit_headers, self.streams(activity_id)
+        return 404, limit_headers, {"message": "Not Found"}
+
+    async def _handle(self, reader, writer):
+        """Serves the requests of one keep-alive connection."""
+        self.connections += 1
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                url = urllib.parse.urlsplit(target)
+                query = dict(urllib.parse.parse_qsl(url.query))
+                status, extra_headers, body = self.route(url.path, query, headers)
+                payload = json.dumps(body).encode("utf-8")
+                response = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                            "Content-Type: application/json", f"Content-Length: {len(payload)}"]
+                response += [f"{name}: {value}" for name, value in extra_headers.items()]
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Starts listening.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind (0 picks a free port).
+
+        Returns:
+            str: The API base URL.
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/api/v3"
+        return self.base_url
+
+    async def stop(self):
+        """Stops listening and closes open connections."""
+        self._server.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+
+async def serve(server, host, port):
+    base_url = await server.start(host, port)
+    print(f"Fake Strava API at {base_url}")
+    print(f"Tokens: {json.dumps({str(i): token for token, i in server.tokens.items()})}")
+    await server._server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--athletes", type=int, default=2)
+    parser.add_argument("--activities", type=int, default=20, help="Activities per athlete.")
+    parser.add_argument("--hours", type=float, default=1.0, help="Duration of each activity.")
+    parser.add_argument("--short-limit", type=int, default=100, help="Requests per 15 minutes.")
+    parser.add_argument("--daily-limit", type=int, default=1000, help="Requests per day.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests failed with 503.")
+    args = parser.parse_args()
+    server = FakeStravaServer(args.athletes, args.activities, args.hours, args.short_limit,
+                              args.daily_limit, fail_rate=args.fail_rate)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,575 @@
+"""
+Bulk-downloads Strava activity streams for many athletes.
+
+Activities are listed page by page and their streams downloaded concurrently over a pooled
+keep-alive HTTP client. Requests are scheduled against Strava's application-wide 15-minute and
+daily rate-limit budgets, which are kept in sync with the X-RateLimit headers of every response.
+Each athlete's streams are written to an ActivityCache (one columnar .npz per activity, in the
+example_outdoor_bike.csv layout), and the activity listing is checkpointed, so an interrupted
+run (or one stopped by the daily limit) resumes where it left off.
+
+Usage (from the repository root):
+    python scripts/fetch_strava_data.py tokens.json data/strava --months 12
+    python scripts/fake_strava_server.py --port 8099 &
+    python scripts/fetch_strava_data.py tokens.json /tmp/strava --base-url http://127.0.0.1:8099/api/v3
+
+tokens.json maps athlete ids to OAuth access tokens with the activity:read_all scope.
+"""
+import os
+import ssl
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+from FitFileProcessor import ActivityCache
+
+logger = logging.getLogger(__name__)
+
+STRAVA_API_URL = "https://www.strava.com/api/v3"
+STREAM_TYPES = ["time", "distance", "latlng", "altitude", "velocity_smooth", "heartrate", "cadence",
+                "watts", "temp", "moving", "grade_smooth"]
+# Column layout of the cached streams (see example_data/example_outdoor_bike.csv)
+STREAM_COLUMNS = ["time", "altitude", "velocity_smooth", "heartrate", "cadence", "watts", "temp",
+                  "moving", "latitude", "longitude", "id"]
+STREAM_SCHEMA = {"source": "strava_streams", "columns": STREAM_COLUMNS}
+CHECKPOINT = "checkpoint.json"
+
+
+class StravaAPIError(Exception):
+    """Raised when the Strava API returns an unexpected status."""
+
+    def __init__(self, status, body):
+        super().__init__(f"Strava API returned {status}: {body[:200]!r}")
+        self.status = status
+
+
+class DailyLimitReached(Exception):
+    """Raised when the daily request budget is used up and waiting for it is disabled."""
+
+
+class HTTPConnectionPool:
+    """
+    A minimal asyncio HTTP/1.1 client that keeps up to max_connections keep-alive connections
+    to one host.
+
+    Attributes:
+        host (str): Server host name.
+        port (int): Server port.
+        base_path (str): Path prefix of every request (e.g. "/api/v3").
+        timeout (float): Seconds allowed for connecting and for each request/response exchange.
+    """
+
+    def __init__(self, base_url, max_connections=8, timeout=60):
+        """
+        Creates a pool; connections are opened on demand.
+
+        Args:
+            base_url (str): Base URL of the API, e.g. "https://www.strava.com/api/v3".
+            max_connections (int): Maximum number of concurrent connections.
+            timeout (float): Seconds allowed for connecting and for each exchange.
+        """
+        parts = urllib.parse.urlsplit(base_url)
+        secure = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if secure else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._ssl = ssl.create_default_context() if secure else None
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle = []
+        self.opened = 0
+
+    async def request(self, method, path, params=None, headers=None):
+        """
+        Sends a request on an idle connection (or a new one) and reads the response.
+
+        A reused connection that turns out to be closed by the server is replaced once.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Path below base_path.
+            params (dict): Query parameters.
+            headers (dict): Extra request headers.
+
+        Returns:
+            tuple: (status, headers dict with lower-cased names, body bytes)
+        """
+        target = self.base_path + path
+        if params:
+            target += "?" + urllib.parse.urlencode(params)
+        async with self._slots:
+            while True:
+                reused = bool(self._idle)
+                if reused:
+                    reader, writer = self._idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port, ssl=self._ssl), self.timeout
+                    )
+                    self.opened += 1
+                try:
+                    status, response_headers, body, keep_alive = await asyncio.wait_for(
+                        self._exchange(reader, writer, method, target, headers or {}), self.timeout
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, response_headers, body
+
+    async def _exchange(self, reader, writer, method, target, headers):
+        """Writes one request and reads its response: (status, headers, body, keep_alive)."""
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host}", "Accept: application/json",
+                 "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = response_headers.get("connection", "").lower() != "close"
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in response_headers:
+            body = await reader.readexactly(int(response_headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, response_headers, body, keep_alive
+
+    async def close(self):
+        """Closes the idle connections."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class StravaRateLimiter:
+    """
+    Schedules requests against Strava's 15-minute and daily rate-limit budgets.
+
+    Budgets are shared by every athlete of the application. Usage is counted locally when a
+    request is sent and corrected from the X-RateLimit-Limit/-Usage headers ("15min,daily") of
+    each response. Strava's 15-minute windows start at :00, :15, :30 and :45 and the daily
+    window at midnight UTC.
+
+    Attributes:
+        short_limit (int): Requests allowed per 15-minute window.
+        daily_limit (int): Requests allowed per day.
+        short_usage (int): Requests counted in the current 15-minute window.
+        daily_usage (int): Requests counted in the current day.
+        reserve (int): Requests of each budget left unused (e.g. for the live app).
+        wait_for_daily (bool): Sleep until midnight UTC when the daily budget is used up, instead
+            of raising DailyLimitReached.
+    """
+
+    def __init__(self, short_limit=100, daily_limit=1000, reserve=0, wait_for_daily=False,
+                 short_window=900, clock=time.time):
+        """
+        Creates a limiter with the given budgets.
+
+        Args:
+            short_limit (int): Requests allowed per short window.
+            daily_limit (int): Requests allowed per day.
+            reserve (int): Requests of each budget left unused.
+            wait_for_daily (bool): Wait for the next day instead of raising DailyLimitReached.
+            short_window (float): Length of the short window in seconds (900 on Strava).
+            clock (callable): Returns the current Unix time.
+        """
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+        self.wait_for_daily = wait_for_daily
+        self.short_window = short_window
+        self.clock = clock
+        self.short_usage = 0
+        self.daily_usage = 0
+        self._windows = self._window_ids(clock())
+
+    def _window_ids(self, now):
+        return int(now // self.short_window), int(now // 86400)
+
+    def _roll(self, now):
+        """Resets the usage of windows that have ended."""
+        short_id, day_id = self._window_ids(now)
+        if short_id != self._windows[0]:
+            self.short_usage = 0
+        if day_id != self._windows[1]:
+            self.daily_usage = 0
+        self._windows = (short_id, day_id)
+
+    async def acquire(self):
+        """Waits until both budgets allow one more request, then counts it."""
+        while True:
+            now = self.clock()
+            self._roll(now)
+            if self.daily_usage >= self.daily_limit - self.reserve:
+                if not self.wait_for_daily:
+                    raise DailyLimitReached(f"Daily budget of {self.daily_limit} requests used")
+                wait = 86400 - now % 86400
+            elif self.short_usage >= self.short_limit - self.reserve:
+                wait = self.short_window - now % self.short_window
+            else:
+                self.short_usage += 1
+                self.daily_usage += 1
+                return
+            logger.info(f"Rate limit budget used, waiting {wait:.0f}s")
+            await asyncio.sleep(wait + 0.01)
+
+    def update(self, headers):
+        """
+        Syncs limits and usage with a response's rate-limit headers.
+
+        Args:
+            headers (dict): Response headers with lower-cased names.
+        """
+        if "x-ratelimit-limit" in headers:
+            self.short_limit, self.daily_limit = (int(value) for value in headers["x-ratelimit-limit"].split(","))
+        if "x-ratelimit-usage" in headers:
+            short_usage, daily_usage = (int(value) for value in headers["x-ratelimit-usage"].split(","))
+            self._roll(self.clock())
+            # Requests still in flight are counted locally but not yet by the server
+            self.short_usage = max(self.short_usage, short_usage)
+            self.daily_usage = max(self.daily_usage, daily_usage)
+
+    def exhaust_window(self):
+        """Marks the current 15-minute budget as used (after a 429 response)."""
+        self.short_usage = max(self.short_usage, self.short_limit)
+
+
+class StravaClient:
+    """
+    Strava API calls over a shared connection pool and rate limiter.
+
+    Attributes:
+        pool (HTTPConnectionPool): The HTTP client.
+        limiter (StravaRateLimiter): The shared request budgets.
+        max_retries (int): Attempts per call on 429 and 5xx responses.
+        requests (int): Number of requests sent.
+    """
+
+    def __init__(self, pool, limiter, max_retries=5):
+        self.pool = pool
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.requests = 0
+
+    async def get_json(self, path, token, params=None):
+        """
+        Sends an authenticated GET request within the rate-limit budgets.
+
+        Args:
+            path (str): API path, e.g. "/athlete/activities".
+            token (str): The athlete's access token.
+            params (dict): Query parameters.
+
+        Returns:
+            object: The decoded JSON response.
+
+        Raises:
+            StravaAPIError: On other error statuses, or when retries are exhausted.
+        """
+        for attempt in range(self.max_retries):
+            await self.limiter.acquire()
+            self.requests += 1
+            status, headers, body = await self.pool.request(
+                "GET", path, params, {"Authorization": f"Bearer {token}"}
+            )
+            self.limiter.update(headers)
+            if status == 200:
+                return json.loads(body)
+            if status == 429:
+                self.limiter.exhaust_window()
+            elif status >= 500:
+                await asyncio.sleep(min(2 ** attempt, 60))
+            else:
+                raise StravaAPIError(status, body)
+        raise StravaAPIError(status, body)
+
+    async def list_activities(self, token, page, per_page=200, after=None, before=None):
+        """
+        Lists one page of the athlete's activities.
+
+        Returns:
+            list: Activity summaries (dicts with at least 'id', 'start_date' and 'type').
+        """
+        params = {"page": page, "per_page": per_page}
+        if after is not None:
+            params["after"] = int(after)
+        if before is not None:
+            params["before"] = int(before)
+        return await self.get_json("/athlete/activities", token, params)
+
+    async def get_streams(self, token, activity_id):
+        """
+        Downloads the streams of one activity.
+
+        Returns:
+            dict: {stream type: {"data": [...], ...}}
+        """
+        params = {"keys": ",".join(STREAM_TYPES), "key_by_type": "true"}
+        return await self.get_json(f"/activities/{activity_id}/streams", token, params)
+
+
+def streams_to_frame(streams, activity_id):
+    """
+    Shapes an activity's streams like example_outdoor_bike.csv.
+
+    Args:
+        streams (dict): Output of StravaClient.get_streams.
+        activity_id (int): The activity id ('id' column).
+
+    Returns:
+        pd.DataFrame: Columns STREAM_COLUMNS, one row per sample; missing streams are NaN.
+    """
+    def stream(name, dtype=np.float64):
+        data = streams.get(name, {}).get("data")
+        return None if data is None else np.array(data, dtype=dtype)
+
+    time_stream = stream("time")
+    n = 0 if time_stream is None else len(time_stream)
+
+    def column(name):
+        values = stream(name)
+        return values if values is not None and len(values) == n else np.full(n, np.nan)
+
+    latlng = stream("latlng")
+    if latlng is None or latlng.shape != (n, 2):
+        latlng = np.full((n, 2), np.nan)
+    moving = stream("moving", dtype=bool)
+    return pd.DataFrame({
+        "time": time_stream if time_stream is not None else np.empty(0),
+        "altitude": column("altitude"),
+        "velocity_smooth": column("velocity_smooth"),
+        "heartrate": column("heartrate"),
+        "cadence": column("cadence"),
+        "watts": column("watts"),
+        "temp": column("temp"),
+        "moving": moving if moving is not None and len(moving) == n else np.ones(n, dtype=bool),
+        "latitude": latlng[:, 0],
+        "longitude": latlng[:, 1],
+        "id": np.full(n, activity_id, dtype=np.int64),
+    }, columns=STREAM_COLUMNS)
+
+
+def _load_json(path, default):
+    if os.path.exists(path):
+        with open(path) as json_file:
+            return json.load(json_file)
+    return default
+
+
+def _save_json(path, value):
+    """Writes JSON atomically."""
+    with open(path + ".tmp", "w") as json_file:
+        json.dump(value, json_file)
+    os.replace(path + ".tmp", path)
+
+
+async def fetch_athlete(client, athlete_id, token, output_dir, after=None, before=None, per_page=200,
+                        concurrency=None, save_every=25):
+    """
+    Lists an athlete's activities and downloads the streams of those not cached yet.
+
+    The listing position and activity summaries are checkpointed after every page, and the
+    cache manifest is saved every save_every downloads and on exit, so the next run resumes.
+
+    Args:
+        client (StravaClient): The shared client.
+        athlete_id (str): The athlete id (names the output directory).
+        token (str): The athlete's access token.
+        output_dir (str): Root directory; the athlete's data goes to <output_dir>/<athlete_id>.
+        after (float): Only activities starting after this Unix time.
+        before (float): Only activities starting before this Unix time.
+        per_page (int): Activities per listing page (at most 200 on Strava).
+        concurrency (asyncio.Semaphore): Bounds concurrent stream downloads (shared by athletes).
+        save_every (int): Downloads between cache manifest saves.
+
+    Returns:
+        int: Number of activities downloaded by this call.
+    """
+    athlete_dir = os.path.join(output_dir, str(athlete_id))
+    os.makedirs(athlete_dir, exist_ok=True)
+    checkpoint_path = os.path.join(athlete_dir, CHECKPOINT)
+    checkpoint = _load_json(checkpoint_path, {"activities": {}, "listed": False})
+    if "next_page" not in checkpoint or checkpoint["after"] != after or checkpoint["before"] != before:
+        # A different date range restarts the listing; known activities are kept
+        checkpoint.update(after=after, before=before, next_page=1, listed=False)
+
+    while not checkpoint["listed"]:
+        page = await client.list_activities(token, checkpoint["next_page"], per_page, after, before)
+        for activity in page:
+            checkpoint["activities"][str(activity["id"])] = {
+                "start_date": activity["start_date"],
+                "type": activity.get("sport_type") or activity.get("type"),
+            }
+        checkpoint["next_page"] += 1
+        checkpoint["listed"] = len(page) < per_page
+        _save_json(checkpoint_path, checkpoint)
+
+    cache = ActivityCache(os.path.join(athlete_dir, "streams"))
+    cache.use_schema(STREAM_SCHEMA)
+    pending = [activity_id for activity_id, activity in checkpoint["activities"].items()
+               if not cache.is_current(f"strava:{activity_id}", key=activity["start_date"])]
+    concurrency = concurrency or asyncio.Semaphore(8)
+    downloaded = 0
+
+    async def download(activity_id):
+        nonlocal downloaded
+        async with concurrency:
+            try:
+                streams = await client.get_streams(token, activity_id)
+            except StravaAPIError as e:
+                if e.status != 404:
+                    raise
+                streams = {}  # manual activities have no streams
+        cache.put(f"strava:{activity_id}", streams_to_frame(streams, int(activity_id)),
+                  key=checkpoint["activities"][activity_id]["start_date"])
+        downloaded += 1
+        if downloaded % save_every == 0:
+            cache.save()
+
+    tasks = [asyncio.ensure_future(download(activity_id)) for activity_id in pending]
+    try:
+        # Downloads already sent are finished and cached even when another one fails (e.g. on
+        # DailyLimitReached), so no spent request is thrown away
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cache.save()
+        logger.info(f"Athlete {athlete_id}: {downloaded} of {len(pending)} pending activities downloaded")
+    return downloaded
+
+
+async def fetch_all(tokens, output_dir, base_url=STRAVA_API_URL, after=None, before=None, concurrency=8,
+                    limiter=None):
+    """
+    Downloads the streams of every athlete concurrently under one rate limiter.
+
+    Args:
+        tokens (dict): Athlete ids mapped to access tokens.
+        output_dir (str): Root output directory.
+        base_url (str): API base URL (a fake server's URL for offline runs).
+        after (float): Only activities starting after this Unix time.
+        before (float): Only activities starting before this Unix time.
+        concurrency (int): Maximum concurrent requests (and pooled connections).
+        limiter (StravaRateLimiter): Shared budgets; defaults to Strava's standard limits.
+
+    Returns:
+        dict: Athlete ids mapped to the number of activities downloaded, or to the exception
+        that stopped them (e.g. DailyLimitReached).
+    """
+    pool = HTTPConnectionPool(base_url, max_connections=concurrency)
+    client = StravaClient(pool, limiter or StravaRateLimiter())
+    semaphore = asyncio.Semaphore(concurrency)
+    try:
+        results = await asyncio.gather(
+            *(fetch_athlete(client, athlete_id, token, output_dir, after, before, concurrency=semaphore)
+              for athlete_id, token in tokens.items()),
+            return_exceptions=True,
+        )
+    finally:
+        await pool.close()
+    return dict(zip(tokens, results))
+
+
+def load_athlete_streams(athlete_dir):
+    """
+    Loads every cached activity of an athlete.
+
+    Args:
+        athlete_dir (str): <output_dir>/<athlete_id> of a fetch.
+
+    Returns:
+        pd.DataFrame: The STREAM_COLUMNS of all activities plus 'timestamp' (start date + time)
+        and 'sport_type' (Strava's activity type).
+    """
+    checkpoint = _load_json(os.path.join(athlete_dir, CHECKPOINT), {"activities": {}})
+    cache = ActivityCache(os.path.join(athlete_dir, "streams"))
+    cache.use_schema(STREAM_SCHEMA)
+    frames = []
+    for activity_id, activity in checkpoint["activities"].items():
+        frame = cache.get(f"strava:{activity_id}", key=activity["start_date"])
+        if frame is None or frame.empty:
+            continue
+        start = pd.Timestamp(activity["start_date"]).tz_convert(None)
+        frame["timestamp"] = start + pd.to_timedelta(frame["time"], unit="s")
+        frame["sport_type"] = activity["type"]
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=STREAM_COLUMNS + ["timestamp", "sport_type"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("tokens", help="JSON file mapping athlete ids to access tokens.")
+    parser.add_argument("output_dir", help="Root directory of the per-athlete stream caches.")
+    parser.add_argument("--months", type=float, default=12, help="How far back to fetch.")
+    parser.add_argument("--base-url", default=STRAVA_API_URL, help="API base URL.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum concurrent requests.")
+    parser.add_argument("--reserve", type=int, default=0, help="Requests of each budget left unused.")
+    parser.add_argument("--wait-for-daily", action="store_true",
+                        help="Sleep until midnight UTC when the daily budget is used up instead of stopping.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    with open(args.tokens) as tokens_file:
+        tokens = {str(athlete_id): token for athlete_id, token in json.load(tokens_file).items()}
+    # Whole days, so reruns on the same day resume the checkpointed listing
+    after = (time.time() - args.months * 30.44 * 86400) // 86400 * 86400
+    limiter = StravaRateLimiter(reserve=args.reserve, wait_for_daily=args.wait_for_daily)
+    results = asyncio.run(fetch_all(tokens, args.output_dir, args.base_url, after=after,
+                                    concurrency=args.concurrency, limiter=limiter))
+
+    failed = False
+    for athlete_id, result in results.items():
+        if isinstance(result, Exception):
+            failed = True
+            print(f"{athlete_id}: stopped ({result}); rerun to resume")
+        else:
+            print(f"{athlete_id}: {result} activities downloaded")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
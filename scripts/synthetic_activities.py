@@ -0,0 +1,446 @@
+"""
+Generates realistic synthetic activities for benchmarks: 1 Hz streams with pauses (timestamp
+gaps) and sensor dropouts, written as FIT files (optionally gzipped, optionally using
+compressed-timestamp record headers) or Strava-stream CSV files. Pool swims are written as FIT
+files with length, lap and session messages.
+
+Usage (from the repository root):
+    python scripts/synthetic_activities.py example_data/synthetic --hours 1 4 17 --format fit csv
+"""
+import os
+import gzip
+import struct
+import argparse
+import numpy as np
+
+FIT_EPOCH_OFFSET = 631065600  # Seconds between the Unix epoch and the FIT epoch (1989-12-31 UTC)
+SEMICIRCLES_PER_DEGREE = 2147483648.0 / 180
+FIT_CRC_TABLE = [
+    0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+    0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400,
+]
+FIT_SPORTS = {"running": 1, "cycling": 2, "swimming": 5}
+FIT_SUB_SPORT_LAP_SWIMMING = 17
+
+# Record message fields: (name, field_def_num, numpy type, FIT base type, scale, offset, invalid)
+RECORD_FIELDS = [
+    ("position_lat", 0, "<i4", 0x85, SEMICIRCLES_PER_DEGREE, 0, 0x7FFFFFFF),
+    ("position_long", 1, "<i4", 0x85, SEMICIRCLES_PER_DEGREE, 0, 0x7FFFFFFF),
+    ("altitude", 2, "<u2", 0x84, 5, 500, 0xFFFF),
+    ("heart_rate", 3, "u1", 0x02, 1, 0, 0xFF),
+    ("cadence", 4, "u1", 0x02, 1, 0, 0xFF),
+    ("distance", 5, "<u4", 0x86, 100, 0, 0xFFFFFFFF),
+    ("speed", 6, "<u2", 0x84, 1000, 0, 0xFFFF),
+    ("power", 7, "<u2", 0x84, 1, 0, 0xFFFF),
+    ("temperature", 13, "i1", 0x01, 1, 0, 0x7F),
+]
+
+
+def synthetic_activity(hours, sport="cycling", seed=0, pauses_per_hour=1.0, dropout_rate=0.002,
+                       start_time="2024-06-01T06:00:00"):
+    """
+    Generates the 1 Hz streams of one synthetic activity.
+
+    Power follows a slowly drifting target with interval blocks and second-to-second noise;
+    speed, cadence, heart rate, altitude and position are derived from it. Pauses remove a
+    stretch of samples (the clock keeps running), and dropouts blank a sensor for a few seconds
+    (NaN in the returned arrays).
+
+    Args:
+        hours (float): Moving duration in hours (number of samples is hours * 3600).
+        sport (str): 'cycling' or 'running'.
+        seed (int): Random seed; the same arguments always give the same activity.
+        pauses_per_hour (float): Average number of pauses (10 s to 10 min) per hour.
+        dropout_rate (float): Probability per sample and sensor that a dropout starts.
+        start_time (str): ISO start time (UTC).
+
+    Returns:
+        dict: Arrays 'timestamp' (datetime64[s]), 'elapsed' (s), 'power' (W), 'heart_rate' (bpm),
+        'cadence' (rpm or spm), 'speed' (m/s), 'distance' (m), 'altitude' (m), 'latitude' and
+        'longitude' (degrees), 'temperature' (C), plus 'sport'.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(round(hours * 3600))
+    t = np.arange(n)
+
+    ftp = 250 if sport == "cycling" else 300
+    drift = np.cumsum(rng.normal(0, 0.4, n))
+    drift -= np.linspace(0, drift[-1] if n else 0, n)
+    target = ftp * (0.65 - 0.05 * t / max(n, 1)) + drift
+    intervals = (np.sin(2 * np.pi * t / 1200) > 0.6) & (t % 7200 < 3600)
+    target[intervals] = ftp * 1.05
+    power = np.clip(target + rng.normal(0, 0.08 * ftp, n), 0, None)
+    coasting = rng.random(n) < (0.05 if sport == "cycling" else 0.0)
+    power[coasting] = 0
+
+    if sport == "cycling":
+        speed = np.clip(4.5 + 0.025 * power + rng.normal(0, 0.4, n), 0, None)
+        cadence = np.where(power > 0, 85 + rng.normal(0, 4, n), 0)
+    else:
+        speed = np.clip(power / 90 + rng.normal(0, 0.15, n), 0.5, None)
+        cadence = 85 + rng.normal(0, 2, n)
+    heart_rate = 100 + 60 * np.convolve(power / ftp, np.ones(60) / 60, mode="same") + rng.normal(0, 1.5, n)
+    altitude = 250 + 40 * np.sin(2 * np.pi * t / 5400) + np.cumsum(rng.normal(0, 0.05, n))
+    heading = np.cumsum(rng.normal(0, 0.01, n))
+    distance = np.cumsum(speed)
+    latitude = 32.89 + np.cumsum(speed * np.cos(heading)) / 111320
+    longitude = -97.59 + np.cumsum(speed * np.sin(heading)) / (111320 * np.cos(np.radians(32.89)))
+    temperature = 22 + 6 * t / max(n, 1) + rng.normal(0, 0.3, n)
+
+    # Pauses: the clock jumps forward between consecutive samples
+    step = np.ones(n, dtype=np.int64)
+    n_pauses = rng.poisson(pauses_per_hour * hours)
+    if n > 1 and n_pauses:
+        step[rng.integers(1, n, n_pauses)] += rng.integers(10, 600, n_pauses)
+    step[0] = 0
+    elapsed = np.cumsum(step)
+
+    streams = {
+        "power": power, "heart_rate": heart_rate, "cadence": cadence, "speed": speed,
+        "distance": distance, "altitude": altitude, "latitude": latitude, "longitude": longitude,
+        "temperature": temperature,
+    }
+    for name in ("power", "heart_rate", "cadence", "latitude"):
+        blanked = np.zeros(n + 30, dtype=bool)
+        for start, length in zip(np.flatnonzero(rng.random(n) < dropout_rate), rng.integers(1, 30, n)):
+            blanked[start:start + length] = True
+        streams[name] = streams[name].copy()
+        streams[name][blanked[:n]] = np.nan
+    streams["longitude"] = np.where(np.isnan(streams["latitude"]), np.nan, longitude)
+
+    streams["timestamp"] = np.datetime64(start_time, "s") + elapsed
+    streams["elapsed"] = elapsed
+    streams["sport"] = sport
+    return streams
+
+
+def synthetic_pool_swim(hours=1.0, seed=0, pool_length=25.0, css_pace=95.0,
+                        start_time="2024-06-01T06:00:00"):
+    """
+    Generates the lengths and laps of one synthetic pool swim with a CSS test set.
+
+    The session is a 400 m warm-up, a 400 m and a 200 m time trial, repeats of 100 m at CSS
+    pace filling the remaining time, and a 200 m cool-down, with rests between sets. The time
+    trials are swum at 0.97 and 0.94 times the CSS pace, so the CSS computed from them is
+    close to css_pace.
+
+    Args:
+        hours (float): Approximate session duration in hours (sets the number of 100 m repeats).
+        seed (int): Random seed; the same arguments always give the same swim.
+        pool_length (float): Pool length in meters.
+        css_pace (float): CSS pace of the swimmer in seconds per 100 m.
+        start_time (str): ISO start time (UTC).
+
+    Returns:
+        dict: 'lengths' and 'laps' (dicts of arrays: 'start' (s since start_time), 'elapsed' (s),
+        'active'; lengths add 'strokes', laps add 'first_length', 'num_lengths' and 'distance'),
+        'pool_length', 'start_time' (datetime64[s]) and 'sport'.
+    """
+    rng = np.random.default_rng(seed)
+    repeats = max(int((hours * 3600 - 1500) // 140), 1)
+    # (distance, pace relative to CSS, rest after the set in seconds)
+    sets = [(400, 1.15, 60), (400, 0.97, 180), (200, 0.94, 120)]
+    sets += [(100, 1.0, 20)] * repeats + [(200, 1.2, 0)]
+
+    lengths = {"start": [], "elapsed": [], "active": [], "strokes": []}
+    laps = {"start": [], "elapsed": [], "active": [], "first_length": [], "num_lengths": [], "distance": []}
+    clock = 0.0
+
+    def add_lap(first, distance, active):
+        laps["start"].append(lengths["start"][first])
+        laps["elapsed"].append(clock - lengths["start"][first])
+        laps["active"].append(active)
+        laps["first_length"].append(first)
+        laps["num_lengths"].append(len(lengths["start"]) - first)
+        laps["distance"].append(distance)
+
+    for distance, relative_pace, rest in sets:
+        first = len(lengths["start"])
+        n_lengths = int(round(distance / pool_length))
+        times = css_pace * relative_pace * pool_length / 100 + rng.normal(0, 0.4, n_lengths)
+        for time in times:
+            lengths["start"].append(clock)
+            lengths["elapsed"].append(time)
+            lengths["active"].append(True)
+            lengths["strokes"].append(int(round(time * 0.75 + rng.normal(0, 1))))
+            clock += time
+        add_lap(first, n_lengths * pool_length, True)
+        if rest:
+            first = len(lengths["start"])
+            lengths["start"].append(clock)
+            lengths["elapsed"].append(float(rest))
+            lengths["active"].append(False)
+            lengths["strokes"].append(0)
+            clock += rest
+            add_lap(first, 0.0, False)
+
+    return {
+        "lengths": {name: np.asarray(values) for name, values in lengths.items()},
+        "laps": {name: np.asarray(values) for name, values in laps.items()},
+        "pool_length": pool_length,
+        "start_time": np.datetime64(start_time, "s"),
+        "sport": "swimming",
+    }
+
+
+def fit_crc(data, crc=0):
+    """
+    Computes the FIT CRC-16 of bytes.
+
+    Args:
+        data (bytes): The bytes to checksum.
+        crc (int): CRC of the preceding bytes, to continue a running checksum.
+
+    Returns:
+        int: The CRC.
+    """
+    for byte in data:
+        tmp = FIT_CRC_TABLE[crc & 0xF]
+        crc = ((crc >> 4) & 0x0FFF) ^ tmp ^ FIT_CRC_TABLE[byte & 0xF]
+        tmp = FIT_CRC_TABLE[crc & 0xF]
+        crc = ((crc >> 4) & 0x0FFF) ^ tmp ^ FIT_CRC_TABLE[(byte >> 4) & 0xF]
+    return crc
+
+
+def _definition(local_type, global_num, fields):
+    """Encodes a little-endian definition message for (field_def_num, size, base_type) fields."""
+    message = struct.pack("<BBBHB", 0x40 | local_type, 0, 0, global_num, len(fields))
+    return message + b"".join(struct.pack("<BBB", *field) for field in fields)
+
+
+def encode_fit_activity(streams, compressed_timestamps=False):
+    """
+    Encodes synthetic activity streams as a FIT activity file.
+
+    The file holds file_id, sport, one record per sample and a session with the totals. Missing
+    samples (NaN) are written as the field's invalid value, as devices do on sensor dropouts.
+
+    Args:
+        streams (dict): Output of synthetic_activity.
+        compressed_timestamps (bool): Write records less than 32 s apart with compressed-timestamp
+            headers (no timestamp field), as many head units do.
+
+    Returns:
+        bytes: The FIT file contents.
+    """
+    timestamps = (streams["timestamp"].astype("datetime64[s]").astype(np.int64) - FIT_EPOCH_OFFSET).astype(np.uint32)
+    n = len(timestamps)
+    start = int(timestamps[0]) if n else 0
+    end = int(timestamps[-1]) if n else 0
+
+    record_dtype = [(name, np_type) for name, _, np_type, _, _, _, _ in RECORD_FIELDS]
+    values = np.empty(n, dtype=record_dtype)
+    for name, _, np_type, _, scale, offset, invalid in RECORD_FIELDS:
+        source = streams["latitude" if name == "position_lat" else "longitude" if name == "position_long" else name]
+        raw = np.round((np.asarray(source, dtype=np.float64) + offset) * scale)
+        values[name] = np.where(np.isnan(raw), invalid, raw).astype(np_type)
+    field_defs = [(def_num, np.dtype(np_type).itemsize, base) for _, def_num, np_type, base, _, _, _ in RECORD_FIELDS]
+
+    # Local type 2: record with timestamp; local type 3: record with a compressed-timestamp header
+    full_dtype = np.dtype([("header", "u1"), ("timestamp", "<u4")] + record_dtype)
+    compressed_dtype = np.dtype([("header", "u1")] + record_dtype)
+    if compressed_timestamps and n:
+        compressed = np.zeros(n, dtype=bool)
+        compressed[1:] = np.diff(timestamps.astype(np.int64)) < 32
+    else:
+        compressed = np.zeros(n, dtype=bool)
+
+    full = np.empty(int((~compressed).sum()), dtype=full_dtype)
+    full["header"] = 2
+    full["timestamp"] = timestamps[~compressed]
+    short = np.empty(int(compressed.sum()), dtype=compressed_dtype)
+    short["header"] = 0x80 | (3 << 5) | (timestamps[compressed] & 0x1F)
+    for name, _ in record_dtype:
+        full[name] = values[name][~compressed]
+        short[name] = values[name][compressed]
+
+    # Interleave both row kinds back into time order
+    sizes = np.where(compressed, compressed_dtype.itemsize, full_dtype.itemsize)
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+    records = np.empty(int(sizes.sum()), dtype=np.uint8)
+    full_bytes = full.view(np.uint8).reshape(-1, full_dtype.itemsize)
+    short_bytes = short.view(np.uint8).reshape(-1, compressed_dtype.itemsize)
+    records[offsets[~compressed][:, None] + np.arange(full_dtype.itemsize)] = full_bytes
+    records[offsets[compressed][:, None] + np.arange(compressed_dtype.itemsize)] = short_bytes
+
+    calories = int(np.nansum(streams["power"]) / 1000 * 1.1)
+    ascent = int(np.clip(np.diff(streams["altitude"]), 0, None).sum()) if n > 1 else 0
+    body = b"".join([
+        _definition(0, 0, [(0, 1, 0x00), (1, 2, 0x84), (4, 4, 0x86)]),
+        struct.pack("<BBHI", 0, 4, 255, start),
+        _definition(1, 12, [(0, 1, 0x00)]),
+        struct.pack("<BB", 1, FIT_SPORTS.get(streams["sport"], 0)),
+        _definition(2, 20, [(253, 4, 0x86)] + field_defs),
+        _definition(3, 20, field_defs),
+        records.tobytes(),
+        _definition(0, 18, [(253, 4, 0x86), (2, 4, 0x86), (5, 1, 0x00), (11, 2, 0x84), (22, 2, 0x84)]),
+        struct.pack("<BIIBHH", 0, end, start, FIT_SPORTS.get(streams["sport"], 0),
+                    min(calories, 0xFFFE), min(ascent, 0xFFFE)),
+    ])
+    header = struct.pack("<BBHI4s", 14, 0x20, 2132, len(body), b".FIT")
+    header += struct.pack("<H", fit_crc(header))
+    contents = header + body
+    return contents + struct.pack("<H", fit_crc(contents))
+
+
+def encode_fit_pool_swim(swim):
+    """
+    Encodes a synthetic pool swim as a FIT activity file.
+
+    The file holds file_id, sport (lap swimming), a record at the end of every length (timestamp
+    and distance), the length and lap messages and a session with the pool length.
+
+    Args:
+        swim (dict): Output of synthetic_pool_swim.
+
+    Returns:
+        bytes: The FIT file contents.
+    """
+    start = int(swim["start_time"].astype(np.int64)) - FIT_EPOCH_OFFSET
+    lengths, laps = swim["lengths"], swim["laps"]
+    length_end = np.round(start + lengths["start"] + lengths["elapsed"]).astype(np.int64)
+    length_distance = np.cumsum(np.where(lengths["active"], swim["pool_length"], 0.0))
+    end = int(length_end[-1]) if len(length_end) else start
+
+    messages = [
+        _definition(0, 0, [(0, 1, 0x00), (1, 2, 0x84), (4, 4, 0x86)]),
+        struct.pack("<BBHI", 0, 4, 255, start),
+        _definition(1, 12, [(0, 1, 0x00), (1, 1, 0x00)]),
+        struct.pack("<BBB", 1, FIT_SPORTS["swimming"], FIT_SUB_SPORT_LAP_SWIMMING),
+        _definition(2, 20, [(253, 4, 0x86), (5, 4, 0x86)]),
+    ]
+    messages += [struct.pack("<BII", 2, timestamp, int(round(distance * 100)))
+                 for timestamp, distance in zip(length_end, length_distance)]
+    messages.append(_definition(3, 101, [(253, 4, 0x86), (254, 2, 0x84), (2, 4, 0x86), (3, 4, 0x86),
+                                         (4, 4, 0x86), (5, 2, 0x84), (7, 1, 0x00), (12, 1, 0x00)]))
+    for i in range(len(length_end)):
+        active = bool(lengths["active"][i])
+        elapsed = int(round(lengths["elapsed"][i] * 1000))
+        messages.append(struct.pack(
+            "<BIHIIIHBB", 3, length_end[i], i, int(round(start + lengths["start"][i])), elapsed, elapsed,
+            int(lengths["strokes"][i]) if active else 0xFFFF, 0 if active else 0xFF, int(active),
+        ))
+    messages.append(_definition(3, 19, [(253, 4, 0x86), (254, 2, 0x84), (2, 4, 0x86), (7, 4, 0x86),
+                                        (8, 4, 0x86), (9, 4, 0x86), (32, 2, 0x84), (35, 2, 0x84),
+                                        (40, 2, 0x84)]))
+    for i in range(len(laps["start"])):
+        elapsed = int(round(laps["elapsed"][i] * 1000))
+        lap_start = int(round(start + laps["start"][i]))
+        messages.append(struct.pack(
+            "<BIHIIIIHHH", 3, lap_start + int(round(laps["elapsed"][i])), i, lap_start, elapsed, elapsed,
+            int(round(laps["distance"][i] * 100)), int(laps["num_lengths"][i]), int(laps["first_length"][i]),
+            int(laps["num_lengths"][i]) if laps["active"][i] else 0,
+        ))
+    messages += [
+        _definition(0, 18, [(253, 4, 0x86), (2, 4, 0x86), (5, 1, 0x00), (6, 1, 0x00), (44, 2, 0x84),
+                            (46, 1, 0x00)]),
+        struct.pack("<BIIBBHB", 0, end, start, FIT_SPORTS["swimming"], FIT_SUB_SPORT_LAP_SWIMMING,
+                    int(round(swim["pool_length"] * 100)), 0),
+    ]
+    body = b"".join(messages)
+    header = struct.pack("<BBHI4s", 14, 0x20, 2132, len(body), b".FIT")
+    header += struct.pack("<H", fit_crc(header))
+    contents = header + body
+    return contents + struct.pack("<H", fit_crc(contents))
+
+
+def strava_stream_frame(streams, activity_id=1):
+    """
+    Shapes synthetic activity streams like a Strava stream export (see example_outdoor_bike.csv).
+
+    Args:
+        streams (dict): Output of synthetic_activity.
+        activity_id (int): Value of the 'id' column.
+
+    Returns:
+        pd.DataFrame: Columns time, altitude, velocity_smooth, heartrate, cadence, watts, temp,
+        moving, latitude, longitude, id.
+    """
+    import pandas as pd
+
+    n = len(streams["elapsed"])
+    moving = np.ones(n, dtype=bool)
+    moving[1:] = np.diff(streams["elapsed"]) == 1
+    return pd.DataFrame({
+        "time": streams["elapsed"],
+        "altitude": np.round(streams["altitude"], 1),
+        "velocity_smooth": np.round(streams["speed"], 2),
+        "heartrate": np.round(streams["heart_rate"]),
+        "cadence": np.round(streams["cadence"]),
+        "watts": np.round(streams["power"]),
+        "temp": np.round(streams["temperature"]),
+        "moving": moving,
+        "latitude": np.round(streams["latitude"], 6),
+        "longitude": np.round(streams["longitude"], 6),
+        "id": activity_id,
+    })
+
+
+def write_activity(path, streams, compressed_timestamps=False):
+    """
+    Writes synthetic activity streams to disk; the format follows the extension
+    (.fit, .fit.gz or .csv).
+
+    Args:
+        path (str): Destination file.
+        streams (dict): Output of synthetic_activity, or of synthetic_pool_swim (FIT only).
+        compressed_timestamps (bool): See encode_fit_activity.
+
+    Returns:
+        str: The path written.
+    """
+    is_swim = "lengths" in streams
+    if path.endswith(".fit.gz") or path.endswith(".fit"):
+        contents = encode_fit_pool_swim(streams) if is_swim else encode_fit_activity(streams, compressed_timestamps)
+        with (gzip.open if path.endswith(".gz") else open)(path, "wb") as fit_file:
+            fit_file.write(contents)
+    elif path.endswith(".csv") and not is_swim:
+        strava_stream_frame(streams).to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unsupported activity file extension: {path}")
+    return path
+
+
+def write_activity_set(output_dir, hours=(1, 4, 17), formats=("fit",), sport="cycling", seed=0,
+                       compressed_timestamps=True):
+    """
+    Writes one synthetic activity per duration and format.
+
+    Args:
+        output_dir (str): Directory the files are written to (created if needed).
+        hours (iterable of float): Activity durations in hours.
+        formats (iterable of str): Any of 'fit', 'fit.gz' and 'csv'.
+        sport (str): 'cycling', 'running' or 'swimming' (pool swims, FIT formats only).
+        seed (int): Base random seed (the i-th activity uses seed + i).
+        compressed_timestamps (bool): See encode_fit_activity (FIT files only).
+
+    Returns:
+        list: Paths of the written files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for i, duration in enumerate(hours):
+        if sport == "swimming":
+            streams = synthetic_pool_swim(duration, seed=seed + i)
+        else:
+            streams = synthetic_activity(duration, sport=sport, seed=seed + i)
+        for file_format in formats:
+            name = f"synthetic_{sport}_{duration:g}h_{seed + i}.{file_format}"
+            paths.append(write_activity(os.path.join(output_dir, name), streams, compressed_timestamps))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output_dir", help="Directory the activities are written to.")
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 4, 17], help="Activity durations in hours.")
+    parser.add_argument("--format", nargs="+", default=["fit"], choices=["fit", "fit.gz", "csv"])
+    parser.add_argument("--sport", default="cycling", choices=sorted(FIT_SPORTS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for path in write_activity_set(args.output_dir, args.hours, args.format, args.sport, args.seed):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import asyncio
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+from FitFileProcessor import ActivityCache  # noqa: E402
+from fake_strava_server import FakeStravaServer  # noqa: E402
+from fetch_strava_data import DailyLimitReached, StravaRateLimiter, fetch_all, load_athlete_streams  # noqa: E402
+
+
+def fetch_from(server, tokens, output_dir, daily_limit):
+    """Runs fetch_all against a started fake server with a fresh limiter."""
+    async def run():
+        await server.start()
+        try:
+            return await fetch_all(tokens, output_dir, base_url=server.base_url, concurrency=4,
+                                   limiter=StravaRateLimiter(daily_limit=daily_limit))
+        finally:
+            await server.stop()
+    return asyncio.run(run())
+
+
+def test_fetch_stops_at_daily_limit_and_resumes(tmp_path, monkeypatch):
+    server = FakeStravaServer(athletes=1, activities=12, hours=0.05, daily_limit=8)
+    tokens = {"athlete": "token-0"}
+    output_dir = str(tmp_path / "strava")
+
+    results = fetch_from(server, tokens, output_dir, daily_limit=8)
+    assert isinstance(results["athlete"], DailyLimitReached)
+    assert server.daily_usage == 8  # one listing page and seven stream downloads, no 429s
+    assert server.requests == 8
+    assert len(load_athlete_streams(os.path.join(output_dir, "athlete"))["id"].unique()) == 7
+
+    # The next day: the resume must skip cached activities from the manifest, without loading them
+    def no_loading(*args, **kwargs):
+        raise AssertionError("cache.get called while resuming")
+    with monkeypatch.context() as patch:
+        patch.setattr(ActivityCache, "get", no_loading)
+        server.daily_usage = 0
+        results = fetch_from(server, tokens, output_dir, daily_limit=8)
+
+    assert results == {"athlete": 5}
+    assert server.requests == 8 + 5  # the finished listing is not fetched again
+    streams = load_athlete_streams(os.path.join(output_dir, "athlete"))
+    assert sorted(streams["id"].unique()) == list(range(12))
+    assert set(streams["sport_type"]) == {"Ride", "Run"}
+
+
+def test_fetch_retries_server_errors(tmp_path):
+    server = FakeStravaServer(athletes=2, activities=3, hours=0.02, fail_rate=0.3, seed=1)
+    results = fetch_from(server, {"a": "token-0", "b": "token-1"}, str(tmp_path), daily_limit=1000)
+    assert results == {"a": 3, "b": 3}
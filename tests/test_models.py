@@ -0,0 +1,413 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.cycling_model import (
+    NormalizedPowerAccumulator, bootstrap_cp_models_batch, bootstrap_long_duration_power, cycling_normalized_power,
+    fatigue_log_cp_model, fit_cp_models_batch, mean_max_power, mean_max_power_batch, mmp_durations, predict_long_duration_power,
+)
+from ml.fatigue_model import durability_profile, durability_score, fatigued_mean_max_power_batch
+from ml.power_duration import PowerDurationStore
+from ml.predictor import CP_FIT_DURATIONS, AthleteInputs, PredictionService, predict_races
+from ml.race_simulator import SIMULATION_SPREAD, simulate_race, simulate_races
+from ml.running_model import (
+    calculate_training_paces, find_best_efforts, find_best_efforts_batch, training_pace_seconds,
+)
+from ml.swimming_model import athlete_css, best_swim_efforts, swim_sessions
+from ml.timeline import normalize_timeline, timeline_summary
+from ml.vdot import race_time_from_vdot, training_paces, vdot_from_time_and_distance
+
+SHORT_DURATIONS = [1, 5, 10, 20, 30, 60, 90, 120]
+LONG_DURATIONS = [180, 240, 300]
+
+
+def rolling_normalized_power(power):
+    """Reference NP: drop missing values, 30-sample rolling mean, fourth-power mean."""
+    power_30s = pd.Series(power, dtype="float64").dropna().rolling(30).mean().dropna()
+    return round((power_30s ** 4).mean() ** 0.25, 0), round(power_30s.mean(), 0)
+
+
+@pytest.fixture
+def ride_power():
+    rng = np.random.default_rng(0)
+    return 200 + 60 * np.sin(np.arange(3600) / 90) + rng.normal(0, 25, 3600)
+
+
+def test_normalized_power_matches_rolling_reference(ride_power):
+    assert cycling_normalized_power(ride_power) == rolling_normalized_power(ride_power)
+    assert cycling_normalized_power(ride_power.astype(np.float32)) == \
+        rolling_normalized_power(ride_power.astype(np.float32))
+
+
+def test_normalized_power_skips_nan_and_none(ride_power):
+    power = ride_power.tolist()
+    for i in range(0, len(power), 97):
+        power[i] = None
+    for i in range(13, len(power), 211):
+        power[i] = np.nan
+    expected = rolling_normalized_power(power)
+
+    assert all(np.isfinite(expected))
+    assert cycling_normalized_power(power) == expected
+    assert cycling_normalized_power(pd.Series(power)) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 17, 29, 30, 500])
+def test_normalized_power_accumulator_chunks(ride_power, chunk_size):
+    power = ride_power.tolist()
+    power[5] = None
+    power[100] = np.nan
+    accumulator = NormalizedPowerAccumulator()
+    for start in range(0, len(power), chunk_size):
+        accumulator.update(power[start:start + chunk_size])
+
+    assert accumulator.result() == rolling_normalized_power(power)
+    assert accumulator.samples == len(power) - 2
+
+
+def test_normalized_power_short_input():
+    assert NormalizedPowerAccumulator().update([250.0] * 29 + [None]).result() == (None, None)
+    assert cycling_normalized_power("not power") == (None, None)
+
+
+def brute_force_mmp(power, durations):
+    """Reference MMP: the best mean of every full window, NaN counted as 0 W."""
+    power = np.nan_to_num(np.asarray(power, dtype=np.float64))
+    return np.array([max(power[start:start + duration].mean() for start in range(len(power) - duration + 1))
+                     if 0 < duration <= len(power) else np.nan for duration in durations])
+
+
+def test_mean_max_power_matches_brute_force(ride_power):
+    power = ride_power[:900].copy()
+    power[100:110] = np.nan
+    durations = [1, 5, 30, 61, 300, 900, 901]
+
+    expected = brute_force_mmp(power, durations)
+    np.testing.assert_allclose(mean_max_power(power, durations), expected, rtol=1e-12)
+    assert np.isnan(expected[-1])
+    np.testing.assert_allclose(mean_max_power(power.astype(np.float32), durations),
+                               brute_force_mmp(power.astype(np.float32), durations), rtol=1e-6)
+    # Default grid: every second up to a minute, then log-spaced up to the ride length
+    assert mmp_durations(len(power))[[0, 59, -1]].tolist() == [1, 60, 900]
+
+    rides = [power, power[:50], ride_power[900:2700], power[:4]]
+    batch = mean_max_power_batch(rides, durations, batch_size=2)
+    np.testing.assert_allclose(batch, [brute_force_mmp(ride, durations) for ride in rides], rtol=1e-12)
+
+
+def test_power_duration_store_window_envelopes(tmp_path):
+    rng = np.random.default_rng(5)
+    durations = [1, 60, 300]
+    days = rng.permutation(40)[:12]
+    curves = rng.uniform(100, 400, (12, 3))
+    curves[3, 2] = np.nan  # a ride too short for the longest duration
+    store = PowerDurationStore(str(tmp_path / "store.npz"), durations)
+    for i, day in enumerate(days):
+        store.add_curve(f"ride_{i}", pd.Timestamp("2024-01-01") + pd.Timedelta(days=int(day)), curves[i])
+
+    def expected(first, last):
+        inside = (days >= first) & (days <= last)
+        return np.fmax.reduce(curves[inside], axis=0) if inside.any() else np.full(3, np.nan)
+
+    assert (np.diff(store.start_times) > np.timedelta64(0)).all()
+    for first, last in [(0, 39), (5, 5), (10, 20), (22, 21), (-10, 3)]:
+        envelope = store.envelope(pd.Timestamp("2024-01-01") + pd.Timedelta(days=first),
+                                  pd.Timestamp("2024-01-01") + pd.Timedelta(days=last))
+        np.testing.assert_array_equal(envelope.to_numpy(), expected(first, last))
+    np.testing.assert_array_equal(store.envelope().to_numpy(), expected(0, 39))
+    np.testing.assert_array_equal(store.rolling_envelope(10).to_numpy(), expected(days.max() - 10, days.max()))
+
+    # Replacing a ride's curve lowers the all-time envelope again
+    best = int(np.argmax(curves[:, 0]))
+    store.add_curve(f"ride_{best}", pd.Timestamp("2024-01-01") + pd.Timedelta(days=int(days[best])), [0, 0, 0])
+    curves[best] = 0
+    assert len(store) == 12
+    np.testing.assert_array_equal(store.envelope().to_numpy(), expected(0, 39))
+
+    store.save()
+    loaded = PowerDurationStore.load(store.path)
+    assert list(loaded.ride_ids) == list(store.ride_ids)
+    np.testing.assert_array_equal(loaded.start_times, store.start_times)
+    np.testing.assert_array_equal(loaded.curves, store.curves)
+    np.testing.assert_array_equal(loaded.all_time, store.all_time)
+
+
+def brute_force_fatigued_mmp(power, durations, thresholds_kj):
+    """Reference: best mean of every full window starting once the work done so far reaches each threshold."""
+    power = np.fmax(np.nan_to_num(np.asarray(power, dtype=np.float64)), 0)
+    work_before = np.concatenate(([0.0], np.cumsum(power)))
+    curves = np.full((len(thresholds_kj), len(durations)), np.nan)
+    for i, threshold in enumerate(thresholds_kj):
+        for j, duration in enumerate(durations):
+            means = [power[start:start + duration].mean() for start in range(len(power) - duration + 1)
+                     if work_before[start] >= threshold * 1000]
+            if means:
+                curves[i, j] = max(means)
+    return curves
+
+
+def test_fatigued_mean_max_power_matches_brute_force(ride_power):
+    durations = [1, 60, 600]
+    thresholds = [0, 50, 400, 700, 800]
+    rides = [ride_power, ride_power[::-1][:1500], ride_power[:400]]
+
+    curves = fatigued_mean_max_power_batch(rides, durations, thresholds, batch_size=2)
+    expected = np.array([brute_force_fatigued_mmp(ride, durations, thresholds) for ride in rides])
+    np.testing.assert_allclose(curves, expected, rtol=1e-12)
+    assert np.isnan(expected[0, -1]).all()  # the ride holds about 720 kJ
+    np.testing.assert_allclose(curves[:, 0], mean_max_power_batch(rides, durations), rtol=1e-12)
+
+    profile = durability_profile(rides, durations, thresholds)
+    np.testing.assert_array_equal(profile.to_numpy(), np.fmax.reduce(curves, axis=0))
+    assert durability_score(profile, 400, durations=[60]) == pytest.approx(
+        np.nanmax(expected[:, 2, 1]) / np.nanmax(expected[:, 0, 1]))
+
+
+def cp_athletes(n_athletes, seed=3):
+    """Noisy fatigue-log CP curves of athletes with different numbers of measured durations."""
+    rng = np.random.default_rng(seed)
+    durations, powers, cp20s = [], [], []
+    for athlete in range(n_athletes):
+        athlete_durations = SHORT_DURATIONS[:len(SHORT_DURATIONS) - athlete % 3]
+        power = fatigue_log_cp_model(np.array(athlete_durations) * 60.0, rng.uniform(200, 320),
+                                     rng.uniform(1.5e4, 3e4), 300, 1.0, rng.uniform(2, 12))
+        power *= 1 + rng.normal(0, 0.01, len(power))
+        durations.append(athlete_durations)
+        powers.append(power)
+        cp20s.append(power[3])
+    return durations, powers, cp20s
+
+
+def test_batched_cp_fit_matches_curve_fit():
+    durations, powers, cp20s = cp_athletes(6)
+    results, status = fit_cp_models_batch(durations, powers, LONG_DURATIONS, cp20s)
+
+    assert status["converged"].all()
+    for athlete_durations, power, cp20, result, rmse in zip(durations, powers, cp20s, results, status["rmse"]):
+        reference = predict_long_duration_power(athlete_durations, power, LONG_DURATIONS, cp20)
+        reference_rmse = np.sqrt(np.mean(
+            (fatigue_log_cp_model(np.array(athlete_durations) * 60.0, *reference[1:]) - power) ** 2))
+        np.testing.assert_allclose(result[0], reference[0], atol=0.05)
+        np.testing.assert_allclose(result[1:], reference[1:], rtol=1e-3)
+        assert rmse == pytest.approx(reference_rmse, rel=1e-4)
+
+
+@pytest.mark.parametrize("method", ["residual", "case", "jackknife"])
+def test_bootstrap_bands_depend_only_on_the_seed(method):
+    durations, powers, cp20s = cp_athletes(3)
+
+    def bands(athletes=3, seed=7, **kwargs):
+        return bootstrap_cp_models_batch(durations[:athletes], powers[:athletes], LONG_DURATIONS,
+                                         cp20s[:athletes], n_resamples=40, method=method, seed=seed, **kwargs)
+
+    serial = bands()
+    assert serial.index.get_level_values("quantity").unique().tolist() == \
+        ["cp", "w_prime", "power_180", "power_240", "power_300"]
+    assert (serial["converged"] > 0.5).all()
+    pd.testing.assert_frame_equal(bands(batch_size=7, workers=2), serial)
+    pd.testing.assert_frame_equal(bands(athletes=2), serial.loc[[0, 1]])
+    if method != "jackknife":
+        assert not serial.equals(bands(seed=8))
+    single = bootstrap_long_duration_power(durations[1], powers[1], LONG_DURATIONS, cp20s[1], n_resamples=40,
+                                           method=method, seed=7)
+    assert np.isfinite(single.to_numpy()).all()
+
+
+@pytest.mark.parametrize("max_samples", [1, 5000, 200000])
+def test_batched_best_efforts_match_single_runs(max_samples):
+    rng = np.random.default_rng(7)
+    targets = [400, 1000, 1609.34, 5000, 10000]
+    runs = []
+    for n in [0, 900, 3000, 6000]:
+        # 1 Hz samples at a varying pace of roughly 3 m/s, with some pauses
+        elapsed = np.cumsum(rng.choice([1.0, 1.0, 1.0, 5.0], n))
+        distance = 1000 * rng.uniform(0, 5) + np.cumsum(rng.uniform(2.0, 4.0, n))
+        runs.append((distance, elapsed))
+
+    seconds = find_best_efforts_batch(runs, targets, max_samples=max_samples)
+
+    assert seconds.shape == (len(runs), len(targets))
+    expected = np.array([find_best_efforts(distance, elapsed, targets)[2] for distance, elapsed in runs])
+    np.testing.assert_array_equal(seconds, expected)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_predict_races_drops_failed_cp_fits():
+    durations = np.array(CP_FIT_DURATIONS, dtype=np.float64)
+    athletes = [
+        AthleteInputs("fit", durations, np.array([400, 330, 300, 280, 265, 250.0]), {10000: 2400}, css=100),
+        # Flat, near-zero power (a meter reporting dropouts) fits a curve that goes negative
+        AthleteInputs("flat", durations, np.full(len(durations), 1.0), {10000: 2400}, css=100),
+        # Overflowing power never converges
+        AthleteInputs("overflow", durations, np.full(len(durations), 1e300), {10000: 2400}, css=100),
+    ]
+
+    predictions = PredictionService().predict(athletes)
+
+    assert np.isfinite(predictions.loc["fit", ["bike_s", "bike_power", "total_s"]]).all()
+    for athlete_id in ["flat", "overflow"]:
+        assert predictions.loc[athlete_id, ["bike_s", "bike_power", "total_s"]].isna().all()
+        assert np.isfinite(predictions.loc[athlete_id, ["swim_s", "run_s"]]).all()
+    pd.testing.assert_frame_equal(predict_races(athletes[:1]), predict_races(athletes)[:1])
+
+
+# (meters, seconds, VDOT) from vdot_calculator.vdot_from_time_and_distance
+VDOT_REFERENCES = [
+    (1609.34, 360, 48.41670847080807),
+    (5000, 1200, 49.806233428066335),
+    (10000, 2400, 51.9440826680247),
+    (21097.5, 5400, 50.97690626805135),
+    (42195, 10800, 53.52826876260377),
+]
+
+
+def test_vdot_matches_reference_values():
+    distances, seconds, expected = (np.array(column) for column in zip(*VDOT_REFERENCES))
+    for distance, time, vdot in VDOT_REFERENCES:
+        assert float(vdot_from_time_and_distance(time, distance)) == pytest.approx(vdot, rel=1e-12)
+    np.testing.assert_allclose(vdot_from_time_and_distance(seconds, distances), expected, rtol=1e-12)
+    np.testing.assert_allclose(race_time_from_vdot(expected, distances), seconds, atol=1e-6)
+    assert np.isnan(vdot_from_time_and_distance([0, 1200], [5000, -1])).all()
+
+
+def test_training_paces_array_matches_scalar():
+    vdots = [35.0, 48.4, 61.2]
+    paces = training_paces(vdots)
+    for vdot in vdots:
+        scalar = training_pace_seconds(vdot)
+        np.testing.assert_allclose(paces.loc[vdot, list(scalar)].to_numpy(dtype=np.float64),
+                                   [float(pace) for pace in scalar.values()], rtol=1e-12)
+        formatted = calculate_training_paces(vdot)
+        assert formatted == {zone: f"{int(pace // 60)}:{int(pace % 60):02d} per km"
+                             for zone, pace in paces.loc[vdot].items()}
+
+
+def race_athletes():
+    durations = np.array(CP_FIT_DURATIONS, dtype=np.float64)
+    return [
+        AthleteInputs("a", durations, np.array([400, 330, 300, 280, 265, 250.0]), {10000: 2400}, css=100, weight=70),
+        AthleteInputs("b", durations, np.array([350, 290, 260, 240, 228, 215.0]), {21097.5: 6000}, css=115, weight=80),
+        AthleteInputs("c", durations, np.array([450, 380, 345, 320, 305, 290.0]), {5000: 1100}, css=90, weight=65),
+    ]
+
+
+def test_simulate_races_is_reproducible():
+    athletes = race_athletes()
+    first = simulate_races(athletes, n_simulations=2000, seed=11)
+
+    pd.testing.assert_frame_equal(first, simulate_races(athletes, n_simulations=2000, seed=11, batch_size=1))
+    pd.testing.assert_frame_equal(first.loc[["b"]], simulate_races(athletes, n_simulations=2000, seed=11).loc[["b"]])
+    assert not first.equals(simulate_races(athletes, n_simulations=2000, seed=12))
+
+
+def test_simulated_transitions_are_independent_of_the_legs():
+    races = simulate_race(race_athletes()[0], n_simulations=100000, seed=3)
+    log_races = np.log(races[["swim_s", "bike_s", "run_s", "transitions_s"]])
+
+    correlation = log_races.corr()["transitions_s"].drop("transitions_s")
+    assert (correlation.abs() < 0.02).all(), correlation
+    assert log_races["transitions_s"].std() == pytest.approx(SIMULATION_SPREAD["transitions"], rel=0.02)
+
+
+def test_simulated_median_approaches_prediction_without_noise(monkeypatch):
+    for factor in SIMULATION_SPREAD:
+        monkeypatch.setitem(SIMULATION_SPREAD, factor, 1e-6)
+    athletes = race_athletes()
+
+    for race in ["ironman", "70.3"]:
+        simulated = simulate_races(athletes, race, n_simulations=1000, seed=0)
+        predicted = predict_races(athletes, race)
+        np.testing.assert_allclose(simulated["p50_s"], predicted["total_s"], rtol=1e-4)
+        np.testing.assert_allclose(simulated[["swim_s", "bike_s", "run_s"]], predicted[["swim_s", "bike_s", "run_s"]],
+                                   rtol=1e-4)
+
+
+def timeline_frame():
+    """Workout 'w' out of order, with a duplicate second, a 2 s sampling gap and a 17 s pause; 'v' regular."""
+    start = np.datetime64("2024-06-01T08:00:00", "s")
+    seconds = [20, 0, 1, 1, 3, 21, 0, 1]
+    return pd.DataFrame({
+        "workout_id": ["w"] * 6 + ["v"] * 2,
+        "timestamp": start + np.array(seconds),
+        "power": [140.0, 100.0, 110.0, 999.0, 130.0, 150.0, 200.0, 210.0],
+        "heartrate": [150.0, 120.0, 121.0, 122.0, 125.0, 151.0, 90.0, 91.0],
+    })
+
+
+def expected_timeline(power, heartrate, w_seconds):
+    start = np.datetime64("2024-06-01T08:00:00", "s")
+    return pd.DataFrame({
+        "workout_id": ["w"] * len(w_seconds) + ["v"] * 2,
+        "timestamp": start + np.array(list(w_seconds) + [0, 1]),
+        "power": power + [200.0, 210.0],
+        "heartrate": heartrate + [90.0, 91.0],
+    })
+
+
+def test_normalize_timeline_hold():
+    expected = expected_timeline([100.0, 110.0, 110.0] + [130.0] * 17 + [140.0, 150.0],
+                                 [120.0, 121.0, 121.0] + [125.0] * 17 + [150.0, 151.0], range(22))
+    pd.testing.assert_frame_equal(normalize_timeline(timeline_frame(), "hold"), expected, check_dtype=False)
+
+
+def test_normalize_timeline_zero():
+    # Only the pause is zeroed: the sampling gap at second 2 holds the previous row
+    expected = expected_timeline([100.0, 110.0, 110.0, 130.0] + [0.0] * 16 + [140.0, 150.0],
+                                 [120.0, 121.0, 121.0] + [125.0] * 17 + [150.0, 151.0], range(22))
+    result = normalize_timeline(timeline_frame(), "zero", indicator=True)
+    pd.testing.assert_frame_equal(result.drop(columns="filled"), expected, check_dtype=False)
+    assert result["filled"].tolist() == [False, False, True, False] + [True] * 16 + [False] * 4
+
+
+def test_normalize_timeline_split():
+    expected = expected_timeline([100.0, 110.0, 110.0, 130.0, 140.0, 150.0],
+                                 [120.0, 121.0, 121.0, 125.0, 150.0, 151.0], [0, 1, 2, 3, 20, 21])
+    expected["segment"] = [0, 0, 0, 0, 1, 1, 0, 0]
+    pd.testing.assert_frame_equal(normalize_timeline(timeline_frame(), "split"), expected, check_dtype=False)
+
+
+def test_normalize_timeline_regular_frame_is_not_copied():
+    regular = timeline_frame().iloc[[6, 7]].reset_index(drop=True)
+    assert normalize_timeline(regular) is regular
+    assert normalize_timeline(regular, indicator=True) is not regular
+    with pytest.raises(ValueError, match="gap policy"):
+        normalize_timeline(regular, "drop")
+
+
+def test_timeline_summary():
+    summary = timeline_summary(timeline_frame())
+    assert summary.loc["w"].to_dict() == {"rows": 6, "duration_s": 22, "duplicates": 1, "sampling_gaps": 1,
+                                          "pauses": 1, "paused_s": 16}
+    assert summary.loc["v", ["duplicates", "sampling_gaps", "pauses"]].sum() == 0
+    with pytest.raises(ValueError, match="No clock column"):
+        timeline_summary(timeline_frame().drop(columns="timestamp"))
+    with pytest.raises(ValueError, match="No clock column"):
+        normalize_timeline(timeline_frame().drop(columns="timestamp"))
+
+
+def test_best_swim_efforts_from_lengths_and_laps():
+    # Session "a": 16 lengths of 25 m at 24 s, a rest, then 8 lengths at 20 s.
+    # Session "b": 25 yd lengths at 20 s, with a 400 m time trial recorded as one lap.
+    a_times = [24.0] * 16 + [60.0] + [20.0] * 8
+    lengths = pd.DataFrame({
+        "workout_id": ["a"] * len(a_times) + ["b"] * 10,
+        "elapsed_time": a_times + [20.0] * 10,
+        "active": [True] * 16 + [False] + [True] * 8 + [True] * 10,
+        "pool_length": [25.0] * len(a_times) + [22.86] * 10,
+    })
+    laps = pd.DataFrame({"workout_id": ["b"], "timer_time": [330.0], "distance": [400.0]})
+
+    best = best_swim_efforts(lengths, laps)
+
+    assert best.loc["a"].tolist() == [160.0, 384.0]
+    # 200 m needs 9 lengths of 22.86 m: 180 s over 205.74 m, scaled back to 200 m
+    assert best.loc["b", "best_200_s"] == pytest.approx(180 * 200 / (9 * 22.86))
+    assert best.loc["b", "best_400_s"] == 330.0
+
+    sessions = swim_sessions(lengths, laps)
+    assert sessions.loc["a", ["active_lengths", "distance", "swim_time"]].tolist() == [24, 600.0, 544.0]
+    assert sessions.loc["a", "css_pace"] == pytest.approx(100 * (384 - 160) / 200)
+    # The athlete's best 200 m (session a) and 400 m (session b) come from different sessions
+    speed, pace = athlete_css(sessions)
+    assert pace == pytest.approx(100 * (330 - 160) / 200)
+    assert speed == pytest.approx(100 / pace)
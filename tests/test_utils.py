@@ -0,0 +1,411 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+from benchmark import benchmark_suite, compare_to_baseline, format_results  # noqa: E402
+from check_import_time import measure_import, ml_modules  # noqa: E402
+from FitFileProcessor import (  # noqa: E402
+    DERIVED_CHANNELS, EARTH_RADIUS_M, ActivityCache, FitFileProcessor, derive_channel_arrays, derive_channels,
+)
+from synthetic_activities import synthetic_activity, synthetic_pool_swim, write_activity  # noqa: E402
+from ml.activity_store import ActivityStore  # noqa: E402
+from ml.power_duration import PowerDurationStore  # noqa: E402
+from ml.running_model import find_best_efforts, target_distances  # noqa: E402
+from ml.swimming_model import athlete_css, swim_sessions  # noqa: E402
+from run import run_pipeline  # noqa: E402
+
+LUNCH_RIDE = os.path.join(REPO_ROOT, "example_data", "Lunch_Ride.fit")
+
+
+@pytest.fixture
+def synthetic_fit(tmp_path):
+    """A gzipped synthetic ride whose records use compressed-timestamp headers."""
+    streams = synthetic_activity(0.5, sport="cycling", seed=1)
+    return write_activity(str(tmp_path / "ride.fit.gz"), streams, compressed_timestamps=True)
+
+
+@pytest.mark.parametrize("fit_path", ["lunch_ride", "synthetic"])
+def test_native_decoder_matches_fitparse(fit_path, synthetic_fit, tmp_path):
+    path = LUNCH_RIDE if fit_path == "lunch_ride" else synthetic_fit
+    processor = FitFileProcessor(os.path.dirname(path), str(tmp_path / "output"))
+    data = processor.read_fit_bytes(path)
+
+    # decode_native raises FitDecodeFallback instead of silently using fitparse
+    native_type, native_df, _ = processor.decode_native(data)
+    fitparse_type, fitparse_df, _ = processor.decode_fitparse(data)
+
+    assert native_type == fitparse_type == "cycling"
+    assert len(native_df) > 0
+    assert sorted(native_df.columns) == sorted(fitparse_df.columns)
+    pd.testing.assert_frame_equal(native_df, fitparse_df[native_df.columns], check_dtype=False)
+
+
+def test_process_file_native_matches_fitparse(synthetic_fit, tmp_path):
+    data_dir = os.path.dirname(synthetic_fit)
+    native = FitFileProcessor(data_dir, str(tmp_path / "native")).process_file(synthetic_fit)
+    fitparse = FitFileProcessor(data_dir, str(tmp_path / "fitparse"), decoder="fitparse").process_file(synthetic_fit)
+
+    # Newer pandas infers a different datetime resolution on each path; the values match
+    pd.testing.assert_frame_equal(native, fitparse, check_dtype=False)
+
+
+def concat_chunks(chunks):
+    """Row counts of the chunks and their columns concatenated."""
+    chunks = list(chunks)
+    columns = {key: np.concatenate([chunk.columns[key] for chunk in chunks]) for key in chunks[0].columns}
+    return [len(chunk.columns["timestamp"]) for chunk in chunks], columns, chunks[-1].activity_type
+
+
+@pytest.mark.parametrize("block_size", [13, 4096, 1 << 20])
+@pytest.mark.parametrize("chunk_size", [1000, 10 ** 6])
+def test_iter_record_chunks_independent_of_block_size(synthetic_fit, tmp_path, block_size, chunk_size):
+    processor = FitFileProcessor(os.path.dirname(synthetic_fit), str(tmp_path / "output"))
+    _, records, _ = processor.decode_native(processor.read_fit_bytes(synthetic_fit))
+    # The whole-file decode also holds the closing session message, which carries the totals
+    records = records[records["total_calories"].isna()]
+    expected = {key: records[key].to_numpy() for key in records.columns}
+    sizes, columns, activity_type = concat_chunks(
+        processor.iter_record_chunks(synthetic_fit, chunk_size=chunk_size, block_size=block_size))
+
+    n_rows = len(expected["timestamp"])
+    assert n_rows > 1000
+    assert sizes == [chunk_size] * (n_rows // chunk_size) + ([n_rows % chunk_size] if n_rows % chunk_size else [])
+    assert activity_type == "cycling"
+    assert columns.keys() == expected.keys()
+    for key in expected:
+        np.testing.assert_array_equal(columns[key], expected[key], err_msg=key)
+
+
+def test_process_directory_parallel_matches_serial(tmp_path):
+    data_dir = tmp_path / "activities"
+    data_dir.mkdir()
+    for seed, hours in enumerate([0.2, 0.05, 0.1]):
+        write_activity(str(data_dir / f"ride_{seed}.fit"), synthetic_activity(hours, seed=seed))
+    serial = FitFileProcessor(str(data_dir), str(tmp_path / "serial")).process_directory(workers=1)
+    parallel = FitFileProcessor(str(data_dir), str(tmp_path / "parallel")).process_directory(workers=2)
+
+    assert list(serial["workout_id"].unique()) == ["ride_0", "ride_1", "ride_2"]
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+COMPACT_DTYPES = {
+    "workout_id": "category", "timestamp": "int64", "elapsed_time": "int32", "distance": "float32",
+    "speed": "float32", "heartrate": "float32", "cadence": "float32", "altitude": "float32",
+    "latitude": "float64", "longitude": "float64", "power": "int16", "total_calories": "float32",
+    "total_ascent": "float32", "sport_type": "category",
+}
+
+
+def test_compact_schema_dtypes_and_round_trip(tmp_path):
+    data_dir = tmp_path / "activities"
+    data_dir.mkdir()
+    write_activity(str(data_dir / "ride.fit"), synthetic_activity(0.1, seed=0))
+    write_activity(str(data_dir / "run.fit"), synthetic_activity(0.1, sport="running", seed=1))
+
+    default = FitFileProcessor(str(data_dir), str(tmp_path / "default")).process_directory()
+    cache_dir = str(tmp_path / "cache")
+    compact = FitFileProcessor(str(data_dir), str(tmp_path / "compact"), compact=True,
+                               cache_dir=cache_dir).process_directory()
+
+    assert {column: str(dtype) for column, dtype in compact.dtypes.items()} == COMPACT_DTYPES
+    assert set(compact["sport_type"].cat.categories) == {"cycling", "running"}
+
+    # Widening the compact frame gives back the default frame, to float32 precision
+    widened = compact.astype({column: "float64" for column, dtype in COMPACT_DTYPES.items()
+                              if dtype.startswith(("float", "int"))})
+    widened["timestamp"] = pd.to_datetime(compact["timestamp"], unit="s")
+    for column in ("workout_id", "sport_type"):
+        widened[column] = compact[column].astype(str)
+    pd.testing.assert_frame_equal(widened, default[widened.columns], check_dtype=False, rtol=1e-6)
+
+    # Frames read back from the cache keep the compact schema
+    processor = FitFileProcessor(str(data_dir), str(tmp_path / "cached"), compact=True, cache_dir=cache_dir)
+    cached = processor.process_directory()
+    assert processor.stats.summary()["status"] == {"cached": 2}
+    pd.testing.assert_frame_equal(cached, compact)
+
+
+def straight_climb(seconds, climb_rate, start_altitude=100.0, step_degrees=1e-4):
+    """A track due north at one latitude step per second with a constant climb rate (m/s)."""
+    elapsed = np.arange(seconds, dtype=np.float64)
+    return {"latitude": 40.0 + step_degrees * elapsed, "longitude": np.full(seconds, -105.0),
+            "altitude": start_altitude + climb_rate * elapsed, "elapsed": elapsed}
+
+
+def test_derived_channels_of_a_straight_climb():
+    climb = straight_climb(300, 0.5)
+    descent = straight_climb(200, -0.25)
+    channels = derive_channel_arrays(**climb)
+    step = EARTH_RADIUS_M * np.radians(1e-4)
+    interior = slice(30, 270)
+
+    np.testing.assert_allclose(channels["gps_distance"], step * climb["elapsed"], rtol=1e-6)
+    np.testing.assert_allclose(channels["smoothed_altitude"][interior], climb["altitude"][interior])
+    np.testing.assert_allclose(channels["grade"][interior], 100 * 0.5 / step, rtol=1e-6)
+    np.testing.assert_allclose(channels["vam"][interior], 0.5 * 3600)
+    assert channels["elevation_gain"][-1] == pytest.approx(
+        channels["smoothed_altitude"][-1] - channels["smoothed_altitude"][0])
+
+    # Several activities in one call: nothing crosses from one activity into the next
+    both = derive_channel_arrays(**{key: np.concatenate([climb[key], descent[key]]) for key in climb},
+                                 segments=np.repeat([0, 1], [300, 200]))
+    alone = derive_channel_arrays(**descent)
+    for key in DERIVED_CHANNELS:
+        np.testing.assert_allclose(both[key][:300], channels[key], err_msg=key)
+        np.testing.assert_allclose(both[key][300:], alone[key], err_msg=key)
+    assert (alone["vam"] == 0).all() and (alone["elevation_gain"] == 0).all()
+
+    frame = pd.DataFrame({"workout_id": np.repeat(["a", "b"], [300, 200]),
+                          "elapsed_time": np.concatenate([climb["elapsed"], descent["elapsed"]]),
+                          **{key: np.concatenate([climb[key], descent[key]])
+                             for key in ("latitude", "longitude", "altitude")}})
+    derived = derive_channels(frame)
+    for key in DERIVED_CHANNELS:
+        np.testing.assert_array_equal(derived[key].to_numpy(), both[key], err_msg=key)
+
+
+def cache_source(directory, name, size=64):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as source:
+        source.write(os.urandom(size))
+    return path
+
+
+def test_activity_cache_hit_and_mtime_miss(tmp_path):
+    source = cache_source(tmp_path, "ride.fit")
+    frame = pd.DataFrame({"workout_id": ["ride", "ride"], "power": [200.0, np.nan]})
+    cache = ActivityCache(str(tmp_path / "cache"))
+    cache.use_schema(["power"])
+    assert cache.get(source) is None
+
+    cache.put(source, frame)
+    cache.save()
+    reopened = ActivityCache(str(tmp_path / "cache"))
+    reopened.use_schema(["power"])
+    pd.testing.assert_frame_equal(reopened.get(source), frame)
+
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert reopened.get(source) is None
+
+
+def test_activity_cache_schema_change_drops_entries(tmp_path):
+    source = cache_source(tmp_path, "ride.fit")
+    cache = ActivityCache(str(tmp_path / "cache"))
+    cache.use_schema(["power"])
+    cache.put(source, pd.DataFrame({"power": [200.0]}))
+    cache.save()
+
+    reopened = ActivityCache(str(tmp_path / "cache"))
+    reopened.use_schema(["power", "heartrate"])
+    assert reopened.get(source) is None
+    assert os.listdir(tmp_path / "cache") == [ActivityCache.MANIFEST]
+
+
+def test_activity_cache_evicts_least_recently_used(tmp_path):
+    sources = [cache_source(tmp_path, f"ride_{i}.fit") for i in range(3)]
+    frame = pd.DataFrame({"power": np.arange(1000, dtype=np.float64)})
+    cache = ActivityCache(str(tmp_path / "cache"))
+    cache.use_schema(["power"])
+    for i, source in enumerate(sources):
+        cache.put(source, frame)
+        cache.entries[cache.entry_name(source)]["last_used"] = i
+    cache.max_bytes = 2 * cache.entries[cache.entry_name(sources[0])]["bytes"]
+
+    # Reading the oldest entry makes the second one the least recently used
+    assert cache.get(sources[0]) is not None
+    cache.save()
+
+    assert cache.get(sources[1]) is None
+    assert cache.get(sources[0]) is not None
+    assert cache.get(sources[2]) is not None
+
+
+def store_activity(hours, seed):
+    """Timestamp (Unix seconds) and distance channels of a synthetic run."""
+    streams = synthetic_activity(hours, sport="running", seed=seed)
+    return {"timestamp": streams["timestamp"].astype("datetime64[s]").astype(np.int64),
+            "distance": streams["distance"]}
+
+
+def test_activity_store_round_trip(tmp_path):
+    store = ActivityStore(str(tmp_path / "store"), channels={"timestamp": "int64", "distance": "float32"})
+    first, second = store_activity(0.2, 0), store_activity(0.3, 1)
+    workout_id = "a" * 100 + "-long-id"
+    store.append(workout_id, "2024-05-01 07:00", "running", {"timestamp": first["timestamp"],
+                                                               "distance": first["distance"]})
+    store.append("short", "2024-05-02 07:00", "running", {"timestamp": second["timestamp"]})
+
+    reopened = ActivityStore(str(tmp_path / "store"))
+    assert len(reopened) == 2 and workout_id in reopened and "short" in reopened
+    assert reopened.channels == {"timestamp": np.dtype("int64"), "distance": np.dtype("float32")}
+    views = reopened.get(workout_id)
+    assert isinstance(views["distance"], np.memmap)
+    np.testing.assert_array_equal(views["timestamp"], first["timestamp"])
+    np.testing.assert_array_equal(views["distance"], first["distance"].astype(np.float32))
+    assert np.isnan(reopened.get("short")["distance"]).all()  # missing channels are NaN-filled
+    assert list(reopened.select(start="2024-05-02")["workout_id"]) == ["short"]
+
+
+def test_activity_store_trims_uncommitted_tail(tmp_path):
+    path = str(tmp_path / "store")
+    store = ActivityStore(path, channels={"timestamp": "int64", "distance": "float64"})
+    first = store_activity(0.1, 0)
+    store.append("first", "2024-05-01", "running", {"timestamp": first["timestamp"], "distance": first["distance"]})
+    # An interrupted append leaves samples past the committed index
+    with open(os.path.join(path, "distance.bin"), "ab") as channel_file:
+        channel_file.write(np.arange(50, dtype=np.float64).tobytes())
+
+    reopened = ActivityStore(path)
+    assert len(reopened.channel("distance")) == len(first["distance"])
+    second = store_activity(0.1, 1)
+    reopened.append("second", "2024-05-02", "running", {"timestamp": second["timestamp"],
+                                                        "distance": second["distance"]})
+
+    assert os.path.getsize(os.path.join(path, "distance.bin")) == 8 * (len(first["distance"]) + len(second["distance"]))
+    np.testing.assert_array_equal(ActivityStore(path).get("second")["distance"], second["distance"])
+
+
+def test_activity_store_rejects_truncated_channel(tmp_path):
+    path = str(tmp_path / "store")
+    store = ActivityStore(path, channels={"timestamp": "int64", "distance": "float64"})
+    first = store_activity(0.1, 0)
+    store.append("first", "2024-05-01", "running", {"timestamp": first["timestamp"], "distance": first["distance"]})
+    with open(os.path.join(path, "distance.bin"), "r+b") as channel_file:
+        channel_file.truncate(8 * 10)
+
+    reopened = ActivityStore(path)
+    with pytest.raises(ValueError, match="Channel distance"):
+        reopened.channel("distance")
+    with pytest.raises(ValueError, match="Channel distance"):
+        reopened.append("second", "2024-05-02", "running", {"timestamp": first["timestamp"]})
+    assert len(ActivityStore(path)) == 1
+
+
+def test_activity_store_rejects_duplicate_workouts(tmp_path):
+    store = ActivityStore(str(tmp_path / "store"), channels={"timestamp": "int64"})
+    store.append("ride", "2024-05-01", "cycling", {"timestamp": np.arange(10)})
+    with pytest.raises(ValueError, match="already stored"):
+        store.append("ride", "2024-05-02", "cycling", {"timestamp": np.arange(10)})
+    with pytest.raises(ValueError, match="already stored"):
+        store.extend([(name, "2024-05-03", "cycling", {"timestamp": np.arange(5)}) for name in ["new", "new"]])
+    assert len(ActivityStore(str(tmp_path / "store"))) == 1
+
+
+def test_activity_store_best_efforts_match_find_best_efforts(tmp_path):
+    frames = []
+    for i, hours in enumerate([0.5, 1.5]):
+        streams = synthetic_activity(hours, sport="running", seed=i)
+        frames.append(pd.DataFrame({"workout_id": f"run_{i}", "timestamp": pd.to_datetime(streams["timestamp"]),
+                                    "distance": streams["distance"], "sport_type": "running"}))
+    df = pd.concat(frames, ignore_index=True)
+    store = ActivityStore(str(tmp_path / "store"), channels={"timestamp": "int64", "distance": "float64"})
+    assert store.append_activities(df) == 2
+    assert store.append_activities(df) == 0
+
+    best = store.best_efforts(target_distances, sport="running")
+
+    for workout_id, run in df.groupby("workout_id"):
+        run = run[run["distance"].notna()]
+        elapsed = (run["timestamp"] - run["timestamp"].iloc[0]).dt.total_seconds().to_numpy()
+        expected = find_best_efforts(run["distance"].to_numpy(), elapsed, list(target_distances.values()))[2]
+        np.testing.assert_array_equal(best.loc[workout_id].to_numpy(), expected)
+
+
+IMPORT_BUDGET = 1.0  # seconds for a cold import of every ml module
+
+
+def test_ml_import_is_fast_and_lazy():
+    runs = [measure_import(ml_modules()) for _ in range(3)]
+    elapsed = min(run[0] for run in runs)
+
+    assert elapsed < IMPORT_BUDGET, f"import took {elapsed:.3f}s"
+    assert not any(run[1] for run in runs), f"import loaded {runs[0][1]}"
+    assert runs[0][2] == ""
+
+
+def test_benchmark_suite_smoke(tmp_path):
+    # One ride long enough for the CP fit benchmark (which checks its own predictions)
+    results = benchmark_suite([0.05, 1.0], str(tmp_path), repeat=1)
+
+    assert [result.name for result in results] == [
+        "process_file", "process_directory", "peak_avg_wattage", "evaluate_peak_avg_wattages",
+        "cycling_normalized_power", "derive_channels", "analyze_distances", "predict_long_duration_power",
+    ]
+    for result in results:
+        assert result.items > 0 and result.seconds >= 0 and result.throughput > 0, result
+    assert len(format_results(results).splitlines()) == len(results) + 1
+    baseline = {result.name: dict(result._asdict(), throughput=result.throughput * 10) for result in results}
+    assert len(compare_to_baseline(results, baseline, 0.2)) == len(results)
+    assert compare_to_baseline(results, {}, 0.2) == []
+
+
+@pytest.mark.parametrize("decoder", ["native", "fitparse"])
+def test_css_from_synthetic_pool_swims(tmp_path, decoder):
+    data_dir = tmp_path / "swims"
+    data_dir.mkdir()
+    for seed in range(2):
+        write_activity(str(data_dir / f"swim_{seed}.fit"), synthetic_pool_swim(1.0, seed=seed, css_pace=95.0))
+    processor = FitFileProcessor(str(data_dir), str(tmp_path / "output"), decoder=decoder, swim=True)
+    processor.process_directory()
+    lengths, laps = processor.swim_frames()
+
+    sessions = swim_sessions(lengths, laps)
+
+    assert sorted(sessions.index) == ["swim_0", "swim_1"]
+    assert (sessions["pool_length"] == 25.0).all()
+    np.testing.assert_allclose(sessions["css_pace"], 95.0, atol=2.0)
+    assert athlete_css(sessions)[1] == pytest.approx(95.0, abs=1.0)
+    # Lengths alone give the same efforts as lengths and laps
+    assert athlete_css(swim_sessions(lengths))[1] == pytest.approx(athlete_css(sessions)[1], abs=0.01)
+
+
+def test_run_pipeline_resumes_and_updates_store_incrementally(tmp_path, monkeypatch):
+    activity_dir = tmp_path / "activities"
+    activity_dir.mkdir()
+    for seed in range(2):
+        write_activity(str(activity_dir / f"ride_{seed}.fit"),
+                       synthetic_activity(0.1, seed=seed, start_time=f"2024-06-0{seed + 1}T06:00:00"))
+    athletes = [{"athlete_id": "a", "activity_dir": str(activity_dir), "weight": 70.0}]
+    output_dir = str(tmp_path / "output")
+    store_path = os.path.join(output_dir, "athletes", "a", "power_duration.npz")
+
+    added = []
+    add_activities = PowerDurationStore.add_activities
+
+    def spy(store, df, *args, **kwargs):
+        added.append(sorted(df["workout_id"].astype(str).unique()))
+        return add_activities(store, df, *args, **kwargs)
+    monkeypatch.setattr(PowerDurationStore, "add_activities", spy)
+
+    def run():
+        return run_pipeline(athletes, output_dir, workers=1, races=("70.3",), n_simulations=200)
+
+    assert run()["processed"] == 1
+    assert added == [["ride_0", "ride_1"]]
+    first_store = PowerDurationStore.load(store_path)
+
+    # Unchanged inputs: the athlete is skipped from the checkpoint
+    summary = run()
+    assert (summary["processed"], summary["skipped"]) == (0, 1)
+    assert len(added) == 1
+
+    # A touched file reruns the athlete, but rides already in the saved store are not recomputed
+    stat = os.stat(activity_dir / "ride_0.fit")
+    os.utime(activity_dir / "ride_0.fit", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert run()["processed"] == 1
+    assert len(added) == 1
+    store = PowerDurationStore.load(store_path)
+    np.testing.assert_array_equal(store.curves, first_store.curves)
+
+    # A new upload adds only the new ride to the store
+    write_activity(str(activity_dir / "ride_2.fit"), synthetic_activity(0.1, seed=2, start_time="2024-06-03T06:00:00"))
+    assert run()["processed"] == 1
+    assert added[1:] == [["ride_2"]]
+    assert list(PowerDurationStore.load(store_path).ride_ids) == ["ride_0", "ride_1", "ride_2"]